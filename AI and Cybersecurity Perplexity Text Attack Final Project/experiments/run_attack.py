@@ -1,16 +1,30 @@
 import pandas as pd
-from textattack.transformations import WordSwapEmbedding
-from textattack.shared import AttackedText
 from tqdm import tqdm
 import csv
 import os
+from functools import partial
 from pathlib import Path
 
+from a4s_eval.attack.checkpoint import AttackCheckpoint, dataset_row_ids
+from a4s_eval.attack.neighbours import embedding_key, ensure_neighbour_table
+from a4s_eval.attack.parallel import ParallelAttack
+from a4s_eval.attack.word_swap import FirstCandidateAttack
+from a4s_eval.utils import env
+
+# Nearest neighbours considered per word by the word swap
+MAX_CANDIDATES = 10
+
 
 def run_attack():
     """
     Loads a dataset, applies an adversarial transformation, saves the transformed
-    dataset to a parquet file, and writes progress to a CSV file row-by-row.
+    dataset to a parquet file, and writes progress to a CSV file.
+    
+    Attacked rows are checkpointed durably as they are produced. When the
+    script is restarted after an interruption, rows already in the checkpoint
+    are skipped and the final files are built from the checkpoint. A
+    checkpoint written with another embedding or number of candidates is not
+    resumed. Delete the checkpoint file to start over.
     """
     # 1. Define file paths robustly
     PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -19,6 +33,9 @@ def run_attack():
     # ALWAYS write to regular files (no _FULL suffix)
     output_parquet_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val_attacked.parquet"
     progress_csv_path = PROJECT_ROOT / "tests" / "data" / "measures" / "attack_progress.csv"
+    # Attacked rows are appended here as they are produced, so that an
+    # interrupted run resumes where it stopped
+    checkpoint_path = PROJECT_ROOT / "tests" / "data" / "measures" / "attack_checkpoint.jsonl"
     
     # Check if input file exists
     if not input_path.exists():
@@ -44,39 +61,77 @@ def run_attack():
     original_texts = df['context'].tolist()
     print(f"Starting attack on {len(original_texts)} samples...")
     
-    # 4. Apply the adversarial transformation
-    print("Applying adversarial transformation (WordSwapEmbedding)...")
-    transformation = WordSwapEmbedding(max_candidates=10)
-    attacked_texts = []
+    # 4. Skip rows already attacked by an interrupted run (checkpoint), as
+    # long as their text and the attack parameters have not changed since
+    embedding_path = env.ATTACK_EMBEDDING_PATH or None
+    row_ids = dataset_row_ids(df)
+    checkpoint = AttackCheckpoint(
+        str(checkpoint_path),
+        params={
+            "embedding": embedding_key(embedding_path),
+            "max_candidates": MAX_CANDIDATES,
+        },
+    )
+    completed = checkpoint.completed_ids(dict(zip(row_ids, original_texts)))
+    pending = [
+        (row_id, text)
+        for row_id, text in zip(row_ids, original_texts)
+        if row_id not in completed
+    ]
+    if len(pending) < len(row_ids):
+        print(
+            f"Resuming from {checkpoint_path}: {len(row_ids) - len(pending)} rows "
+            f"already attacked, {len(pending)} remaining"
+        )
     
-    # Open the progress CSV file for writing
-    with open(progress_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['original_text', 'attacked_text'])
-        
+    # 5. Apply the adversarial transformation, appending each attacked row
+    # to the checkpoint (synced to disk every few rows). With
+    # ATTACK_NUM_WORKERS > 1, rows are attacked in parallel and collected
+    # back in input order, so the output is the same as a serial run.
+    # Word neighbours are read from a memory-mapped table in CACHE_DIR,
+    # built here once so that all workers share it
+    print("Preparing nearest-neighbour table...")
+    ensure_neighbour_table(embedding_path, k=MAX_CANDIDATES)
+    print(
+        f"Applying adversarial transformation (WordSwapEmbedding) "
+        f"with {env.ATTACK_NUM_WORKERS} worker(s)..."
+    )
+    attacker = ParallelAttack(
+        partial(
+            FirstCandidateAttack,
+            max_candidates=MAX_CANDIDATES,
+            embedding_path=embedding_path,
+        ),
+        num_workers=env.ATTACK_NUM_WORKERS,
+    )
+    
+    with checkpoint, attacker:
         # Process each text with a progress bar
-        for text in tqdm(original_texts, desc="Attacking texts"):
-            attacked_text_obj = AttackedText(text)
-            transformed_texts = transformation(attacked_text_obj)
-            
-            if transformed_texts:
-                result_text = transformed_texts[0].text
-            else:
-                result_text = text
-            
-            attacked_texts.append(result_text)
-            csv_writer.writerow([text, result_text])
+        results = attacker.map(text for _, text in pending)
+        for (row_id, text), result_text in tqdm(
+            zip(pending, results), total=len(pending), desc="Attacking texts"
+        ):
+            checkpoint.append(row_id, text, result_text)
     
-    # 5. Create a new dataframe with the attacked text, preserving other columns
+    # Create a new dataframe with the attacked text, preserving other columns
+    attacked_rows = checkpoint.rows()
+    attacked_texts = [attacked_rows[row_id]["attacked_text"] for row_id in row_ids]
     attacked_df = df.copy()
     attacked_df['context'] = attacked_texts
     print("Transformation complete.")
     
+    # Write the progress log in input order
+    with open(progress_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(['original_text', 'attacked_text'])
+        csv_writer.writerows(zip(original_texts, attacked_texts))
+    
     # 6. Save the final attacked dataframe to a parquet file
     print(f"Saving attacked dataset to {output_parquet_path}...")
     attacked_df.to_parquet(output_parquet_path)
     print(f"Done. Attacked dataset saved to {output_parquet_path}")
     print(f"Progress log written to {progress_csv_path}")
+    print(f"Checkpoint kept at {checkpoint_path}")
 
 
 if __name__ == "__main__":
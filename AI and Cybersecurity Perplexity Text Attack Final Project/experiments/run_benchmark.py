@@ -0,0 +1,116 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from a4s_eval.perplexity.benchmark import (
+    REGRESSION_THRESHOLD,
+    BenchmarkCase,
+    BenchmarkReport,
+    CorpusSpec,
+    compare_to_baseline,
+    run_benchmark,
+    sample_corpus,
+    synthetic_corpus,
+)
+
+# Modules whose startup (import) time is measured in a fresh interpreter
+STARTUP_MODULES = [
+    "a4s_eval.metric_registries",
+    "a4s_eval.metrics.model_metrics.perplexity_metric",
+]
+
+
+def run_perplexity_benchmark():
+    """
+    Benchmarks perplexity scoring for each backend and batch setting on fixed
+    synthetic and SQuAD corpora, saves the results as JSON and compares them
+    with the stored baseline. Exits with status 1 if a metric is worse than the
+    baseline by more than BENCHMARK_REGRESSION_THRESHOLD (default 10%). Set
+    BENCHMARK_UPDATE_BASELINE=1 to store the results as the new baseline.
+    """
+    # 1. Define file paths
+    PROJECT_ROOT = Path(__file__).resolve().parent.parent
+    input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
+    results_path = PROJECT_ROOT / "tests" / "data" / "measures" / "benchmark.json"
+    baseline_path = PROJECT_ROOT / "tests" / "data" / "benchmark_baseline.json"
+
+    # 2. Build the corpora (smaller in demo mode)
+    demo_mode = os.environ.get("DEMO_MODE") == "1"
+    n_texts = 32 if demo_mode else 256
+    corpora = {
+        "synthetic_short": synthetic_corpus(
+            CorpusSpec("synthetic_short", n_texts, min_words=8, max_words=32)
+        ),
+        "synthetic_long": synthetic_corpus(
+            CorpusSpec("synthetic_long", n_texts, min_words=200, max_words=400)
+        ),
+    }
+    if input_path.exists():
+        print(f"Loading SQuAD contexts from {input_path}...")
+        contexts = pd.read_parquet(input_path)['context'].tolist()
+        corpora["squad_medium"] = sample_corpus(
+            contexts, CorpusSpec("squad_medium", n_texts, min_words=80, max_words=160)
+        )
+    else:
+        print(f"SQuAD data not found at {input_path}, using synthetic corpora only.")
+
+    # 3. Define the backend and batch settings
+    settings = [("torch", "float32"), ("onnx", "float32"), ("onnx", "int8")]
+    batch_sizes = [1, 16]
+    if demo_mode:
+        settings = settings[:1]
+    cases = [
+        BenchmarkCase(corpus=corpus, backend=backend, dtype=dtype, batch_size=size)
+        for corpus in corpora
+        for backend, dtype in settings
+        for size in batch_sizes
+    ]
+
+    # 4. Run every case in its own process, and time the imports that
+    # short-lived workers and CLI calls start with
+    print(f"Running {len(cases)} benchmark cases...")
+    report = run_benchmark(cases, corpora, startup_modules=STARTUP_MODULES)
+    for module, seconds in report.startup.items():
+        print(f"Import of {module:<56} {seconds * 1000:8.1f} ms")
+    for result in report.results:
+        print(
+            f"{result.case.key:<56} {result.texts_per_second:8.1f} texts/s "
+            f"{result.tokens_per_second:9.0f} tok/s  "
+            f"p50 {result.latency_p50_ms:8.1f} ms  "
+            f"p99 {result.latency_p99_ms:8.1f} ms  "
+            f"rss {result.peak_rss_mb:6.0f} MB  load {result.model_load_seconds:.2f}s"
+        )
+    report.save(str(results_path))
+    print(f"Results saved to {results_path}")
+
+    # 5. Compare with the baseline
+    if os.environ.get("BENCHMARK_UPDATE_BASELINE") == "1":
+        report.save(str(baseline_path))
+        print(f"Baseline updated at {baseline_path}")
+        return
+    if not baseline_path.exists():
+        print("No baseline found. Run with BENCHMARK_UPDATE_BASELINE=1 to store one.")
+        return
+
+    threshold = float(
+        os.environ.get("BENCHMARK_REGRESSION_THRESHOLD", REGRESSION_THRESHOLD)
+    )
+    regressions = compare_to_baseline(
+        report, BenchmarkReport.load(str(baseline_path)), threshold
+    )
+    if not regressions:
+        print(f"No regression beyond {threshold:.0%} of the baseline.")
+        return
+    for regression in regressions:
+        print(
+            f"REGRESSION {regression.key} {regression.metric}: "
+            f"{regression.baseline:.2f} -> {regression.current:.2f} "
+            f"({regression.change:+.1%})"
+        )
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    run_perplexity_benchmark()
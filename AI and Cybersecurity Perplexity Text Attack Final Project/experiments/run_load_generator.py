@@ -0,0 +1,71 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from a4s_eval.perplexity.benchmark import CorpusSpec, sample_corpus, synthetic_corpus
+from a4s_eval.service.load_generator import run_load, serve
+from a4s_eval.service.scoring_service import create_app
+
+
+def run_scoring_load():
+    """
+    Starts the perplexity scoring service locally and sends it single-text
+    requests at increasing concurrency levels. Reports the p50/p99 latency,
+    the requests per second and the mean micro-batch size of each level, and
+    saves them as JSON. The levels are read from LOAD_TEST_CONCURRENCY
+    (default "1,4,16,64"); SCORING_MAX_BATCH_SIZE and SCORING_MAX_WAIT_MS set
+    the micro-batching of the service.
+    """
+    # 1. Define file paths
+    PROJECT_ROOT = Path(__file__).resolve().parent.parent
+    input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
+    results_path = PROJECT_ROOT / "tests" / "data" / "measures" / "scoring_load.json"
+
+    # 2. Build the request texts (fewer requests in demo mode)
+    demo_mode = os.environ.get("DEMO_MODE") == "1"
+    n_requests = 64 if demo_mode else 512
+    spec = CorpusSpec("requests", n_requests, min_words=20, max_words=120)
+    if input_path.exists():
+        print(f"Loading SQuAD contexts from {input_path}...")
+        contexts = pd.read_parquet(input_path)['context'].tolist()
+        texts = sample_corpus(contexts, spec)
+    else:
+        print(f"SQuAD data not found at {input_path}, using synthetic texts.")
+        texts = synthetic_corpus(spec)
+
+    levels = [
+        int(level)
+        for level in os.environ.get("LOAD_TEST_CONCURRENCY", "1,4,16,64").split(",")
+    ]
+
+    # 3. Start the service, which loads the reference model, and warm it up
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    print("Starting the scoring service...")
+    results = []
+    with serve(create_app()) as url:
+        run_load(url, texts, concurrency=1, n_requests=4)
+
+        # 4. Run each concurrency level
+        for concurrency in levels:
+            result = run_load(url, texts, concurrency, n_requests)
+            results.append(result)
+            print(
+                f"concurrency {concurrency:>4}  "
+                f"{result.requests_per_second:8.1f} req/s  "
+                f"p50 {result.latency_p50_ms:8.1f} ms  "
+                f"p99 {result.latency_p99_ms:8.1f} ms  "
+                f"batch {result.mean_batch_size:5.1f}  errors {result.n_errors}"
+            )
+
+    # 5. Save the results
+    results_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(results_path, "w") as f:
+        json.dump([result.to_dict() for result in results], f, indent=2)
+    print(f"Results saved to {results_path}")
+
+
+if __name__ == "__main__":
+    run_scoring_load()
@@ -1,21 +1,90 @@
 import pandas as pd
-import torch
-import csv
 import os
 from pathlib import Path
-from tqdm import tqdm
-from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from a4s_eval.attack.checkpoint import dataset_row_ids
+from a4s_eval.perplexity.dedup import dedup_texts, text_digest
+from a4s_eval.perplexity.measures_io import write_measures
+from a4s_eval.perplexity.model_cache import reference_model_cache
+from a4s_eval.perplexity.paired import score_text_pairs_with_token_nll
+from a4s_eval.perplexity.scoring import (
+    compute_perplexities,
+    default_score_cache,
+    default_scoring_config,
+    default_token_store,
+)
+from a4s_eval.utils import env
+from a4s_eval.utils.profiling import profile_run, stage
+
+
+def run_paired_perplexity(
+    df, reference, clean_input_path, output_path, clean_output_path
+):
+    """
+    Scores every attacked text together with its clean original, running
+    their common token prefix through the model only once, and saves both
+    sets of scores (with the NLL of every token if PERPLEXITY_TOKEN_NLL is set).
+    """
+    if not clean_input_path.exists():
+        raise FileNotFoundError(
+            f"CRITICAL ERROR: Clean dataset not found at {clean_input_path}"
+        )
+    with stage("load_parquet"):
+        clean_df = pd.read_parquet(clean_input_path)
+    clean_by_id = dict(zip(dataset_row_ids(clean_df), clean_df['context']))
+    
+    row_ids = dataset_row_ids(df)
+    clean_texts = [clean_by_id[row_id] for row_id in row_ids]
+    attacked_texts = df['context'].tolist()
+    
+    # Token ids of both columns are read from their token stores
+    token_ids = []
+    for texts in [clean_texts, attacked_texts]:
+        with stage("token_store"):
+            token_store = default_token_store(dedup_texts(texts), reference)
+        token_ids.append(
+            None if token_store is None else token_store.take(range(len(texts)))
+        )
+    
+    print("Calculating paired perplexity scores (clean and attacked)...")
+    with stage("score"):
+        clean, attacked = score_text_pairs_with_token_nll(
+            clean_texts,
+            attacked_texts,
+            reference.model,
+            reference.tokenizer,
+            default_scoring_config(),
+            progress=True,
+            clean_token_ids=token_ids[0],
+            attacked_token_ids=token_ids[1],
+        )
+    
+    for path, texts, (scores, token_nll) in [
+        (clean_output_path, clean_texts, clean),
+        (output_path, attacked_texts, attacked),
+    ]:
+        with stage("write_measures"):
+            write_measures(
+                path,
+                row_ids,
+                [text_digest(t) for t in texts],
+                scores,
+                token_nll=token_nll if env.PERPLEXITY_TOKEN_NLL else None,
+            )
+        print(f"Perplexity scores saved to {path}")
 
 
 def run_perplexity_on_attacked_data():
     """
     Loads the attacked dataset, runs the perplexity metric, and saves the 
-    measures to a CSV file.
+    measures to an Arrow file.
     """
     # 1. Define file paths
     PROJECT_ROOT = Path(__file__).resolve().parent.parent
     input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val_attacked.parquet"
-    output_csv_path = PROJECT_ROOT / "tests" / "data" / "measures" / "perplexity_attacked.csv"
+    output_path = PROJECT_ROOT / "tests" / "data" / "measures" / "perplexity_attacked.arrow"
+    clean_input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
+    clean_output_path = PROJECT_ROOT / "tests" / "data" / "measures" / "perplexity_data.arrow"
     
     # Check if input file exists
     if not input_path.exists():
@@ -25,11 +94,12 @@ def run_perplexity_on_attacked_data():
         )
     
     # Ensure the output directory exists
-    os.makedirs(output_csv_path.parent, exist_ok=True)
+    os.makedirs(output_path.parent, exist_ok=True)
     
     # 2. Load the attacked dataset
     print(f"Loading attacked dataset from {input_path}...")
-    df = pd.read_parquet(input_path)
+    with stage("load_parquet"):
+        df = pd.read_parquet(input_path)
     
     # Note: We don't check DEMO_MODE here because the attacked file
     # already has the correct size (50 or full) from run_attack.py
@@ -37,42 +107,63 @@ def run_perplexity_on_attacked_data():
     texts = df['context'].tolist()
     print(f"Starting perplexity measurement on {len(texts)} samples...")
     
-    # 3. Initialize the reference model
-    print("Loading distilgpt2 model...")
-    ref_model_name = "distilgpt2"
-    ref_model = AutoModelForCausalLM.from_pretrained(ref_model_name)
-    ref_tokenizer = AutoTokenizer.from_pretrained(ref_model_name)
-    ref_model.eval()
+    # 3. Load the reference model
+    print(
+        f"Loading distilgpt2 model ({env.PERPLEXITY_BACKEND} backend, "
+        f"{env.PERPLEXITY_DTYPE})..."
+    )
+    with stage("load_model"):
+        reference = reference_model_cache.get(
+            "distilgpt2", dtype=env.PERPLEXITY_DTYPE, backend=env.PERPLEXITY_BACKEND
+        )
     
-    # 4. Calculate perplexity
+    # Paired mode scores the clean texts as well, reusing their shared prefix
+    if env.PERPLEXITY_PAIRED:
+        run_paired_perplexity(
+            df, reference, clean_input_path, output_path, clean_output_path
+        )
+        print("Done.")
+        return
+    
+    # 4. Calculate perplexity (each distinct text is scored once and scores
+    # already stored in the persistent score cache are reused). Token ids are
+    # read from the token store, written on the first run over this data
     print("Calculating perplexity scores...")
-    with open(output_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['text', 'score'])
-        
-        for text in tqdm(texts, desc="Processing texts"):
-            if not isinstance(text, str) or not text.strip():
-                score = float("inf")
-            else:
-                try:
-                    input_ids = ref_tokenizer.encode(
-                        text,
-                        return_tensors="pt",
-                        truncation=True,
-                        max_length=1024
-                    )
-                    with torch.no_grad():
-                        outputs = ref_model(input_ids, labels=input_ids)
-                        loss = outputs.loss
-                    score = torch.exp(loss).item()
-                except Exception as e:
-                    print(f"Warning: Error processing text (length {len(text)}): {e}")
-                    score = float("inf")
-            
-            csv_writer.writerow([text, score])
+    with stage("dedup"):
+        dedup = dedup_texts(texts)
+    with stage("token_store"):
+        token_store = default_token_store(dedup, reference)
+    with stage("score"):
+        result = compute_perplexities(
+            texts,
+            reference,
+            progress=True,
+            score_cache=default_score_cache(),
+            token_nll=env.PERPLEXITY_TOKEN_NLL,
+            token_store=token_store,
+            dedup=dedup,
+        )
+    print(
+        f"Scored {result.n_unique} distinct texts for {result.n_rows} rows "
+        f"(dedup ratio {result.dedup_ratio:.2f}x, {result.n_cached} from cache)"
+    )
+    
+    # Only the row id and text digest are stored next to each score: the text
+    # itself stays in the input dataset
+    with stage("write_measures"):
+        write_measures(
+            output_path,
+            dataset_row_ids(df),
+            result.digests,
+            result.scores,
+            token_nll=result.token_nll,
+        )
     
-    print(f"Done. Perplexity scores saved to {output_csv_path}")
+    print(f"Done. Perplexity scores saved to {output_path}")
 
 
 if __name__ == "__main__":
-    run_perplexity_on_attacked_data()
+    # Logs the time spent in each stage; set PROFILE_TRACE=cprofile or torch
+    # to also save a profiler trace of the run under $CACHE_DIR/profiles
+    with profile_run("run_perplexity_on_attacked"):
+        run_perplexity_on_attacked_data()
@@ -1,32 +1,41 @@
 import pandas as pd
-import torch
-import csv
 import os
 from pathlib import Path
-from tqdm import tqdm
-from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from a4s_eval.attack.checkpoint import dataset_row_ids
+from a4s_eval.perplexity.dedup import dedup_texts
+from a4s_eval.perplexity.measures_io import write_measures
+from a4s_eval.perplexity.model_cache import reference_model_cache
+from a4s_eval.perplexity.scoring import (
+    compute_perplexities,
+    default_score_cache,
+    default_token_store,
+)
+from a4s_eval.utils import env
+from a4s_eval.utils.profiling import profile_run, stage
 
 
 def run_perplexity_on_clean_data():
     """
     Loads the original (clean) dataset, runs the perplexity metric, and saves 
-    the measures to a CSV. This provides the baseline for comparison.
+    the measures to an Arrow file. This provides the baseline for comparison.
     """
     # 1. Define file paths
     PROJECT_ROOT = Path(__file__).resolve().parent.parent
     input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
-    progress_csv_path = PROJECT_ROOT / "tests" / "data" / "measures" / "perplexity_data.csv"
+    output_path = PROJECT_ROOT / "tests" / "data" / "measures" / "perplexity_data.arrow"
     
     # Check if input file exists
     if not input_path.exists():
         raise FileNotFoundError(f"CRITICAL ERROR: Data file not found at {input_path}")
     
     # Ensure the output directory exists
-    os.makedirs(progress_csv_path.parent, exist_ok=True)
+    os.makedirs(output_path.parent, exist_ok=True)
     
     # 2. Load the original dataset
     print(f"Loading clean dataset from {input_path}...")
-    df = pd.read_parquet(input_path)
+    with stage("load_parquet"):
+        df = pd.read_parquet(input_path)
     
     # 3. Check for demo mode (limits samples but output path stays the same)
     demo_mode = os.environ.get("DEMO_MODE") == "1"
@@ -40,42 +49,55 @@ def run_perplexity_on_clean_data():
     texts = df['context'].tolist()
     print(f"Starting perplexity measurement on {len(texts)} samples...")
     
-    # 4. Initialize the reference model
-    print("Loading distilgpt2 model...")
-    ref_model_name = "distilgpt2"
-    ref_model = AutoModelForCausalLM.from_pretrained(ref_model_name)
-    ref_tokenizer = AutoTokenizer.from_pretrained(ref_model_name)
-    ref_model.eval()
+    # 4. Load the reference model
+    print(
+        f"Loading distilgpt2 model ({env.PERPLEXITY_BACKEND} backend, "
+        f"{env.PERPLEXITY_DTYPE})..."
+    )
+    with stage("load_model"):
+        reference = reference_model_cache.get(
+            "distilgpt2", dtype=env.PERPLEXITY_DTYPE, backend=env.PERPLEXITY_BACKEND
+        )
     
-    # 5. Calculate perplexity
+    # 5. Calculate perplexity (each distinct text is scored once and scores
+    # already stored in the persistent score cache are reused). Token ids are
+    # read from the token store, written on the first run over this data
     print("Calculating perplexity scores...")
-    with open(progress_csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-        csv_writer = csv.writer(csvfile)
-        csv_writer.writerow(['text', 'score'])
-        
-        for text in tqdm(texts, desc="Processing texts"):
-            if not isinstance(text, str) or not text.strip():
-                score = float("inf")
-            else:
-                try:
-                    input_ids = ref_tokenizer.encode(
-                        text,
-                        return_tensors="pt",
-                        truncation=True,
-                        max_length=1024
-                    )
-                    with torch.no_grad():
-                        outputs = ref_model(input_ids, labels=input_ids)
-                        loss = outputs.loss
-                    score = torch.exp(loss).item()
-                except Exception as e:
-                    print(f"Warning: Error processing text (length {len(text)}): {e}")
-                    score = float("inf")
-            
-            csv_writer.writerow([text, score])
+    with stage("dedup"):
+        dedup = dedup_texts(texts)
+    with stage("token_store"):
+        token_store = default_token_store(dedup, reference)
+    with stage("score"):
+        result = compute_perplexities(
+            texts,
+            reference,
+            progress=True,
+            score_cache=default_score_cache(),
+            token_nll=env.PERPLEXITY_TOKEN_NLL,
+            token_store=token_store,
+            dedup=dedup,
+        )
+    print(
+        f"Scored {result.n_unique} distinct texts for {result.n_rows} rows "
+        f"(dedup ratio {result.dedup_ratio:.2f}x, {result.n_cached} from cache)"
+    )
+    
+    # Only the row id and text digest are stored next to each score: the text
+    # itself stays in the input dataset
+    with stage("write_measures"):
+        write_measures(
+            output_path,
+            dataset_row_ids(df),
+            result.digests,
+            result.scores,
+            token_nll=result.token_nll,
+        )
     
-    print(f"Done. Perplexity scores saved to {progress_csv_path}")
+    print(f"Done. Perplexity scores saved to {output_path}")
 
 
 if __name__ == "__main__":
-    run_perplexity_on_clean_data()
+    # Logs the time spent in each stage; set PROFILE_TRACE=cprofile or torch
+    # to also save a profiler trace of the run under $CACHE_DIR/profiles
+    with profile_run("run_perplexity_on_clean"):
+        run_perplexity_on_clean_data()
@@ -0,0 +1,70 @@
+import os
+from pathlib import Path
+
+from a4s_eval.attack.word_swap import FirstCandidateAttack
+from a4s_eval.perplexity.model_cache import reference_model_cache
+from a4s_eval.perplexity.pipeline import run_pipeline
+from a4s_eval.perplexity.scoring import default_score_cache
+from a4s_eval.utils import env
+from a4s_eval.utils.profiling import profile_run
+
+
+def run_attack_and_score():
+    """
+    Streams the clean dataset through the adversarial attack and the
+    perplexity scoring of both the clean and the attacked text in a single
+    pass, and saves one table joining every row with its attacked text and
+    both scores. Scoring runs while the attack is still in progress.
+    """
+    # 1. Define file paths
+    PROJECT_ROOT = Path(__file__).resolve().parent.parent
+    input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
+    output_path = (
+        PROJECT_ROOT / "tests" / "data" / "measures" / "pipeline_results.parquet"
+    )
+
+    if not input_path.exists():
+        raise FileNotFoundError(f"CRITICAL ERROR: Data file not found at {input_path}")
+
+    # 2. Check for demo mode (limits samples but output path stays the same)
+    demo_mode = os.environ.get("DEMO_MODE") == "1"
+    limit = 50 if demo_mode else None
+    if demo_mode:
+        print("Note: DEMO MODE active - limiting to 50 samples")
+
+    # 3. Build the adversarial transformation (first candidate, like run_attack.py)
+    print("Loading adversarial transformation (WordSwapEmbedding)...")
+    attack = FirstCandidateAttack(
+        max_candidates=10, embedding_path=env.ATTACK_EMBEDDING_PATH or None
+    )
+
+    # 4. Load the reference model
+    print(
+        f"Loading distilgpt2 model ({env.PERPLEXITY_BACKEND} backend, "
+        f"{env.PERPLEXITY_DTYPE})..."
+    )
+    reference = reference_model_cache.get(
+        "distilgpt2", dtype=env.PERPLEXITY_DTYPE, backend=env.PERPLEXITY_BACKEND
+    )
+
+    # 5. Attack, score clean text and score attacked text as streaming stages
+    print(f"Attacking and scoring {input_path}...")
+    result = run_pipeline(
+        str(input_path),
+        str(output_path),
+        attack,
+        reference,
+        score_cache=default_score_cache(),
+        limit=limit,
+        progress=True,
+    )
+
+    print(f"Done. {result.n_rows} rows processed in {result.seconds:.1f}s")
+    print(f"Joined results saved to {output_path}")
+
+
+if __name__ == "__main__":
+    # Logs the time spent in each stage; set PROFILE_TRACE=cprofile or torch
+    # to also save a profiler trace of the run under $CACHE_DIR/profiles
+    with profile_run("run_pipeline"):
+        run_attack_and_score()
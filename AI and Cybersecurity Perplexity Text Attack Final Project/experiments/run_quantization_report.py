@@ -0,0 +1,57 @@
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from a4s_eval.perplexity.quantization import quantization_report
+from a4s_eval.perplexity.scoring import default_scoring_config
+
+
+def run_quantization_report():
+    """
+    Compares the int8 quantized reference model with the float32 model on a
+    sample of the clean dataset and saves the accuracy report as JSON. Use it
+    to decide whether the speedup of PERPLEXITY_DTYPE=int8 is worth the score
+    deviation for attack detection.
+    """
+    # 1. Define file paths
+    PROJECT_ROOT = Path(__file__).resolve().parent.parent
+    input_path = PROJECT_ROOT / "tests" / "data" / "squad_date_val.parquet"
+    report_path = (
+        PROJECT_ROOT / "tests" / "data" / "measures" / "quantization_report.json"
+    )
+
+    if not input_path.exists():
+        raise FileNotFoundError(f"CRITICAL ERROR: Data file not found at {input_path}")
+
+    os.makedirs(report_path.parent, exist_ok=True)
+
+    # 2. Load the clean dataset
+    print(f"Loading clean dataset from {input_path}...")
+    texts = pd.read_parquet(input_path)['context'].tolist()
+
+    # 3. Choose the sample size (smaller in demo mode)
+    demo_mode = os.environ.get("DEMO_MODE") == "1"
+    sample_size = 50 if demo_mode else 500
+
+    # 4. Score the sample with both models and compare
+    print(f"Comparing int8 and float32 distilgpt2 on {sample_size} texts...")
+    report = quantization_report(
+        texts, sample_size=sample_size, config=default_scoring_config()
+    )
+
+    print(f"Texts compared:          {report.n_samples}")
+    print(f"Mean relative deviation: {report.mean_relative_deviation:.4f}")
+    print(f"Max relative deviation:  {report.max_relative_deviation:.4f}")
+    print(f"Spearman correlation:    {report.spearman:.4f}")
+    print(f"Speedup:                 {report.speedup:.2f}x")
+
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report.to_dict(), f, indent=2)
+
+    print(f"Done. Report saved to {report_path}")
+
+
+if __name__ == "__main__":
+    run_quantization_report()
@@ -0,0 +1,219 @@
+"""Durable, append-only checkpoint of attacked rows.
+
+Each attacked row is recorded as one JSON line holding its row id, the
+original text and the attacked text. Rows are buffered and appended in
+batches, and every batch is flushed and fsynced before the next one starts,
+so an interrupted attack loses at most one batch. On restart the completed
+row ids are read back and skipped, provided the recorded original text is
+still the text of the row: a row whose text changed, e.g. because the dataset
+was regenerated or reordered and its ids are row positions, is attacked
+again. A line torn by a crash in the middle of a write is discarded when the
+checkpoint is reopened.
+
+The first line records the parameters of the attack (e.g. the embedding and
+the number of candidates). A checkpoint written with other parameters is not
+resumed: its rows are attacked again, and the old file is moved aside to
+``<path>.stale`` when the new one is started.
+"""
+
+import json
+import os
+from types import TracebackType
+from typing import Any, Mapping, TextIO
+
+import pandas as pd
+
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+
+# Number of attacked rows buffered before they are written and synced to disk
+CHECKPOINT_ROWS = 32
+
+
+class AttackCheckpoint:
+    """Append-only JSON Lines log of attacked rows keyed by row id.
+
+    Args:
+        path (str): JSON Lines file of the checkpoint
+        flush_every (int): Number of rows buffered before they are written
+        params (Mapping[str, Any] | None): JSON-serializable parameters of the
+            attack, recorded in the header of the file
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_every: int = CHECKPOINT_ROWS,
+        params: Mapping[str, Any] | None = None,
+    ) -> None:
+        self.path = path
+        self.flush_every = flush_every
+        self.params = dict(params or {})
+        self._buffer: list[dict[str, Any]] = []
+        self._file: TextIO | None = None
+
+    def _repair(self) -> None:
+        """Drop a trailing partial line left by an interrupted write."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if not data or data.endswith(b"\n"):
+                return
+            end = data.rfind(b"\n") + 1
+            f.truncate(end)
+        logger.warning(f"Discarded a partial record at the end of {self.path}")
+
+    def _read(self) -> tuple[dict[str, Any] | None, dict[str, dict[str, Any]]]:
+        """Read the recorded parameters (None without a header) and rows."""
+        params = None
+        rows: dict[str, dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    record = json.loads(line)
+                    if "row_id" in record:
+                        rows[record["row_id"]] = record
+                    else:
+                        params = record["params"]
+        return params, rows
+
+    def is_stale(self) -> bool:
+        """Return True if the file on disk was written with other parameters."""
+        if self._file is not None or not os.path.exists(self.path):
+            return False
+        params, rows = self._read()
+        if params is None and not rows:
+            return False
+        # JSON round trip, so that e.g. tuples compare equal to lists
+        return params != json.loads(json.dumps(self.params))
+
+    def rows(self) -> dict[str, dict[str, Any]]:
+        """Read the completed rows, including rows not yet flushed.
+
+        Rows of a stale checkpoint (see ``is_stale``) are not completed.
+
+        Returns:
+            dict[str, dict[str, Any]]: Record of each completed row id
+        """
+        rows = {} if self.is_stale() else self._read()[1]
+        for record in self._buffer:
+            rows[record["row_id"]] = record
+        return rows
+
+    def completed_ids(
+        self, original_texts: Mapping[str, Any] | None = None
+    ) -> set[str]:
+        """Return the ids of the completed rows.
+
+        Args:
+            original_texts (Mapping[str, Any] | None): Current text of each row
+                id. A row recorded with another original text is not
+                completed, and the record of its new attack replaces it
+
+        Returns:
+            set[str]: Ids of the rows whose attacked text can be reused
+        """
+        if self.is_stale():
+            logger.warning(
+                f"{self.path} was recorded with other attack parameters than "
+                f"{self.params}: every row will be attacked again"
+            )
+        rows = self.rows()
+        if original_texts is None:
+            return set(rows)
+        recorded = [row_id for row_id in rows if row_id in original_texts]
+        completed = {
+            row_id
+            for row_id in recorded
+            if rows[row_id]["original_text"] == original_texts[row_id]
+        }
+        if len(completed) < len(recorded):
+            logger.warning(
+                f"{len(recorded) - len(completed)} rows of {self.path} were "
+                f"recorded with another original text and will be attacked again"
+            )
+        return completed
+
+    def _open_file(self) -> TextIO:
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._repair()
+            if self.is_stale():
+                os.replace(self.path, f"{self.path}.stale")
+                logger.warning(f"Moved the stale checkpoint to {self.path}.stale")
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() == 0:
+                self._file.write(json.dumps({"params": self.params}) + "\n")
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        return self._file
+
+    def append(self, row_id: str, original_text: str, attacked_text: str) -> None:
+        """Record an attacked row, writing the buffer once it is full.
+
+        Args:
+            row_id (str): Stable identifier of the input row
+            original_text (str): Text before the attack
+            attacked_text (str): Text after the attack
+        """
+        self._buffer.append(
+            {
+                "row_id": row_id,
+                "original_text": original_text,
+                "attacked_text": attacked_text,
+            }
+        )
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffered rows and sync them to disk."""
+        if not self._buffer:
+            return
+        file = self._open_file()
+        file.write(
+            "".join(
+                json.dumps(record, ensure_ascii=False) + "\n"
+                for record in self._buffer
+            )
+        )
+        file.flush()
+        os.fsync(file.fileno())
+        self._buffer.clear()
+
+    def close(self) -> None:
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self) -> "AttackCheckpoint":
+        self._open_file()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def dataset_row_ids(df: pd.DataFrame, id_column: str = "id") -> list[str]:
+    """Return a stable identifier for every row of a dataset.
+
+    Args:
+        df (pd.DataFrame): Dataset to attack
+        id_column (str): Column holding unique row ids, if present
+
+    Returns:
+        list[str]: The id column when it is unique, else the row positions
+    """
+    if id_column in df.columns and df[id_column].is_unique:
+        return df[id_column].astype(str).tolist()
+    return [str(i) for i in range(len(df))]
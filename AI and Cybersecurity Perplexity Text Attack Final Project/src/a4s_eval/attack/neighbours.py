@@ -0,0 +1,269 @@
+"""Precomputed, memory-mapped nearest-neighbour table for word swaps.
+
+The word swap attack looks up the nearest neighbours of every word it visits.
+This module computes the top-k neighbours of every word of the embedding
+vocabulary once, and stores them with the embedding vectors as ``.npy`` files
+under ``CACHE_DIR/neighbours``. The files are opened memory-mapped, so a
+lookup is a single row read, and worker processes attacking in parallel share
+the same pages of the OS page cache instead of each holding a copy.
+
+The embedding is either TextAttack's counter-fitted GloVe embedding (the
+default, whose own precomputed neighbours are reused so swaps are unchanged)
+or a local text file in GloVe / word2vec format, for offline use.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import dataclass
+
+import numpy as np
+from textattack.shared import AbstractWordEmbedding, WordEmbedding
+
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+
+# Directory name for neighbour tables, next to the dataset and model caches
+NEIGHBOUR_DIR = "neighbours"
+VOCAB_FILE = "vocab.json"
+VECTORS_FILE = "vectors.npy"
+NEIGHBOURS_FILE = "neighbours.npy"
+
+# Source key of TextAttack's counter-fitted GloVe embedding
+COUNTERFITTED_SOURCE = "counterfitted-glove"
+
+# Memory budget of the distances computed at once: a block of rows holds
+# their float32 distances to every word and the int64 ids ranking them
+_BLOCK_BYTES = 256 << 20
+
+
+@dataclass
+class EmbeddingSource:
+    """Vocabulary and vectors of a word embedding.
+
+    Attributes:
+        key (str): Identifier of the embedding, used in the cache path.
+        words (list[str]): Vocabulary, in row order.
+        vectors (np.ndarray): Embedding matrix of shape (vocab, dim).
+        neighbours (np.ndarray | None): Precomputed neighbour ids of each word,
+            nearest first and excluding the word itself, if available.
+    """
+
+    key: str
+    words: list[str]
+    vectors: np.ndarray
+    neighbours: np.ndarray | None = None
+
+
+def embedding_key(embedding_path: str | None) -> str:
+    """Identify an embedding by its file name, size and modification time.
+
+    Embedding files are often several GB, so their content is not hashed: a
+    file that is replaced or edited gets a new modification time.
+    """
+    if not embedding_path:
+        return COUNTERFITTED_SOURCE
+    stat = os.stat(embedding_path)
+    return f"{os.path.basename(embedding_path)}-{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def read_text_embedding(path: str) -> EmbeddingSource:
+    """Read an embedding stored as text, one word and its vector per line.
+
+    Both the GloVe format and the word2vec text format (whose first line holds
+    the vocabulary size and dimension) are accepted.
+
+    Args:
+        path (str): Embedding file
+
+    Returns:
+        EmbeddingSource: Vocabulary and vectors of the file
+    """
+    words: list[str] = []
+    rows: list[np.ndarray] = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip().split(" ")
+            if len(parts) == 2 and not rows:
+                # word2vec header
+                continue
+            if len(parts) < 2:
+                continue
+            words.append(parts[0])
+            rows.append(np.asarray(parts[1:], dtype=np.float32))
+    return EmbeddingSource(
+        key=embedding_key(path),
+        words=words,
+        vectors=np.stack(rows),
+    )
+
+
+def counterfitted_embedding() -> EmbeddingSource:
+    """Load TextAttack's counter-fitted GloVe embedding (downloaded once)."""
+    embedding = WordEmbedding.counterfitted_GLOVE_embedding()
+    words = [embedding.index2word(i) for i in range(len(embedding.embedding_matrix))]
+    return EmbeddingSource(
+        key=COUNTERFITTED_SOURCE,
+        words=words,
+        vectors=np.asarray(embedding.embedding_matrix, dtype=np.float32),
+        # The first column of TextAttack's table is the word itself
+        neighbours=np.asarray(embedding.nn_matrix)[:, 1:],
+    )
+
+
+def top_k_neighbours(vectors: np.ndarray, k: int) -> np.ndarray:
+    """Compute the k nearest neighbours of every row by L2 distance.
+
+    Rows are processed in blocks sized so that their distances to the whole
+    vocabulary fit in ``_BLOCK_BYTES``, whatever the size of the vocabulary.
+
+    Args:
+        vectors (np.ndarray): Embedding matrix of shape (vocab, dim)
+        k (int): Number of neighbours per word
+
+    Returns:
+        np.ndarray: Neighbour ids of shape (vocab, k), nearest first
+    """
+    n_words = len(vectors)
+    k = min(k, n_words - 1)
+    vectors = vectors.astype(np.float32)
+    sq_norms = np.einsum("ij,ij->i", vectors, vectors)
+    table = np.empty((n_words, k), dtype=np.int32)
+    block_rows = max(1, _BLOCK_BYTES // (12 * n_words))
+    for start in range(0, n_words, block_rows):
+        block = vectors[start : start + block_rows]
+        rows = np.arange(start, start + len(block))
+        # Updated in place, so that no second matrix of the block is allocated
+        distances = block @ vectors.T
+        distances *= -2
+        distances += sq_norms[None, :]
+        distances += sq_norms[rows, None]
+        distances[np.arange(len(block)), rows] = np.inf
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.argsort(
+            np.take_along_axis(distances, nearest, axis=1), axis=1, kind="stable"
+        )
+        table[rows] = np.take_along_axis(nearest, order, axis=1)
+    return table
+
+
+def neighbour_table_dir(source_key: str, k: int) -> str:
+    return f"{env.CACHE_DIR}/{NEIGHBOUR_DIR}/{source_key}-k{k}"
+
+
+def build_neighbour_table(source: EmbeddingSource, k: int) -> str:
+    """Write the vocabulary, vectors and top-k neighbour table of an embedding.
+
+    The files are written to a temporary directory that is renamed once
+    complete, so readers never see a partial table.
+
+    Args:
+        source (EmbeddingSource): Embedding to index
+        k (int): Number of neighbours per word
+
+    Returns:
+        str: Directory holding the table
+    """
+    path = neighbour_table_dir(source.key, k)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    if source.neighbours is not None and source.neighbours.shape[1] >= k:
+        neighbours = source.neighbours[:, :k]
+    else:
+        neighbours = top_k_neighbours(source.vectors, k)
+
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        with open(os.path.join(tmp_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(source.words, f, ensure_ascii=False)
+        np.save(os.path.join(tmp_dir, VECTORS_FILE), source.vectors)
+        np.save(os.path.join(tmp_dir, NEIGHBOURS_FILE), neighbours.astype(np.int32))
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Another process finished the same table first
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(f"Built nearest-neighbour table {path}")
+    return path
+
+
+def ensure_neighbour_table(embedding_path: str | None, k: int) -> str:
+    """Return the table directory of an embedding, building it on first use.
+
+    Args:
+        embedding_path (str | None): Local embedding file, or None for
+            TextAttack's counter-fitted GloVe embedding
+        k (int): Number of neighbours per word
+
+    Returns:
+        str: Directory holding the table
+    """
+    path = neighbour_table_dir(embedding_key(embedding_path), k)
+    if os.path.isdir(path):
+        return path
+    source = (
+        read_text_embedding(embedding_path)
+        if embedding_path
+        else counterfitted_embedding()
+    )
+    return build_neighbour_table(source, k)
+
+
+class MmapWordEmbedding(AbstractWordEmbedding):
+    """TextAttack word embedding backed by a memory-mapped neighbour table.
+
+    Args:
+        path (str): Directory written by ``build_neighbour_table``
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(os.path.join(path, VOCAB_FILE), encoding="utf-8") as f:
+            self._index2word: list[str] = json.load(f)
+        self._word2index = {word: i for i, word in enumerate(self._index2word)}
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        self.neighbours = np.load(os.path.join(path, NEIGHBOURS_FILE), mmap_mode="r")
+
+    @property
+    def k(self) -> int:
+        return self.neighbours.shape[1]
+
+    def _index(self, word_or_index: str | int) -> int:
+        if isinstance(word_or_index, str):
+            return self._word2index[word_or_index]
+        return word_or_index
+
+    def __getitem__(self, index: str | int) -> np.ndarray | None:
+        try:
+            return np.asarray(self.vectors[self._index(index)])
+        except (KeyError, IndexError):
+            return None
+
+    def word2index(self, word: str) -> int:
+        return self._word2index[word]
+
+    def index2word(self, index: int) -> str:
+        return self._index2word[index]
+
+    def get_mse_dist(self, a: str | int, b: str | int) -> float:
+        diff = self.vectors[self._index(a)] - self.vectors[self._index(b)]
+        return float(np.sum(diff**2))
+
+    def get_cos_sim(self, a: str | int, b: str | int) -> float:
+        e1, e2 = self.vectors[self._index(a)], self.vectors[self._index(b)]
+        return float(e1 @ e2 / (np.linalg.norm(e1) * np.linalg.norm(e2)))
+
+    def nearest_neighbours(self, index: str | int, topn: int) -> list[int]:
+        """Return the ``topn`` nearest neighbours of a word, nearest first.
+
+        Raises:
+            ValueError: If ``topn`` exceeds the size of the table
+        """
+        if topn > self.k:
+            raise ValueError(f"Neighbour table holds {self.k} neighbours, not {topn}")
+        return self.neighbours[self._index(index), :topn].tolist()
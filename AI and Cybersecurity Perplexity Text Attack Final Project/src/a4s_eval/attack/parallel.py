@@ -0,0 +1,120 @@
+"""Parallel execution of a text attack across a pool of worker processes.
+
+Each worker builds the attack once from a picklable factory (for the word swap
+attack, this loads the embedding once per worker) and attacks chunks of texts.
+Chunks are dispatched in input order with a bounded number in flight, and
+results are yielded in input order, so the output is identical to a serial
+run and can be checkpointed as it streams back.
+"""
+
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from types import TracebackType
+from typing import Callable, Iterable, Iterator
+
+import torch
+
+from a4s_eval.perplexity.sharding import threads_per_worker
+
+AttackFn = Callable[[str], str]
+
+# Number of texts sent to a worker at once
+ATTACK_CHUNK_ROWS = 8
+
+# Number of chunks queued per worker, so that workers never wait for work
+CHUNKS_IN_FLIGHT_PER_WORKER = 2
+
+# Attack of the current worker process, set by the pool initializer
+_worker_attack: AttackFn | None = None
+
+
+def _init_worker(factory: Callable[[], AttackFn], n_threads: int) -> None:
+    global _worker_attack
+    torch.set_num_threads(n_threads)
+    _worker_attack = factory()
+
+
+def _attack_chunk(texts: list[str]) -> list[str]:
+    if _worker_attack is None:
+        raise RuntimeError("Attack worker was not initialized")
+    return [_worker_attack(text) for text in texts]
+
+
+class ParallelAttack:
+    """Attack texts in input order, serially or across worker processes.
+
+    Args:
+        factory (Callable[[], AttackFn]): Picklable callable building the
+            attack, called once in each worker
+        num_workers (int): Number of worker processes; 1 attacks in-process
+        chunk_size (int): Number of texts sent to a worker at once
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], AttackFn],
+        num_workers: int = 1,
+        chunk_size: int = ATTACK_CHUNK_ROWS,
+    ) -> None:
+        self.factory = factory
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        self._attack: AttackFn | None = None
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Workers are spawned: forking after torch initialized its thread
+            # pool can deadlock
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.factory, threads_per_worker(self.num_workers)),
+            )
+        return self._pool
+
+    def map(self, texts: Iterable[str]) -> Iterator[str]:
+        """Attack texts lazily, yielding results in input order.
+
+        Args:
+            texts (Iterable[str]): Texts to attack
+
+        Returns:
+            Iterator[str]: Attacked version of each text
+        """
+        if self.num_workers <= 1:
+            if self._attack is None:
+                self._attack = self.factory()
+            for text in texts:
+                yield self._attack(text)
+            return
+
+        pool = self._get_pool()
+        max_in_flight = self.num_workers * CHUNKS_IN_FLIGHT_PER_WORKER
+        in_flight: deque[Future[list[str]]] = deque()
+        iterator = iter(texts)
+        while chunk := list(islice(iterator, self.chunk_size)):
+            in_flight.append(pool.submit(_attack_chunk, chunk))
+            if len(in_flight) >= max_in_flight:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def __enter__(self) -> "ParallelAttack":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
@@ -0,0 +1,81 @@
+"""Word swap attack used to generate the adversarial dataset.
+
+The attack replaces a word with one of its nearest neighbours in a
+counter-fitted word embedding (TextAttack's ``WordSwapEmbedding``) and keeps
+the first candidate text, or the original text when there is none.
+
+Calling a TextAttack transformation builds every candidate text for every word
+position before the first one can be used. ``iter_word_swaps`` yields the same
+candidates, in the same order, one at a time: replacement words are looked up
+and candidate texts are built only until the caller stops iterating.
+"""
+
+from itertools import islice
+from typing import Iterator
+
+from textattack.shared import AttackedText
+from textattack.transformations import WordSwap, WordSwapEmbedding
+
+from a4s_eval.attack.neighbours import MmapWordEmbedding, ensure_neighbour_table
+
+
+def iter_word_swaps(
+    transformation: WordSwap, text: AttackedText
+) -> Iterator[AttackedText]:
+    """Lazily yield the candidates of ``transformation(text)``.
+
+    Mirrors ``WordSwap._get_transformations``: word positions are visited in
+    ascending order and each replacement that differs from the original word
+    gives one candidate.
+
+    Args:
+        transformation (WordSwap): Word swap transformation
+        text (AttackedText): Text to transform
+
+    Returns:
+        Iterator[AttackedText]: Candidate texts, in the eager order
+    """
+    words = text.words
+    for i in sorted(transformation(text, return_indices=True)):
+        word = words[i]
+        for replacement in transformation._get_replacement_words(word):
+            if replacement == word:
+                continue
+            candidate = text.replace_word_at_index(i, replacement)
+            candidate.attack_attrs["last_transformation"] = transformation
+            yield candidate
+
+
+def first_word_swaps(
+    transformation: WordSwap, text: AttackedText, k: int = 1
+) -> list[AttackedText]:
+    """Return the first ``k`` candidates, building no others."""
+    return list(islice(iter_word_swaps(transformation, text), k))
+
+
+class FirstCandidateAttack:
+    """Attack returning the first ``WordSwapEmbedding`` candidate of a text.
+
+    Neighbours are read from the memory-mapped table of the embedding, built
+    under ``CACHE_DIR`` on first use.
+
+    Args:
+        max_candidates (int): Nearest neighbours considered per word
+        embedding_path (str | None): Local embedding file in GloVe or word2vec
+            text format, or None for TextAttack's counter-fitted embedding
+    """
+
+    def __init__(
+        self, max_candidates: int = 10, embedding_path: str | None = None
+    ) -> None:
+        table = ensure_neighbour_table(embedding_path, max_candidates)
+        self.transformation = WordSwapEmbedding(
+            max_candidates=max_candidates, embedding=MmapWordEmbedding(table)
+        )
+
+    def __call__(self, text: str) -> str:
+        candidates = iter_word_swaps(self.transformation, AttackedText(text))
+        candidate = next(candidates, None)
+        if candidate is not None:
+            return candidate.text
+        return text
@@ -1,10 +1,20 @@
 """Data model for representing evaluation metrics and their associated metadata."""
 
+import json
 import uuid
+from dataclasses import dataclass, replace
 from datetime import datetime
+from typing import TYPE_CHECKING, Iterator, Sequence, overload
 
+import numpy as np
 from pydantic import BaseModel, field_serializer
 
+if TYPE_CHECKING:
+    # Imported where used: the data model is imported by every metric and
+    # worker, most of which never build a DataFrame or an Arrow table
+    import pandas as pd
+    import pyarrow as pa
+
 
 class Measure(BaseModel):
     """Represents a single evaluation metric with its value and associated metadata.
@@ -27,3 +37,134 @@ class Measure(BaseModel):
     @field_serializer("feature_pid")
     def serialize_pid(self, pid: uuid.UUID | None) -> str | None:
         return str(pid) if pid is not None else None
+
+
+@dataclass(frozen=True, eq=False)
+class MeasureBatch(Sequence[Measure]):
+    """Scores of one metric over many samples, stored as columns.
+
+    Per-sample metrics such as perplexity produce one score per row. Instead of
+    one ``Measure`` per row, the batch keeps the scores in a single NumPy array
+    and the name, timestamp and feature pid once. It behaves as a read-only
+    sequence of ``Measure``, built on access, and serializes all rows at once.
+
+    Attributes:
+        name (str): Name of the metric.
+        scores (np.ndarray): float64 score of each sample.
+        time (datetime): Timestamp shared by all samples.
+        feature_pid (uuid.UUID | None): Feature the scores refer to, if any.
+    """
+
+    name: str
+    scores: np.ndarray
+    time: datetime
+    feature_pid: uuid.UUID | None = None
+
+    def __post_init__(self) -> None:
+        scores = np.asarray(self.scores, dtype=np.float64)
+        if scores.ndim != 1:
+            raise ValueError(f"scores must be one-dimensional, got {scores.shape}")
+        object.__setattr__(self, "scores", scores)
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    @overload
+    def __getitem__(self, index: int) -> Measure: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "MeasureBatch": ...
+
+    def __getitem__(self, index: int | slice) -> "Measure | MeasureBatch":
+        if isinstance(index, slice):
+            return replace(self, scores=self.scores[index])
+        return Measure(
+            name=self.name,
+            score=float(self.scores[index]),
+            time=self.time,
+            feature_pid=self.feature_pid,
+        )
+
+    def __iter__(self) -> Iterator[Measure]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_measures(self) -> list[Measure]:
+        """Build one ``Measure`` per sample."""
+        return list(self)
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Return the rows as the ``model_dump()`` of each ``Measure`` would."""
+        import pandas as pd
+
+        n = len(self)
+        return pd.DataFrame(
+            {
+                "name": [self.name] * n,
+                "score": self.scores,
+                "time": [self.time.isoformat()] * n,
+                "feature_pid": [
+                    str(self.feature_pid) if self.feature_pid is not None else None
+                ]
+                * n,
+            }
+        )
+
+    def to_arrow(self) -> "pa.Table":
+        """Return the rows as an Arrow table with a timestamp column."""
+        import pyarrow as pa
+
+        n = len(self)
+        pid = str(self.feature_pid) if self.feature_pid is not None else None
+        return pa.table(
+            {
+                "name": pa.repeat(pa.scalar(self.name, pa.string()), n),
+                "score": pa.array(self.scores, pa.float64()),
+                "time": pa.repeat(pa.scalar(self.time), n),
+                "feature_pid": pa.repeat(pa.scalar(pid, pa.string()), n),
+            }
+        )
+
+    def to_json(self, lossless: bool = False) -> str:
+        """Serialize the batch with the shared fields stored once.
+
+        Non-finite scores are written as null, as ``Measure.model_dump_json``
+        does, which ``from_json`` reads back as nan.
+
+        Args:
+            lossless (bool): Write non-finite scores as the strings "nan",
+                "inf" and "-inf" instead, so that ``from_json`` restores them
+        """
+        return json.dumps(
+            {
+                "name": self.name,
+                "time": self.time.isoformat(),
+                "feature_pid": (
+                    str(self.feature_pid) if self.feature_pid is not None else None
+                ),
+                "scores": [
+                    score
+                    if np.isfinite(score)
+                    else (str(score) if lossless else None)
+                    for score in self.scores.tolist()
+                ],
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "MeasureBatch":
+        values = json.loads(data)
+        return cls(
+            name=values["name"],
+            scores=np.array(
+                [
+                    np.nan if score is None else float(score)
+                    for score in values["scores"]
+                ],
+                dtype=np.float64,
+            ),
+            time=datetime.fromisoformat(values["time"]),
+            feature_pid=(
+                uuid.UUID(values["feature_pid"]) if values["feature_pid"] else None
+            ),
+        )
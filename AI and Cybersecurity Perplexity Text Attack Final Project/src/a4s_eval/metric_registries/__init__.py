@@ -2,7 +2,7 @@ import importlib
 import pkgutil
 from types import ModuleType
 
-import a4s_eval.metrics
+from a4s_eval.metric_registries.manifest import MODEL_METRICS
 from a4s_eval.metric_registries.model_metric_registry import (
     ModelMetricRegistry,
     model_metric_registry,
@@ -26,8 +26,12 @@ def auto_discover(package: ModuleType) -> None:
             auto_discover(module)  # recurse into subpackage
 
 
-auto_discover(a4s_eval.metrics)
+# Metrics are declared from the manifest and their modules imported on first
+# call, so importing the registries does not import torch or transformers.
+# Call auto_discover(a4s_eval.metrics) to import every metric module upfront.
+for metric_name, module_path in MODEL_METRICS.items():
+    model_metric_registry.declare(metric_name, module_path)
 
 
 def get_n_evaluation() -> int:
-    return sum([len(r.get_functions()) for r in registries])
+    return sum([len(r.names()) for r in registries])
@@ -0,0 +1,102 @@
+"""Intermediate results shared by the metrics of one evaluation.
+
+Several metrics of an evaluation need the same intermediate results, such as
+the token ids of the text column or the predictions of the model on the
+features. A metric asks for one with ``shared_artifact(key, compute)``: while
+the evaluation engine runs, the first metric to ask computes it and every
+other metric gets the same object, even when they run concurrently in
+threads. Outside the engine, or in a metric running in another process, the
+artifact is simply computed.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from a4s_eval.data_model.evaluation import DataShape, Dataset
+    from a4s_eval.service.functional_model import TabularClassificationModel
+
+T = TypeVar("T")
+
+
+class ArtifactStore:
+    """Thread-safe store computing each artifact once."""
+
+    def __init__(self) -> None:
+        self._values: dict[Hashable, Any] = {}
+        self._locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Return the artifact of a key, computing it on first request.
+
+        Concurrent requests for the same key wait for a single computation;
+        requests for other keys are not blocked.
+        """
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._values:
+                with self._lock:
+                    self.hits += 1
+                return self._values[key]
+            value = compute()
+            with self._lock:
+                self._values[key] = value
+                self.misses += 1
+            return value
+
+    def keys(self) -> list[Hashable]:
+        with self._lock:
+            return list(self._values)
+
+
+# Store of the evaluation running in the current context, if any
+_current_store: ContextVar[ArtifactStore | None] = ContextVar(
+    "artifact_store", default=None
+)
+
+
+@contextmanager
+def artifact_scope(store: ArtifactStore) -> Iterator[ArtifactStore]:
+    """Make ``store`` the store of ``shared_artifact`` calls in this context."""
+    token = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(token)
+
+
+def shared_artifact(key: Hashable, compute: Callable[[], T]) -> T:
+    """Return an artifact shared with the other metrics of the evaluation.
+
+    Args:
+        key (Hashable): Identifies the artifact within the evaluation, e.g.
+            ``("token_store", "context", model_id)``
+        compute (Callable[[], T]): Computes the artifact when it is missing
+
+    Returns:
+        T: The shared artifact, or a newly computed one outside an evaluation
+    """
+    store = _current_store.get()
+    if store is None:
+        return compute()
+    return store.get_or_compute(key, compute)
+
+
+def shared_predictions(
+    datashape: "DataShape",
+    dataset: "Dataset",
+    functional_model: "TabularClassificationModel",
+) -> Any:
+    """Return the class predictions of the model on the dataset features."""
+    columns = [feature.name for feature in datashape.features]
+
+    def predict() -> Any:
+        return functional_model.predict_class(dataset.data[columns].to_numpy())
+
+    return shared_artifact(("predict_class", tuple(columns)), predict)
@@ -0,0 +1,274 @@
+"""Concurrent execution of the registered metrics of an evaluation.
+
+The engine loads the evaluation's dataset once and runs every selected metric
+on it concurrently. Each metric runs according to the executor hint it was
+registered with (``@model_metric(name, executor=...)``):
+
+* ``thread``: in a thread of the engine's process. Threads share the loaded
+  reference models and the evaluation's artifact store, so intermediate
+  results such as token ids or predictions are computed once for all
+  metrics (see ``a4s_eval.metric_registries.artifacts``). Metrics spending
+  their time in NumPy, PyTorch or ONNX Runtime release the GIL and run in
+  parallel.
+* ``process``: in a separate process, for metrics running pure-Python loops
+  that would hold the GIL. Their arguments must be picklable and they compute
+  their own artifacts. Where processes cannot be started, e.g. in a daemonic
+  worker process, the engine is built with ``use_processes=False`` and these
+  metrics run in threads as well.
+
+A metric that raises does not stop the others: its error is logged and
+returned with its run. An evaluation can run without a functional model when
+none of its metrics needs one (``@model_metric(name, needs_model=False)``);
+otherwise it is rejected before any metric runs.
+"""
+
+import multiprocessing as mp
+import time
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from contextlib import ExitStack
+from contextvars import copy_context
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Sequence
+
+from a4s_eval.metric_registries.artifacts import ArtifactStore, artifact_scope
+from a4s_eval.metric_registries.model_metric_registry import (
+    ModelMetric,
+    ModelMetricRegistry,
+    model_metric_registry,
+)
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.utils.profiling import count, profile_run, stage
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from a4s_eval.data_model.evaluation import Dataset, Evaluation
+    from a4s_eval.data_model.measure import Measure
+    from a4s_eval.service.functional_model import TabularClassificationModel
+
+logger = get_logger()
+
+
+@dataclass
+class MetricRun:
+    """Outcome of one metric of an evaluation.
+
+    Attributes:
+        name (str): Name of the metric.
+        executor (str): 'thread' or 'process'.
+        measures (Sequence[Measure]): Measures returned by the metric, empty
+            if it failed.
+        wall_seconds (float): Time spent in the metric call, nan if it failed.
+        error (str | None): Error raised by the metric, if any.
+    """
+
+    name: str
+    executor: str
+    measures: "Sequence[Measure]" = field(default_factory=list)
+    wall_seconds: float = float("nan")
+    error: str | None = None
+
+
+@dataclass
+class EvaluationResult:
+    """Outcome of all metrics of an evaluation.
+
+    Attributes:
+        runs (list[MetricRun]): One run per metric, in registry order.
+        load_seconds (float): Time spent loading the dataset.
+        wall_seconds (float): Total time of the evaluation.
+        artifacts (list[Hashable]): Keys of the artifacts shared by metrics.
+    """
+
+    runs: list[MetricRun]
+    load_seconds: float
+    wall_seconds: float
+    artifacts: list[Hashable] = field(default_factory=list)
+
+    @property
+    def measures(self) -> "list[Measure]":
+        """All measures of all metrics, in registry order."""
+        return [measure for run in self.runs for measure in run.measures]
+
+    @property
+    def errors(self) -> dict[str, str]:
+        return {run.name: run.error for run in self.runs if run.error is not None}
+
+
+def _timed_call(
+    func: ModelMetric, args: tuple[Any, ...]
+) -> "tuple[Sequence[Measure], float]":
+    start = time.perf_counter()
+    measures = func(*args)
+    return measures, time.perf_counter() - start
+
+
+class EvaluationEngine:
+    """Runs the metrics of a registry concurrently over one dataset load.
+
+    Args:
+        registry (ModelMetricRegistry): Registry of the metrics to run
+        metrics (Sequence[str] | None): Names of the metrics to run, all
+            declared and registered metrics if None
+        max_workers (int | None): Maximum number of threads, and of processes,
+            running metrics; one per metric if None
+        load_data (Callable[[Dataset], pd.DataFrame] | None): Loads the data
+            of a dataset whose ``data`` is not set
+        use_processes (bool): Run 'process' metrics in processes; if False,
+            they run in threads like the others
+    """
+
+    def __init__(
+        self,
+        registry: ModelMetricRegistry = model_metric_registry,
+        metrics: Sequence[str] | None = None,
+        max_workers: int | None = None,
+        load_data: "Callable[[Dataset], pd.DataFrame] | None" = None,
+        use_processes: bool = True,
+    ) -> None:
+        self.registry = registry
+        self.metrics = metrics
+        self.max_workers = max_workers
+        self.load_data = load_data
+        self.use_processes = use_processes
+
+    def selected(self) -> list[str]:
+        """Return the names of the metrics the engine runs."""
+        return self.registry.names() if self.metrics is None else list(self.metrics)
+
+    def check_model(
+        self, functional_model: "TabularClassificationModel | None"
+    ) -> None:
+        """Check that the selected metrics can run with ``functional_model``.
+
+        The modules of the selected metrics are imported, as they register
+        whether the metric needs a model.
+
+        Raises:
+            KeyError: If a selected metric is not in the registry
+            ValueError: If ``functional_model`` is None and a selected metric
+                needs a model
+        """
+        if functional_model is not None:
+            return
+        names = self.selected()
+        for name in names:
+            self.registry.get(name)
+        needing = [name for name in names if self.registry.needs_model(name)]
+        if needing:
+            raise ValueError(
+                f"Metrics {needing} need a functional model and none was given"
+            )
+
+    def _load_dataset(self, dataset: "Dataset") -> "Dataset":
+        if dataset.data is not None:
+            return dataset
+        if self.load_data is None:
+            raise ValueError(f"Dataset {dataset.pid} has no data and no loader")
+        return dataset.model_copy(update={"data": self.load_data(dataset)})
+
+    def run(
+        self,
+        evaluation: "Evaluation",
+        functional_model: "TabularClassificationModel | None" = None,
+    ) -> EvaluationResult:
+        """Run every selected metric on the evaluation's dataset and model.
+
+        Args:
+            evaluation (Evaluation): Dataset, model and project to evaluate
+            functional_model (TabularClassificationModel | None): Prediction
+                functions of the model, None if no selected metric needs them
+
+        Returns:
+            EvaluationResult: Measures and wall time of each metric
+
+        Raises:
+            ValueError: If the dataset has no data and no loader is set, or if
+                no functional model is given and a selected metric needs one
+            KeyError: If a selected metric is not in the registry
+        """
+        self.check_model(functional_model)
+        names = self.selected()
+        start = time.perf_counter()
+        with profile_run("evaluation"):
+            count("metrics", len(names))
+
+            # The dataset is loaded once and passed to every metric
+            with stage("load_data"):
+                dataset = self._load_dataset(evaluation.dataset)
+            load_seconds = time.perf_counter() - start
+            model = evaluation.model.model_copy(update={"dataset": dataset})
+            args = (dataset.shape, model, dataset, functional_model)
+
+            # Metric modules are imported here, once, before any thread starts
+            funcs = {name: self.registry.get(name) for name in names}
+            executors = {name: self._executor(name) for name in names}
+            store = ArtifactStore()
+            futures: dict[str, Future] = {}
+            with ExitStack() as stack:
+                pools = self._pools(stack, list(executors.values()))
+                with artifact_scope(store):
+                    for name in names:
+                        if executors[name] == "process":
+                            futures[name] = pools["process"].submit(
+                                _timed_call, funcs[name], args
+                            )
+                        else:
+                            # Each thread runs in a copy of this context, which
+                            # holds the evaluation's artifact store
+                            futures[name] = pools["thread"].submit(
+                                copy_context().run, _timed_call, funcs[name], args
+                            )
+                runs = [
+                    self._collect(name, executors[name], futures[name])
+                    for name in names
+                ]
+
+        return EvaluationResult(
+            runs=runs,
+            load_seconds=load_seconds,
+            wall_seconds=time.perf_counter() - start,
+            artifacts=store.keys(),
+        )
+
+    def _executor(self, name: str) -> str:
+        executor = self.registry.executor(name)
+        return executor if self.use_processes else "thread"
+
+    def _pools(self, stack: ExitStack, executors: list[str]) -> dict[str, Executor]:
+        pools: dict[str, Executor] = {}
+        n_threads = executors.count("thread")
+        if n_threads:
+            pools["thread"] = stack.enter_context(
+                ThreadPoolExecutor(
+                    max_workers=min(self.max_workers or n_threads, n_threads),
+                    thread_name_prefix="metric",
+                )
+            )
+        n_processes = executors.count("process")
+        if n_processes:
+            # Spawned, not forked, so workers do not inherit the engine's threads
+            pools["process"] = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=min(self.max_workers or n_processes, n_processes),
+                    mp_context=mp.get_context("spawn"),
+                )
+            )
+        return pools
+
+    @staticmethod
+    def _collect(name: str, executor: str, future: Future) -> MetricRun:
+        try:
+            measures, seconds = future.result()
+        except Exception as e:
+            logger.error(f"Metric {name} failed: {e!r}")
+            return MetricRun(name=name, executor=executor, error=repr(e))
+        logger.info(f"Metric {name} ({executor}) took {seconds:.2f}s")
+        return MetricRun(
+            name=name, executor=executor, measures=measures, wall_seconds=seconds
+        )
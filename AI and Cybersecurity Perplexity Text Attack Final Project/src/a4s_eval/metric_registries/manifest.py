@@ -0,0 +1,15 @@
+"""Names and modules of the built-in metrics.
+
+The registry declares these metrics at import time without importing their
+modules, which pull in heavy dependencies (pandas, onnxruntime, torch,
+transformers). A module is imported the first time one of its metrics is
+called. A new metric module must be listed here to be available through the
+registry; ``tests/test_metric_registry.py`` checks that the manifest matches
+the modules under ``a4s_eval.metrics``.
+"""
+
+# Metric name -> module whose @model_metric decorator registers it
+MODEL_METRICS: dict[str, str] = {
+    "accuracy": "a4s_eval.metrics.model_metrics.accuracy",
+    "perplexity": "a4s_eval.metrics.model_metrics.perplexity_metric",
+}
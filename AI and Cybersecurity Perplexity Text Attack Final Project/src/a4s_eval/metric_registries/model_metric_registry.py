@@ -1,33 +1,155 @@
-from typing import Callable, Iterator, Protocol
+import importlib
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, Protocol, Sequence
 
-from a4s_eval.data_model.evaluation import DataShape, Dataset, Model
-from a4s_eval.data_model.measure import Measure
-from a4s_eval.service.functional_model import TabularClassificationModel
 from a4s_eval.utils.logging import get_logger
 
+if TYPE_CHECKING:
+    # Only needed for annotations: importing them at runtime pulls in pandas,
+    # onnxruntime and torch when the registry is imported
+    from a4s_eval.data_model.evaluation import DataShape, Dataset, Model
+    from a4s_eval.data_model.measure import Measure
+    from a4s_eval.service.functional_model import TabularClassificationModel
+
 
 logger = get_logger()
 
+# Ways the evaluation engine can run a metric: in a thread of the engine's
+# process, sharing loaded models and artifacts, or in a separate process for
+# CPU-bound pure-Python metrics that would otherwise hold the GIL
+METRIC_EXECUTORS = ("thread", "process")
+
+# Ways a distributed run combines the measures a metric returns for each chunk
+# of a dataset: 'concat' joins per-sample measures in row order, 'mean'
+# averages per-dataset measures weighted by the number of rows of each chunk
+METRIC_REDUCTIONS = ("concat", "mean")
+
 
 class ModelMetric(Protocol):
     def __call__(
         self,
-        datashape: DataShape,
-        model: Model,
-        dataset: Dataset,
-        functional_model: TabularClassificationModel,
-    ) -> list[Measure]:
+        datashape: "DataShape",
+        model: "Model",
+        dataset: "Dataset",
+        functional_model: "TabularClassificationModel",
+    ) -> "Sequence[Measure]":
         raise NotImplementedError
 
 
+class LazyMetric:
+    """Placeholder for a declared metric whose module is not imported yet.
+
+    The first call imports the module, whose ``@model_metric`` decorator
+    replaces the placeholder in the registry, and forwards to the real metric.
+
+    Args:
+        registry (ModelMetricRegistry): Registry the metric is declared in
+        name (str): Name of the metric
+        module (str): Dotted path of the module defining the metric
+    """
+
+    def __init__(self, registry: "ModelMetricRegistry", name: str, module: str):
+        self.registry = registry
+        self.name = name
+        self.module = module
+
+    def load(self) -> ModelMetric:
+        """Import the metric's module and return the registered metric.
+
+        Raises:
+            LookupError: If the module does not register a metric of this name
+        """
+        start = time.perf_counter()
+        importlib.import_module(self.module)
+        func = self.registry.get_functions().get(self.name)
+        if func is None or isinstance(func, LazyMetric):
+            raise LookupError(
+                f"Module {self.module} does not register metric {self.name!r}"
+            )
+        logger.debug(
+            f"Loaded metric {self.name} from {self.module} in "
+            f"{time.perf_counter() - start:.3f}s"
+        )
+        return func
+
+    def __call__(
+        self,
+        datashape: "DataShape",
+        model: "Model",
+        dataset: "Dataset",
+        functional_model: "TabularClassificationModel",
+    ) -> "Sequence[Measure]":
+        return self.load()(datashape, model, dataset, functional_model)
+
+    def __repr__(self) -> str:
+        return f"LazyMetric({self.name!r}, {self.module!r})"
+
+
 class ModelMetricRegistry:
     def __init__(self) -> None:
         self._functions: dict[str, ModelMetric] = {}
+        self._executors: dict[str, str] = {}
+        self._reductions: dict[str, str] = {}
+        self._needs_model: dict[str, bool] = {}
         logger.debug("ModelMetricRegistry initialized")
 
-    def register(self, name: str, func: ModelMetric) -> None:
+    def register(
+        self,
+        name: str,
+        func: ModelMetric,
+        executor: str = "thread",
+        reduce: str = "concat",
+        needs_model: bool = True,
+    ) -> None:
+        if executor not in METRIC_EXECUTORS:
+            raise ValueError(
+                f"Unknown executor {executor!r} for metric {name}, "
+                f"expected one of {METRIC_EXECUTORS}"
+            )
+        if reduce not in METRIC_REDUCTIONS:
+            raise ValueError(
+                f"Unknown reduction {reduce!r} for metric {name}, "
+                f"expected one of {METRIC_REDUCTIONS}"
+            )
         logger.debug(f"Registering metric evaluator: {name}")
         self._functions[name] = func
+        self._executors[name] = executor
+        self._reductions[name] = reduce
+        self._needs_model[name] = needs_model
+
+    def executor(self, name: str) -> str:
+        """Return how the evaluation engine runs a metric ('thread' by default)."""
+        return self._executors.get(name, "thread")
+
+    def reduction(self, name: str) -> str:
+        """Return how chunk results of a metric are combined ('concat' by default)."""
+        return self._reductions.get(name, "concat")
+
+    def needs_model(self, name: str) -> bool:
+        """Return whether a metric calls the functional model (True by default)."""
+        return self._needs_model.get(name, True)
+
+    def declare(self, name: str, module: str) -> None:
+        """Declare a metric defined in ``module`` without importing it.
+
+        A metric that is already registered is left as is.
+        """
+        self._functions.setdefault(name, LazyMetric(self, name, module))
+
+    def get(self, name: str) -> ModelMetric:
+        """Return a metric, importing its module if it is only declared.
+
+        Raises:
+            KeyError: If no metric of this name is declared or registered
+        """
+        func = self._functions[name]
+        if isinstance(func, LazyMetric):
+            return func.load()
+        return func
+
+    def names(self) -> list[str]:
+        """Return the declared and registered metric names, without importing."""
+        return list(self._functions)
 
     def __iter__(self) -> Iterator[tuple[str, ModelMetric]]:
         logger.debug(f"Iterating over {len(self._functions)} registered evaluators")
@@ -40,9 +162,18 @@ class ModelMetricRegistry:
 model_metric_registry = ModelMetricRegistry()
 
 
-def model_metric(name: str) -> Callable[[ModelMetric], ModelMetric]:
+def model_metric(
+    name: str,
+    executor: str = "thread",
+    reduce: str = "concat",
+    needs_model: bool = True,
+) -> Callable[[ModelMetric], ModelMetric]:
     """Decorator to register a function as a metric evaluator for A4S.
         name: The name to register the evaluator under.
+        executor: 'thread' or 'process', how the evaluation engine runs it.
+        reduce: 'concat' or 'mean', how a distributed run combines its chunks.
+        needs_model: Whether it calls the functional model, which runs
+            without a model (such as the Celery worker's) cannot provide.
 
     Returns:
         Callable[[ModelMetric], ModelMetric]: A decorator function that registers the evaluation function as a model evaluator for A4S.
@@ -50,7 +181,7 @@ def model_metric(name: str) -> Callable[[ModelMetric], ModelMetric]:
     logger.debug(f"Creating metric evaluator decorator for: {name}")
 
     def func_decorator(func: ModelMetric) -> ModelMetric:
-        model_metric_registry.register(name, func)
+        model_metric_registry.register(name, func, executor, reduce, needs_model)
         return func
 
     return func_decorator
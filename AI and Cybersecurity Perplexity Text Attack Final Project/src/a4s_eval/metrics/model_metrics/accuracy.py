@@ -8,7 +8,8 @@ from a4s_eval.metric_registries.model_metric_registry import model_metric
 from a4s_eval.service.functional_model import TabularClassificationModel
 
 
-@model_metric(name="accuracy")
+# One score for the whole dataset: chunks are averaged by their number of rows
+@model_metric(name="accuracy", reduce="mean")
 def accuracy(
     datashape: DataShape,
     model: Model,
@@ -1,23 +1,57 @@
 from datetime import datetime
-import torch
+from typing import Sequence
 
 from a4s_eval.data_model.evaluation import DataShape, Dataset, Model
-from a4s_eval.data_model.measure import Measure
+from a4s_eval.data_model.measure import Measure, MeasureBatch
+from a4s_eval.metric_registries.artifacts import shared_artifact
 from a4s_eval.metric_registries.model_metric_registry import model_metric
-from a4s_eval.service.functional_model import TabularClassificationModel
+from a4s_eval.perplexity.dedup import dedup_texts
+from a4s_eval.perplexity.model_cache import ReferenceModel, reference_model_cache
+from a4s_eval.perplexity.scoring import (
+    compute_perplexities,
+    default_score_cache,
+    default_token_store,
+    score_with_log_likelihood,
+)
+from a4s_eval.service.functional_model import (
+    TabularClassificationModel,
+    TextGenerationModel,
+)
+from a4s_eval.utils import env
+from a4s_eval.utils.profiling import count, profile_run, stage
 
 # Perplexity is a metric that is calculated with a reference model.
-# As such, we are importing the modules required to do so.
-from transformers import AutoModelForCausalLM, AutoTokenizer
+# We use 'distilgpt2' as it is smaller and faster than 'gpt2', while providing
+# a reliable perplexity measure. The model is loaded once per process and
+# shared across calls through the reference model cache, on the runtime
+# selected by PERPLEXITY_BACKEND ('torch' or 'onnx') with the weight dtype
+# selected by PERPLEXITY_DTYPE ('int8' for the quantized onnx model).
+REFERENCE_MODEL_NAME = "distilgpt2"
 
 
-@model_metric(name="perplexity")
+def reference_model() -> ReferenceModel:
+    return reference_model_cache.get(
+        REFERENCE_MODEL_NAME,
+        dtype=env.PERPLEXITY_DTYPE,
+        backend=env.PERPLEXITY_BACKEND,
+    )
+
+
+def warm_up() -> None:
+    """Load the reference model before the first call, e.g. in a new worker."""
+    reference_model()
+
+
+# Scoring runs in PyTorch or ONNX Runtime, which release the GIL: in a thread,
+# the metric shares the loaded reference model and token store with the others.
+# It only needs the dataset, so it also runs without a functional model
+@model_metric(name="perplexity", executor="thread", needs_model=False)
 def perplexity(
     datashape: DataShape,
     model: Model,
     dataset: Dataset,
-    functional_model: TabularClassificationModel,
-) -> list[Measure]:
+    functional_model: TabularClassificationModel | TextGenerationModel | None,
+) -> Sequence[Measure]:
     """
     Calculates the perplexity of text samples in a dataset.
 
@@ -26,12 +60,35 @@ def perplexity(
     language model is better at predicting the text sample.
 
     This metric uses a pre-trained language model (distilgpt2) as a reference to calculate
-    the perplexity of each text sample in the input dataset. It does not use the
-    `functional_model` argument, as it is evaluating the dataset content itself,
-    not the model's predictions.
-    """
-    measures = []
+    the perplexity of each text sample in the input dataset. When the
+    `functional_model` is a `TextGenerationModel` with a `log_likelihood`
+    function, the texts are scored through that model instead, so a run that
+    already loaded a language model does not load the reference model as well.
+    Scores of such models are not cached across calls.
+
+    Repeated texts are scored only once, and distinct texts are scored in
+    length-sorted, padded batches. The batch size and the maximum number of
+    padded tokens per forward pass are read from the ``PERPLEXITY_BATCH_SIZE``
+    and ``PERPLEXITY_MAX_TOKENS_PER_BATCH`` environment variables. Texts are
+    truncated to 1024 tokens unless ``PERPLEXITY_STRIDE`` is set, in which case
+    longer texts are scored over their full length with a sliding window of
+    1024 tokens advancing by that stride. Scores are persisted under
+    ``CACHE_DIR`` and reused across calls unless ``PERPLEXITY_SCORE_CACHE`` is
+    set to false. Likewise, the token ids of the text column are stored once
+    under ``CACHE_DIR`` and read memory-mapped by later calls on the same
+    data, unless ``PERPLEXITY_TOKEN_STORE`` is set to false. Within an
+    evaluation run by the ``EvaluationEngine``, the token store is shared with
+    the other metrics as an artifact.
 
+    The time spent loading the model, tokenizing, running forward passes and
+    building the measures is logged as a JSON profile summary after each call
+    (see ``a4s_eval.utils.profiling``).
+
+    The scores are returned as a ``MeasureBatch``: a sequence of ``Measure``
+    built on access, sharing one timestamp and the text feature's pid, that
+    serializes all rows at once with ``to_dataframe``, ``to_arrow`` or
+    ``to_json``.
+    """
     # This metric is only applicable to text features.
     # We will check the feature type and return an empty list if it's not text.
     if not datashape.features or datashape.features[0].feature_type != "text":
@@ -45,32 +102,43 @@ def perplexity(
             f"Text column '{text_column}' not found in the dataset."
         )
 
-    # Initialize the reference model and tokenizer for perplexity calculation.
-    # We use 'distilgpt2' as it is smaller and faster than 'gpt2', while providing
-    # a reliable perplexity measure.
-    ref_model_name = "distilgpt2"
-    ref_model = AutoModelForCausalLM.from_pretrained(ref_model_name)
-    ref_tokenizer = AutoTokenizer.from_pretrained(ref_model_name)
-
     texts = dataset.data[text_column].tolist()
-
-    # Calculate perplexity for each text sample
-    for text in texts:
-        if not isinstance(text, str) or not text.strip():
-            score = float("inf")
+    log_likelihood = (
+        functional_model.log_likelihood
+        if isinstance(functional_model, TextGenerationModel)
+        else None
+    )
+    with profile_run("perplexity_metric"):
+        if log_likelihood is not None:
+            # Scored through the run's own language model: no reference model
+            with stage("score"):
+                result = score_with_log_likelihood(texts, log_likelihood)
         else:
-            input_ids = ref_tokenizer.encode(text, return_tensors="pt", truncation=True, max_length=1024)
-            with torch.no_grad():
-                outputs = ref_model(input_ids, labels=input_ids)
-            loss = outputs.loss
-            score = torch.exp(loss).item()
-
-        measures.append(
-            Measure(
+            with stage("load_model"):
+                reference = reference_model()
+            with stage("dedup"):
+                dedup = dedup_texts(texts)
+            with stage("token_store"):
+                token_store = shared_artifact(
+                    ("token_store", text_column, reference.tokenizer_revision),
+                    lambda: default_token_store(dedup, reference),
+                )
+            with stage("score"):
+                result = compute_perplexities(
+                    texts,
+                    reference,
+                    score_cache=default_score_cache(),
+                    token_store=token_store,
+                    dedup=dedup,
+                )
+
+        with stage("build_measures"):
+            measures = MeasureBatch(
                 name="perplexity",
-                score=score,
+                scores=result.scores,
                 time=datetime.now(),
+                feature_pid=datashape.features[0].pid,
             )
-        )
+        count("measures", len(measures))
 
     return measures
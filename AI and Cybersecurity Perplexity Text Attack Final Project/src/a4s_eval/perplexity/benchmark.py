@@ -0,0 +1,408 @@
+"""Throughput and latency benchmark of perplexity scoring.
+
+Each benchmark case scores a corpus with one backend, dtype and batch setting
+and reports texts and tokens per second, the p50/p95/p99 latency of scoring
+one request of ``batch_size`` texts, the peak resident memory and the time to
+load the reference model. Cases run in a fresh process by default, so that
+peak memory and load time are those of the case alone.
+
+Corpora are deterministic: synthetic texts drawn from a fixed vocabulary, or
+a seeded sample of dataset texts (such as SQuAD contexts), both with word
+counts in a controlled range. Results are written as JSON and compared with a
+stored baseline: a metric that is worse than the baseline by more than the
+regression threshold is reported.
+
+The startup time of modules, such as the metric registries that short-lived
+workers import first, is measured as the import time in a fresh interpreter
+and compared with the baseline as well.
+"""
+
+import json
+import multiprocessing as mp
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+
+from a4s_eval.perplexity.engine import ScoringConfig, is_scorable, score_texts
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.utils.memory import peak_rss_bytes
+
+# Relative change beyond which a metric counts as a regression
+REGRESSION_THRESHOLD = 0.10
+
+# Metrics compared with the baseline, and whether higher values are better
+BENCHMARK_METRICS = {
+    "texts_per_second": True,
+    "tokens_per_second": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "peak_rss_mb": False,
+    "model_load_seconds": False,
+}
+
+# Vocabulary of the synthetic corpus
+_SYNTHETIC_WORDS = (
+    "the of and to in a is was for on as with by that it from at his an were "
+    "are which this be or has had first one their its new after but who not "
+    "they have her she two been other when there all during into school time "
+    "may years more most only over city some world would where later up such "
+    "used many can state about national out known university united then made "
+    "game team season league football river war government century music"
+).split()
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """Deterministic corpus with word counts in a controlled range.
+
+    Attributes:
+        name (str): Name of the corpus in the results.
+        n_texts (int): Number of texts.
+        min_words (int): Minimum number of words per text.
+        max_words (int): Maximum number of words per text.
+        seed (int): Seed of the text lengths, words or sample.
+    """
+
+    name: str
+    n_texts: int
+    min_words: int
+    max_words: int
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class BenchmarkCase:
+    """One backend and batch setting to benchmark on one corpus."""
+
+    corpus: str
+    backend: str = "torch"
+    dtype: str = "float32"
+    batch_size: int = 16
+    max_tokens_per_batch: int = 4096
+    max_length: int = 1024
+    model_name: str = "distilgpt2"
+
+    @property
+    def key(self) -> str:
+        return (
+            f"{self.corpus}|{self.model_name}|{self.backend}|{self.dtype}|"
+            f"bs{self.batch_size}|tok{self.max_tokens_per_batch}"
+        )
+
+
+@dataclass
+class BenchmarkResult:
+    """Measurements of one benchmark case.
+
+    Attributes:
+        case (BenchmarkCase): Benchmarked setting.
+        n_texts (int): Number of texts scored.
+        n_tokens (int): Number of tokens scored.
+        seconds (float): Total scoring time, excluding warm-up and model load.
+        texts_per_second (float): Scoring throughput in texts.
+        tokens_per_second (float): Scoring throughput in tokens.
+        latency_p50_ms (float): Median latency of one request.
+        latency_p95_ms (float): 95th percentile latency of one request.
+        latency_p99_ms (float): 99th percentile latency of one request.
+        peak_rss_mb (float): Peak resident memory of the process.
+        model_load_seconds (float): Time to load the reference model.
+    """
+
+    case: BenchmarkCase
+    n_texts: int
+    n_tokens: int
+    seconds: float
+    texts_per_second: float
+    tokens_per_second: float
+    latency_p50_ms: float
+    latency_p95_ms: float
+    latency_p99_ms: float
+    peak_rss_mb: float
+    model_load_seconds: float
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"key": self.case.key, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "BenchmarkResult":
+        values = {k: v for k, v in data.items() if k != "key"}
+        return cls(**{**values, "case": BenchmarkCase(**values["case"])})
+
+
+@dataclass(frozen=True)
+class Regression:
+    """A metric of a case that is worse than in the baseline."""
+
+    key: str
+    metric: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        """Relative change from the baseline value."""
+        return (self.current - self.baseline) / self.baseline
+
+
+@dataclass
+class BenchmarkReport:
+    """Results of a benchmark run and the environment it ran in.
+
+    Attributes:
+        results (list[BenchmarkResult]): Measurements of each case.
+        environment (dict[str, Any]): Machine and library versions.
+        startup (dict[str, float]): Import time of each module, in seconds.
+    """
+
+    results: list[BenchmarkResult]
+    environment: dict[str, Any] = field(default_factory=dict)
+    startup: dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "environment": self.environment,
+            "startup": self.startup,
+            "results": [result.to_dict() for result in self.results],
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "BenchmarkReport":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            results=[BenchmarkResult.from_dict(r) for r in data["results"]],
+            environment=data.get("environment", {}),
+            startup=data.get("startup", {}),
+        )
+
+
+def synthetic_corpus(spec: CorpusSpec) -> list[str]:
+    """Generate texts of random words with word counts in the spec's range."""
+    rng = np.random.default_rng(spec.seed)
+    lengths = rng.integers(spec.min_words, spec.max_words + 1, size=spec.n_texts)
+    texts = []
+    for length in lengths:
+        words = rng.choice(_SYNTHETIC_WORDS, size=length)
+        texts.append(" ".join(words).capitalize() + ".")
+    return texts
+
+
+def sample_corpus(texts: Sequence[Any], spec: CorpusSpec) -> list[str]:
+    """Sample distinct dataset texts whose word count is in the spec's range.
+
+    Args:
+        texts (Sequence[Any]): Dataset texts, such as SQuAD contexts
+        spec (CorpusSpec): Corpus size, length range and sampling seed
+
+    Returns:
+        list[str]: Up to ``spec.n_texts`` texts, always the same for a seed
+
+    Raises:
+        ValueError: If no text has a word count in the range
+    """
+    candidates = sorted(
+        {
+            text
+            for text in texts
+            if is_scorable(text)
+            and spec.min_words <= len(text.split()) <= spec.max_words
+        }
+    )
+    if not candidates:
+        raise ValueError(
+            f"No text has between {spec.min_words} and {spec.max_words} words"
+        )
+    rng = np.random.default_rng(spec.seed)
+    picks = rng.choice(len(candidates), size=spec.n_texts, replace=True)
+    return [candidates[i] for i in picks]
+
+
+def run_case(case: BenchmarkCase, texts: Sequence[str]) -> BenchmarkResult:
+    """Benchmark one case in the current process.
+
+    The model is loaded into a new cache, one request is scored as warm-up,
+    and then every request of ``case.batch_size`` texts is timed.
+
+    Args:
+        case (BenchmarkCase): Setting to benchmark
+        texts (Sequence[str]): Corpus to score
+
+    Returns:
+        BenchmarkResult: Measurements of the case
+    """
+    cache = ReferenceModelCache()
+    reference = cache.get(case.model_name, dtype=case.dtype, backend=case.backend)
+    model_load_seconds = cache.stats.load_seconds
+
+    config = ScoringConfig(
+        batch_size=case.batch_size,
+        max_tokens_per_batch=case.max_tokens_per_batch,
+        max_length=case.max_length,
+    )
+    requests = [
+        list(texts[start : start + case.batch_size])
+        for start in range(0, len(texts), case.batch_size)
+    ]
+    score_texts(requests[0], reference.model, reference.tokenizer, config)
+
+    latencies = []
+    for request in requests:
+        start = time.perf_counter()
+        score_texts(request, reference.model, reference.tokenizer, config)
+        latencies.append(time.perf_counter() - start)
+    seconds = sum(latencies)
+
+    n_tokens = sum(
+        len(ids)
+        for ids in reference.tokenizer(
+            list(texts), truncation=True, max_length=case.max_length
+        )["input_ids"]
+    )
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return BenchmarkResult(
+        case=case,
+        n_texts=len(texts),
+        n_tokens=n_tokens,
+        seconds=seconds,
+        texts_per_second=len(texts) / seconds,
+        tokens_per_second=n_tokens / seconds,
+        latency_p50_ms=float(p50),
+        latency_p95_ms=float(p95),
+        latency_p99_ms=float(p99),
+        peak_rss_mb=peak_rss_bytes() / 2**20,
+        model_load_seconds=model_load_seconds,
+    )
+
+
+def measure_startup(module: str, repeats: int = 3) -> float:
+    """Return the best import time of a module in a fresh interpreter.
+
+    Args:
+        module (str): Dotted path of the module to import
+        repeats (int): Number of interpreters to start
+
+    Returns:
+        float: Shortest import time, in seconds
+    """
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    # The child sees the same import path, including a source checkout
+    child_env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, sys.path))}
+    return min(
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code],
+                capture_output=True,
+                text=True,
+                check=True,
+                env=child_env,
+            ).stdout.split()[-1]
+        )
+        for _ in range(repeats)
+    )
+
+
+def run_benchmark(
+    cases: Sequence[BenchmarkCase],
+    corpora: dict[str, list[str]],
+    isolate: bool = True,
+    startup_modules: Sequence[str] = (),
+) -> BenchmarkReport:
+    """Benchmark several cases.
+
+    Args:
+        cases (Sequence[BenchmarkCase]): Settings to benchmark
+        corpora (dict[str, list[str]]): Texts of each corpus named by a case
+        isolate (bool): Whether to run every case in a fresh process, so that
+            its peak memory and model load time are not affected by the
+            previous cases
+        startup_modules (Sequence[str]): Modules whose import time to measure
+
+    Returns:
+        BenchmarkReport: Results of every case, in order
+    """
+    results = []
+    for case in cases:
+        if isolate:
+            # Spawned, not forked, so the child starts without loaded models
+            with ProcessPoolExecutor(
+                max_workers=1, mp_context=mp.get_context("spawn")
+            ) as pool:
+                result = pool.submit(run_case, case, corpora[case.corpus]).result()
+        else:
+            result = run_case(case, corpora[case.corpus])
+        results.append(result)
+    return BenchmarkReport(
+        results=results,
+        environment=benchmark_environment(),
+        startup={module: measure_startup(module) for module in startup_modules},
+    )
+
+
+def benchmark_environment() -> dict[str, Any]:
+    """Describe the machine and library versions the benchmark ran on."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+    }
+
+
+def compare_to_baseline(
+    report: BenchmarkReport,
+    baseline: BenchmarkReport,
+    threshold: float = REGRESSION_THRESHOLD,
+) -> list[Regression]:
+    """Find the metrics that regressed from the baseline by more than a threshold.
+
+    Cases are matched by key and startup times by module; entries missing
+    from the baseline are skipped.
+
+    Args:
+        report (BenchmarkReport): Current results
+        baseline (BenchmarkReport): Stored reference results
+        threshold (float): Largest accepted relative change for the worse
+
+    Returns:
+        list[Regression]: Regressed metrics, in case and metric order
+    """
+    baseline_results = {result.case.key: result for result in baseline.results}
+    regressions = []
+    for result in report.results:
+        reference = baseline_results.get(result.case.key)
+        if reference is None:
+            continue
+        for metric, higher_is_better in BENCHMARK_METRICS.items():
+            before = getattr(reference, metric)
+            after = getattr(result, metric)
+            if not before:
+                continue
+            change = (after - before) / before
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(Regression(result.case.key, metric, before, after))
+    for module, after in report.startup.items():
+        before = baseline.startup.get(module)
+        if before and (after - before) / before > threshold:
+            regressions.append(
+                Regression(f"startup|{module}", "import_seconds", before, after)
+            )
+    return regressions
@@ -0,0 +1,97 @@
+"""Content-hash deduplication of texts before perplexity scoring.
+
+Datasets such as SQuAD repeat the same context paragraph across many question
+rows. Texts are hashed after normalization so that each distinct text is scored
+once, and the scores are then fanned back out to every row in input order.
+"""
+
+import hashlib
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+
+# Digest shared by every non-string value, which all score as infinity
+NON_TEXT_DIGEST = "<non-text>"
+
+
+def normalize_text(text: str) -> str:
+    """Normalize a text before hashing (Unicode NFC composition)."""
+    return unicodedata.normalize("NFC", text)
+
+
+def text_digest(text: Any) -> str:
+    """Return a stable hex digest identifying the content of a text.
+
+    Args:
+        text (Any): Text to hash; non-string values share a single digest
+
+    Returns:
+        str: 32-character BLAKE2b hex digest of the normalized text
+    """
+    if not isinstance(text, str):
+        return NON_TEXT_DIGEST
+    return hashlib.blake2b(
+        normalize_text(text).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+@dataclass(frozen=True)
+class DedupResult:
+    """Distinct texts of a column and the mapping back to its rows.
+
+    Attributes:
+        unique_texts (list[Any]): First occurrence of each distinct text.
+        digests (list[str]): Digest of each distinct text.
+        inverse (np.ndarray): For every input row, the index of its text in
+            ``unique_texts``.
+    """
+
+    unique_texts: list[Any]
+    digests: list[str]
+    inverse: np.ndarray
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.inverse)
+
+    @property
+    def n_unique(self) -> int:
+        return len(self.unique_texts)
+
+    @property
+    def ratio(self) -> float:
+        """Number of rows per distinct text (the compute reduction factor)."""
+        return self.n_rows / self.n_unique if self.n_unique else 1.0
+
+    def expand(self, unique_values: np.ndarray) -> np.ndarray:
+        """Fan values computed per distinct text back out to every row."""
+        return np.asarray(unique_values)[self.inverse]
+
+
+def dedup_texts(texts: Sequence[Any]) -> DedupResult:
+    """Deduplicate texts by content hash, preserving first-occurrence order.
+
+    Args:
+        texts (Sequence[Any]): Texts to deduplicate
+
+    Returns:
+        DedupResult: Distinct texts and the row-to-text mapping
+    """
+    positions: dict[str, int] = {}
+    unique_texts: list[Any] = []
+    digests: list[str] = []
+    inverse = np.empty(len(texts), dtype=np.int64)
+
+    for row, text in enumerate(texts):
+        digest = text_digest(text)
+        position = positions.get(digest)
+        if position is None:
+            position = len(unique_texts)
+            positions[digest] = position
+            unique_texts.append(text)
+            digests.append(digest)
+        inverse[row] = position
+
+    return DedupResult(unique_texts=unique_texts, digests=digests, inverse=inverse)
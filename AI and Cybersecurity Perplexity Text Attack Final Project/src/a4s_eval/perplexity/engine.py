@@ -0,0 +1,457 @@
+"""Batched scoring engine for reference-model perplexity.
+
+Texts are tokenized once, sorted by token length and grouped into padded
+buckets so that each forward pass scores several samples of similar length.
+Per-sample losses are computed from the masked logits and reproduce the mean
+token cross-entropy that the model returns when called with ``labels=``.
+
+Texts longer than the model context can be scored exactly with a strided
+sliding window: each window carries the overlapping tokens of the previous one
+as context and only its new tokens are scored. Windows of many documents are
+bucketed and batched together like ordinary samples.
+
+Every path computes the negative log-likelihood of each scored token, and a
+perplexity score is the exponential of its mean (``scores_from_token_nll``).
+The ``*_token_nll`` variants return the token NLL itself, so other statistics
+can be computed later without running the model again.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+
+from a4s_eval.utils.profiling import stage
+
+
+@dataclass(frozen=True)
+class ScoringConfig:
+    """Settings controlling how texts are batched for the reference model.
+
+    Attributes:
+        batch_size (int): Maximum number of texts per forward pass.
+        max_tokens_per_batch (int): Maximum number of padded tokens
+            (batch rows x longest sequence) per forward pass.
+        max_length (int): Truncation length applied when tokenizing, or the
+            window size when ``stride`` is set.
+        stride (int | None): Number of new tokens scored per sliding window.
+            None truncates texts to ``max_length`` tokens instead.
+        num_workers (int): Number of scoring processes; 1 scores in-process.
+    """
+
+    batch_size: int = 16
+    max_tokens_per_batch: int = 4096
+    max_length: int = 1024
+    stride: int | None = None
+    num_workers: int = 1
+
+    def __post_init__(self) -> None:
+        if self.stride is not None and not 0 < self.stride < self.max_length:
+            raise ValueError(
+                f"stride must be between 1 and max_length - 1, got {self.stride}"
+            )
+
+
+def is_scorable(text: Any) -> bool:
+    """Return True if the value is a non-blank string that can be scored."""
+    return isinstance(text, str) and bool(text.strip())
+
+
+def make_buckets(
+    lengths: Sequence[int], batch_size: int, max_tokens_per_batch: int
+) -> list[list[int]]:
+    """Group sample indices into length-sorted buckets.
+
+    Samples are visited from longest to shortest so that the most expensive
+    batch runs first. A bucket is closed when it reaches ``batch_size`` rows or
+    when adding a row would exceed ``max_tokens_per_batch`` padded tokens. A
+    single sample longer than the token budget still gets its own bucket.
+
+    Args:
+        lengths (Sequence[int]): Token length of each sample
+        batch_size (int): Maximum number of rows per bucket
+        max_tokens_per_batch (int): Maximum padded tokens per bucket
+
+    Returns:
+        list[list[int]]: Sample indices of each bucket
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+
+    buckets: list[list[int]] = []
+    current: list[int] = []
+    for idx in order:
+        if current:
+            # The first sample of a bucket is its longest one
+            width = lengths[current[0]]
+            if (
+                len(current) >= batch_size
+                or (len(current) + 1) * width > max_tokens_per_batch
+            ):
+                buckets.append(current)
+                current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def pad_batch(
+    sequences: Sequence[Sequence[int]], pad_token_id: int
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Right-pad token sequences into ``input_ids`` and ``attention_mask``.
+
+    Right padding keeps the position ids of real tokens unchanged, so the
+    scores of padded rows are identical to unpadded single-sample passes.
+    """
+    width = max(len(seq) for seq in sequences)
+    # Filled in NumPy so that read-only (memory-mapped) rows are copied
+    input_ids = np.full((len(sequences), width), pad_token_id, dtype=np.int64)
+    attention_mask = np.zeros((len(sequences), width), dtype=np.int64)
+    for row, seq in enumerate(sequences):
+        input_ids[row, : len(seq)] = seq
+        attention_mask[row, : len(seq)] = 1
+    return torch.from_numpy(input_ids), torch.from_numpy(attention_mask)
+
+
+def token_nll_from_logits(
+    logits: torch.Tensor, input_ids: torch.Tensor, target_mask: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Compute the masked next-token negative log-likelihood.
+
+    Args:
+        logits (torch.Tensor): Model output of shape ``[batch, seq, vocab]``
+        input_ids (torch.Tensor): Token ids of shape ``[batch, seq]``
+        target_mask (torch.Tensor): Mask of shape ``[batch, seq]`` selecting the
+            tokens to score, usually the attention mask
+
+    Returns:
+        tuple[torch.Tensor, torch.Tensor]: Per-token NLL of shape
+            ``[batch, seq - 1]`` (zero outside the mask) and the float mask.
+    """
+    shift_logits = logits[:, :-1, :].float()
+    shift_labels = input_ids[:, 1:]
+    shift_mask = target_mask[:, 1:].float()
+    token_nll = F.cross_entropy(
+        shift_logits.transpose(1, 2), shift_labels, reduction="none"
+    )
+    return token_nll * shift_mask, shift_mask
+
+
+def make_windows(
+    length: int, max_length: int, stride: int
+) -> list[tuple[int, int, int]]:
+    """Split a token sequence into overlapping sliding windows.
+
+    Each window starts ``stride`` tokens after the previous one and spans at
+    most ``max_length`` tokens. Only the tokens that were not covered by the
+    previous window are scored, so every token after the first is scored
+    exactly once, with up to ``max_length - stride`` tokens of context.
+
+    Args:
+        length (int): Number of tokens in the sequence
+        max_length (int): Window size
+        stride (int): Offset between consecutive windows
+
+    Returns:
+        list[tuple[int, int, int]]: (begin, end, number of scored tokens) of
+            each window; the scored tokens are the last ones of the window
+    """
+    windows = []
+    prev_end = 0
+    for begin in range(0, max(length, 1), stride):
+        end = min(begin + max_length, length)
+        # The first token of the sequence has no context and is never scored
+        n_targets = end - prev_end if begin else max(end - 1, 0)
+        windows.append((begin, end, n_targets))
+        prev_end = end
+        if end == length:
+            break
+    return windows
+
+
+def windowed_token_nll(
+    token_ids: Sequence[Sequence[int]],
+    model: Any,
+    pad_token_id: int,
+    config: ScoringConfig,
+) -> list[np.ndarray]:
+    """Compute the NLL of every token of samples with a sliding window.
+
+    Windows of all samples are bucketed together by length. Each window
+    carries the overlapping tokens of the previous one as context, and only
+    its new tokens are written to the NLL of its sample.
+
+    Args:
+        token_ids (Sequence[Sequence[int]]): Untruncated token ids of each sample
+        model (Any): Causal language model returning ``logits``
+        pad_token_id (int): Token id used to pad shorter rows
+        config (ScoringConfig): Batching and window settings
+
+    Returns:
+        list[np.ndarray]: For each sample, the NLL of tokens 1 to n - 1
+    """
+    if config.stride is None:
+        raise ValueError("Sliding-window scoring requires config.stride")
+    owners: list[int] = []
+    spans: list[tuple[int, int, int]] = []
+    for sample, ids in enumerate(token_ids):
+        for window in make_windows(len(ids), config.max_length, config.stride):
+            owners.append(sample)
+            spans.append(window)
+
+    token_nll = [
+        np.zeros(max(len(ids) - 1, 0), dtype=np.float32) for ids in token_ids
+    ]
+    lengths = [end - begin for begin, end, _ in spans]
+    for bucket in make_buckets(lengths, config.batch_size, config.max_tokens_per_batch):
+        input_ids, attention_mask = pad_batch(
+            [token_ids[owners[w]][spans[w][0] : spans[w][1]] for w in bucket],
+            pad_token_id,
+        )
+        with torch.no_grad(), stage("forward"):
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+        bucket_nll, _ = token_nll_from_logits(logits, input_ids, attention_mask)
+        bucket_nll = bucket_nll.numpy()
+        for row, w in enumerate(bucket):
+            begin, end, n_targets = spans[w]
+            # Shifted position j holds the NLL of window token j + 1
+            token_nll[owners[w]][end - n_targets - 1 : end - 1] = bucket_nll[
+                row, end - begin - n_targets - 1 : end - begin - 1
+            ]
+    return token_nll
+
+
+def score_windowed_token_ids(
+    token_ids: Sequence[Sequence[int]],
+    model: Any,
+    pad_token_id: int,
+    config: ScoringConfig,
+) -> np.ndarray:
+    """Compute the full-length perplexity of samples with a sliding window.
+
+    The perplexity is the exponential of the mean token NLL computed by
+    ``windowed_token_nll`` over all tokens of the sample.
+
+    Args:
+        token_ids (Sequence[Sequence[int]]): Untruncated token ids of each sample
+        model (Any): Causal language model returning ``logits``
+        pad_token_id (int): Token id used to pad shorter rows
+        config (ScoringConfig): Batching and window settings
+
+    Returns:
+        np.ndarray: Perplexity of each sample, in input order
+    """
+    return scores_from_token_nll(
+        windowed_token_nll(token_ids, model, pad_token_id, config)
+    )
+
+
+def scores_from_token_nll(token_nll: Sequence[np.ndarray]) -> np.ndarray:
+    """Return the perplexity of each sample from the NLL of its tokens.
+
+    Samples of a single token have no prediction target and score ``nan``.
+    """
+    return np.array(
+        [
+            np.exp(nll.mean(dtype=np.float64)) if len(nll) else np.nan
+            for nll in token_nll
+        ],
+        dtype=np.float64,
+    )
+
+
+def get_pad_token_id(tokenizer: Any) -> int:
+    """Return a token id usable for padding (GPT-2 tokenizers define none)."""
+    if tokenizer.pad_token_id is not None:
+        return int(tokenizer.pad_token_id)
+    if tokenizer.eos_token_id is not None:
+        return int(tokenizer.eos_token_id)
+    return 0
+
+
+def token_nll_token_ids(
+    token_ids: Sequence[Sequence[int]],
+    model: Any,
+    pad_token_id: int,
+    config: ScoringConfig,
+    progress: bool = False,
+) -> list[np.ndarray]:
+    """Compute the NLL of every token of already tokenized samples.
+
+    Args:
+        token_ids (Sequence[Sequence[int]]): Token ids of each sample
+        model (Any): Causal language model returning ``logits``
+        pad_token_id (int): Token id used to pad shorter rows
+        config (ScoringConfig): Batching settings
+        progress (bool): Whether to display a progress bar over batches
+
+    Returns:
+        list[np.ndarray]: For each sample, the NLL of tokens 1 to n - 1
+    """
+    token_nll: list[np.ndarray] = [np.empty(0, dtype=np.float32)] * len(token_ids)
+    lengths = [len(ids) for ids in token_ids]
+    buckets = make_buckets(lengths, config.batch_size, config.max_tokens_per_batch)
+    for bucket in tqdm(buckets, desc="Scoring batches", disable=not progress):
+        input_ids, attention_mask = pad_batch(
+            [token_ids[i] for i in bucket], pad_token_id
+        )
+        with torch.no_grad(), stage("forward"):
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+        bucket_nll, _ = token_nll_from_logits(logits, input_ids, attention_mask)
+        bucket_nll = bucket_nll.numpy()
+        for row, i in enumerate(bucket):
+            token_nll[i] = bucket_nll[row, : max(lengths[i] - 1, 0)].copy()
+    return token_nll
+
+
+def score_token_ids(
+    token_ids: Sequence[Sequence[int]],
+    model: Any,
+    pad_token_id: int,
+    config: ScoringConfig,
+    progress: bool = False,
+) -> np.ndarray:
+    """Compute the perplexity of already tokenized samples.
+
+    The perplexity is the exponential of the mean token NLL computed by
+    ``token_nll_token_ids``.
+
+    Args:
+        token_ids (Sequence[Sequence[int]]): Token ids of each sample
+        model (Any): Causal language model returning ``logits``
+        pad_token_id (int): Token id used to pad shorter rows
+        config (ScoringConfig): Batching settings
+        progress (bool): Whether to display a progress bar over batches
+
+    Returns:
+        np.ndarray: Perplexity of each sample, in input order
+    """
+    return scores_from_token_nll(
+        token_nll_token_ids(token_ids, model, pad_token_id, config, progress)
+    )
+
+
+def encode_texts(
+    texts: Sequence[Any],
+    tokenizer: Any,
+    config: ScoringConfig,
+    token_ids: Sequence[Sequence[int]] | None = None,
+) -> list[Sequence[int]]:
+    """Return the token ids to score for each text.
+
+    Args:
+        texts (Sequence[Any]): Scorable texts
+        tokenizer (Any): Tokenizer matching the model
+        config (ScoringConfig): Truncation settings
+        token_ids (Sequence[Sequence[int]] | None): Untruncated token ids of
+            each text, if already computed
+
+    Returns:
+        list[Sequence[int]]: Token ids of each text, truncated to
+            ``config.max_length`` unless ``config.stride`` is set
+    """
+    if token_ids is not None:
+        if config.stride is not None:
+            return list(token_ids)
+        return [ids[: config.max_length] for ids in token_ids]
+    with stage("tokenize"):
+        if config.stride is not None:
+            return tokenizer(list(texts), verbose=False)["input_ids"]
+        return tokenizer(list(texts), truncation=True, max_length=config.max_length)[
+            "input_ids"
+        ]
+
+
+def score_texts_with_token_nll(
+    texts: Sequence[Any],
+    model: Any,
+    tokenizer: Any,
+    config: ScoringConfig | None = None,
+    progress: bool = False,
+    token_ids: Sequence[Sequence[int]] | None = None,
+) -> tuple[np.ndarray, list[np.ndarray | None]]:
+    """Compute the perplexity and per-token NLL of each text.
+
+    Non-string and blank values are scored as ``inf`` and get no token NLL,
+    matching the per-text behaviour of the ``perplexity`` metric. Texts are
+    truncated to ``config.max_length`` tokens, unless ``config.stride`` is
+    set, in which case they are scored over their full length with a sliding
+    window. The perplexity of each text is the exponential of the mean of its
+    token NLL.
+
+    Args:
+        texts (Sequence[Any]): Texts to score
+        model (Any): Causal language model in eval mode
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Batching settings, defaults if None
+        progress (bool): Whether to display a progress bar over batches
+        token_ids (Sequence[Sequence[int]] | None): Untruncated token ids of
+            each text, tokenized if None
+
+    Returns:
+        tuple[np.ndarray, list[np.ndarray | None]]: Perplexity of each text and
+            the NLL of its tokens after the first, or None for texts that
+            cannot be scored
+    """
+    config = config or ScoringConfig()
+    scores = np.full(len(texts), np.inf, dtype=np.float64)
+    token_nll: list[np.ndarray | None] = [None] * len(texts)
+
+    valid = [i for i, text in enumerate(texts) if is_scorable(text)]
+    if not valid:
+        return scores, token_nll
+
+    pad_token_id = get_pad_token_id(tokenizer)
+    encodings = encode_texts(
+        [texts[i] for i in valid],
+        tokenizer,
+        config,
+        None if token_ids is None else [token_ids[i] for i in valid],
+    )
+    if config.stride is not None:
+        valid_nll = windowed_token_nll(encodings, model, pad_token_id, config)
+    else:
+        valid_nll = token_nll_token_ids(
+            encodings, model, pad_token_id, config, progress
+        )
+
+    scores[valid] = scores_from_token_nll(valid_nll)
+    for i, nll in zip(valid, valid_nll):
+        token_nll[i] = nll
+    return scores, token_nll
+
+
+def score_texts(
+    texts: Sequence[Any],
+    model: Any,
+    tokenizer: Any,
+    config: ScoringConfig | None = None,
+    progress: bool = False,
+    token_ids: Sequence[Sequence[int]] | None = None,
+) -> np.ndarray:
+    """Compute the perplexity of each text with the reference model.
+
+    Non-string and blank values are scored as ``inf``. Texts are tokenized,
+    batched and scored as in ``score_texts_with_token_nll``, whose token NLL
+    is dropped.
+
+    Args:
+        texts (Sequence[Any]): Texts to score
+        model (Any): Causal language model in eval mode
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Batching settings, defaults if None
+        progress (bool): Whether to display a progress bar over batches
+        token_ids (Sequence[Sequence[int]] | None): Untruncated token ids of
+            each text, such as rows of a token store. Texts are tokenized if
+            None
+
+    Returns:
+        np.ndarray: Perplexity of each text, in input order
+    """
+    scores, _ = score_texts_with_token_nll(
+        texts, model, tokenizer, config, progress, token_ids
+    )
+    return scores
@@ -0,0 +1,135 @@
+"""Columnar storage of per-row perplexity measures.
+
+Experiment scores are written as Arrow IPC files holding one row per dataset
+row: its id, the digest of the scored text and the score. The text itself
+stays in the source dataset and can be joined back on the row id. The file is
+written in record batches and left uncompressed, so readers memory-map it and
+load the columns without parsing or copying them.
+
+The per-token negative log-likelihood of each row can be stored as well, as a
+float16 list column: half precision keeps about three significant digits,
+which is enough for token statistics at half the size of float32.
+"""
+
+import os
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# Number of rows per record batch
+MEASURE_BATCH_ROWS = 4096
+
+MEASURE_SCHEMA = pa.schema(
+    [
+        pa.field("row_id", pa.string(), nullable=False),
+        pa.field("text_digest", pa.string()),
+        pa.field("score", pa.float64(), nullable=False),
+    ]
+)
+
+TOKEN_NLL_FIELD = pa.field("token_nll", pa.list_(pa.float16()))
+
+
+def token_nll_array(token_nll: Sequence[np.ndarray | None]) -> pa.ListArray:
+    """Pack per-row token NLL arrays into a float16 list array.
+
+    Args:
+        token_nll (Sequence[np.ndarray | None]): NLL of the tokens of each row,
+            or None for rows without tokens
+
+    Returns:
+        pa.ListArray: One list per row, null where the input is None
+    """
+    lengths = np.array([0 if nll is None else len(nll) for nll in token_nll])
+    offsets = np.zeros(len(token_nll) + 1, dtype=np.int32)
+    np.cumsum(lengths, out=offsets[1:])
+    present = [nll for nll in token_nll if nll is not None]
+    values = (
+        np.concatenate(present).astype(np.float16)
+        if present
+        else np.empty(0, dtype=np.float16)
+    )
+    return pa.ListArray.from_arrays(
+        pa.array(offsets),
+        pa.array(values),
+        type=TOKEN_NLL_FIELD.type,
+        mask=pa.array([nll is None for nll in token_nll], pa.bool_()),
+    )
+
+
+def write_measures(
+    path: str | os.PathLike,
+    row_ids: Sequence[str],
+    digests: Sequence[str | None],
+    scores: Sequence[float] | np.ndarray,
+    token_nll: Sequence[np.ndarray | None] | None = None,
+    batch_rows: int = MEASURE_BATCH_ROWS,
+) -> int:
+    """Write per-row scores to an Arrow IPC file.
+
+    The file is written next to its destination and renamed once complete, so
+    readers never see a partial file.
+
+    Args:
+        path (str | os.PathLike): Destination file
+        row_ids (Sequence[str]): Identifier of every row
+        digests (Sequence[str | None]): Digest of the text of every row, or
+            None where the text is unknown
+        scores (Sequence[float] | np.ndarray): Score of every row
+        token_nll (Sequence[np.ndarray | None] | None): NLL of the tokens of
+            every row, stored as an extra float16 list column if given
+        batch_rows (int): Number of rows per record batch
+
+    Returns:
+        int: Number of rows written
+
+    Raises:
+        ValueError: If the columns differ in length
+    """
+    n_rows = len(row_ids)
+    if (
+        len(digests) != n_rows
+        or len(scores) != n_rows
+        or (token_nll is not None and len(token_nll) != n_rows)
+    ):
+        raise ValueError(
+            f"Columns differ in length: {n_rows} row ids, {len(digests)} "
+            f"digests and {len(scores)} scores"
+        )
+    scores = np.asarray(scores, dtype=np.float64)
+    schema = MEASURE_SCHEMA
+    if token_nll is not None:
+        schema = schema.append(TOKEN_NLL_FIELD)
+
+    path = os.fspath(path)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with pa.ipc.new_file(tmp_path, schema) as writer:
+            for start in range(0, max(n_rows, 1), batch_rows):
+                stop = start + batch_rows
+                columns = [
+                    pa.array(row_ids[start:stop], pa.string()),
+                    pa.array(digests[start:stop], pa.string()),
+                    pa.array(scores[start:stop]),
+                ]
+                if token_nll is not None:
+                    columns.append(token_nll_array(token_nll[start:stop]))
+                writer.write_batch(pa.record_batch(columns, schema=schema))
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return n_rows
+
+
+def read_measures(path: str | os.PathLike) -> pa.Table:
+    """Memory-map an Arrow IPC file written by ``write_measures``."""
+    return pa.ipc.open_file(pa.memory_map(os.fspath(path), "r")).read_all()
+
+
+def load_measures(path: str | os.PathLike) -> pd.DataFrame:
+    """Load an Arrow IPC measures file as a DataFrame."""
+    return read_measures(path).to_pandas()
@@ -0,0 +1,239 @@
+"""Process-wide cache of reference language models.
+
+Loading a reference model and its tokenizer takes seconds, which adds up when
+the perplexity metric is evaluated over many datasets or date windows. This
+module keeps loaded models in memory, keyed by model name, dtype and backend,
+and evicts the least recently used ones when their estimated size, or the
+resident memory of the process, exceeds a configurable budget.
+"""
+
+import gc
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Protocol
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from a4s_eval.perplexity.onnx_backend import OnnxCausalLM, load_onnx_model
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.utils.memory import current_rss_bytes
+
+logger = get_logger()
+
+
+@dataclass(frozen=True)
+class ReferenceModelKey:
+    model_name: str
+    dtype: str = "float32"
+    backend: str = "torch"
+
+
+@dataclass
+class ReferenceModel:
+    """A loaded reference model ready for scoring.
+
+    Attributes:
+        key (ReferenceModelKey): Cache key the model was loaded under.
+        model (Any): Model in eval mode.
+        tokenizer (Any): Tokenizer matching the model.
+        size_bytes (int): Estimated memory footprint of the model weights.
+        tokenizer_revision (str): Fingerprint of the tokenizer vocabulary and
+            rules, so that persisted scores are invalidated when it changes.
+    """
+
+    key: ReferenceModelKey
+    model: Any
+    tokenizer: Any
+    size_bytes: int = 0
+    tokenizer_revision: str = ""
+
+    @property
+    def model_id(self) -> str:
+        """Identifier of the weights that produced a score."""
+        return f"{self.key.model_name}|{self.key.dtype}|{self.key.backend}"
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    load_seconds: float = 0.0
+
+
+class ModelLoader(Protocol):
+    def __call__(self, model_name: str, dtype: str) -> tuple[Any, Any]: ...
+
+
+def model_size_bytes(model: Any) -> int:
+    """Estimate the memory used by the weights of a model.
+
+    Torch models count their parameters and buffers, ONNX models the size of
+    the file their session loaded. Other models are counted as 0 bytes.
+    """
+    if isinstance(model, OnnxCausalLM):
+        return os.path.getsize(model.path)
+    if not isinstance(model, torch.nn.Module):
+        return 0
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+def tokenizer_fingerprint(tokenizer: Any) -> str:
+    """Return a short digest of the tokenizer definition.
+
+    Fast tokenizers are serialized with their full pipeline (normalizer,
+    pre-tokenizer, vocabulary and merges). Other tokenizers fall back to their
+    vocabulary.
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        payload = backend.to_str()
+    elif hasattr(tokenizer, "get_vocab"):
+        payload = json.dumps(sorted(tokenizer.get_vocab().items()))
+    else:
+        payload = type(tokenizer).__name__
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def load_torch_model(model_name: str, dtype: str) -> tuple[Any, Any]:
+    """Load a Hugging Face causal language model and its tokenizer.
+
+    Raises:
+        ValueError: If ``dtype`` is 'int8', which requires the onnx backend
+    """
+    if dtype == "int8":
+        raise ValueError("int8 reference models require the 'onnx' backend")
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    if dtype != "float32":
+        model = model.to(dtype=getattr(torch, dtype))
+    model.eval()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return model, tokenizer
+
+
+class ReferenceModelCache:
+    """LRU cache of reference models bounded by a memory budget.
+
+    After each load, the least recently used models are evicted while the sum
+    of the estimated sizes of the cached models (``size_bytes``) exceeds
+    ``max_rss_bytes``. The resident memory of the process is only a secondary
+    check, for memory the estimates miss: if it still exceeds the budget, one
+    more model is evicted. Memory freed by an eviction is often not returned
+    to the OS right away, so the RSS is not measured again in between, which
+    would evict every model. The most recently requested model is never
+    evicted, so a budget smaller than a single model degrades to caching one
+    model at a time.
+    """
+
+    def __init__(
+        self,
+        max_rss_bytes: int | None = None,
+        rss_fn: Callable[[], int | None] = current_rss_bytes,
+    ) -> None:
+        self.max_rss_bytes = max_rss_bytes
+        self._rss_fn = rss_fn
+        self._models: OrderedDict[ReferenceModelKey, ReferenceModel] = OrderedDict()
+        self._loaders: dict[str, ModelLoader] = {
+            "torch": load_torch_model,
+            "onnx": load_onnx_model,
+        }
+        self._stats = CacheStats()
+        self._lock = threading.RLock()
+
+    def register_loader(self, backend: str, loader: ModelLoader) -> None:
+        logger.debug(f"Registering reference model loader: {backend}")
+        self._loaders[backend] = loader
+
+    def get(
+        self, model_name: str, dtype: str = "float32", backend: str = "torch"
+    ) -> ReferenceModel:
+        """Return a loaded reference model, loading it on a cache miss.
+
+        Args:
+            model_name (str): Hugging Face model name or local path
+            dtype (str): Weight dtype, e.g. 'float32', 'bfloat16' or 'int8'
+            backend (str): Name of a registered loader
+
+        Returns:
+            ReferenceModel: The cached model and tokenizer
+
+        Raises:
+            ValueError: If no loader is registered for ``backend``
+        """
+        key = ReferenceModelKey(model_name=model_name, dtype=dtype, backend=backend)
+        with self._lock:
+            if key in self._models:
+                self._stats.hits += 1
+                self._models.move_to_end(key)
+                return self._models[key]
+
+            if backend not in self._loaders:
+                raise ValueError(f"Unknown reference model backend: {backend}")
+
+            self._stats.misses += 1
+            start = time.perf_counter()
+            model, tokenizer = self._loaders[backend](model_name, dtype)
+            elapsed = time.perf_counter() - start
+            self._stats.load_seconds += elapsed
+            logger.info(f"Loaded reference model {key} in {elapsed:.2f}s")
+
+            entry = ReferenceModel(
+                key=key,
+                model=model,
+                tokenizer=tokenizer,
+                size_bytes=model_size_bytes(model),
+                tokenizer_revision=tokenizer_fingerprint(tokenizer),
+            )
+            self._models[key] = entry
+            self._evict_over_budget()
+            return entry
+
+    def _evict_over_budget(self) -> None:
+        if not self.max_rss_bytes:
+            return
+        while len(self._models) > 1 and self.cached_bytes() > self.max_rss_bytes:
+            self._evict_least_recent(f"cached={self.cached_bytes()} bytes")
+        if len(self._models) > 1:
+            rss = self._rss_fn()
+            if rss is not None and rss > self.max_rss_bytes:
+                self._evict_least_recent(f"rss={rss} bytes")
+
+    def _evict_least_recent(self, reason: str) -> None:
+        key, _ = self._models.popitem(last=False)
+        self._stats.evictions += 1
+        gc.collect()
+        logger.info(f"Evicted reference model {key} ({reason})")
+
+    def cached_bytes(self) -> int:
+        """Return the sum of the estimated sizes of the cached models."""
+        with self._lock:
+            return sum(entry.size_bytes for entry in self._models.values())
+
+    def keys(self) -> list[ReferenceModelKey]:
+        """Return the cached keys, from least to most recently used."""
+        with self._lock:
+            return list(self._models)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._models.clear()
+            gc.collect()
+
+    @property
+    def stats(self) -> CacheStats:
+        """Return a snapshot of the hit, miss, eviction and load-time counters."""
+        with self._lock:
+            return CacheStats(**vars(self._stats))
+
+
+reference_model_cache = ReferenceModelCache(
+    max_rss_bytes=env.REFERENCE_MODEL_CACHE_MAX_RSS_MB * 1024 * 1024
+)
@@ -0,0 +1,191 @@
+"""ONNX Runtime backend for the reference language model.
+
+The Hugging Face model is exported once to ONNX with dynamic batch and
+sequence axes and stored in the model cache under ``CACHE_DIR``. It is then
+served by an ONNX Runtime session with all graph optimizations enabled,
+behind the same call interface as the torch model, so the scoring engine
+computes identical per-sample losses on either backend.
+
+The 'int8' dtype applies dynamic int8 quantization to the weights of the
+matrix multiplications (the linear layers, which dominate CPU time) of the
+exported model. The quantized model is cached next to the float32 export.
+"""
+
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+
+# Exported models are stored next to the downloaded model files
+ONNX_DIR = "models/onnx"
+ONNX_OPSET = 17
+ONNX_DTYPES = ("float32", "int8")
+
+
+@dataclass
+class CausalLMOutput:
+    logits: torch.Tensor
+
+
+class _LogitsModule(torch.nn.Module):
+    """Expose only the logits of a causal language model for export."""
+
+    def __init__(self, model: torch.nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor
+    ) -> torch.Tensor:
+        return self.model(
+            input_ids=input_ids, attention_mask=attention_mask, use_cache=False
+        ).logits
+
+
+def onnx_model_path(model_name: str, variant: str = "model") -> str:
+    """Return the cache path of an exported model.
+
+    Args:
+        model_name (str): Hugging Face model name or local path
+        variant (str): File stem, e.g. 'model' or a quantized variant
+
+    Returns:
+        str: Path of the ONNX file under CACHE_DIR/models/onnx
+    """
+    safe_name = model_name.strip("/").replace("/", "--")
+    return f"{env.CACHE_DIR}/{ONNX_DIR}/{safe_name}/{variant}.onnx"
+
+
+def export_onnx(model_name: str, path: str) -> str:
+    """Export a causal language model to ONNX with dynamic axes.
+
+    The file is written to a temporary name and renamed atomically, so
+    concurrent workers never load a partially written export.
+
+    Args:
+        model_name (str): Hugging Face model name or local path
+        path (str): Destination of the ONNX file
+
+    Returns:
+        str: Path of the exported file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model = AutoModelForCausalLM.from_pretrained(model_name)
+    module = _LogitsModule(model).eval()
+
+    dummy = torch.ones((2, 8), dtype=torch.long)
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch", 1: "sequence"},
+    }
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                module,
+                (dummy, torch.ones_like(dummy)),
+                tmp_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes=dynamic_axes,
+                opset_version=ONNX_OPSET,
+                dynamo=False,
+            )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Exported {model_name} to {path}")
+    return path
+
+
+def quantize_onnx(source: str, path: str) -> str:
+    """Quantize the linear layers of an ONNX model to dynamic int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, so no
+    calibration data is needed.
+
+    Args:
+        source (str): Path of the float32 ONNX model
+        path (str): Destination of the quantized model
+
+    Returns:
+        str: Path of the quantized file
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        quantize_dynamic(
+            source,
+            tmp_path,
+            op_types_to_quantize=["MatMul", "Gemm"],
+            weight_type=QuantType.QInt8,
+        )
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    logger.info(f"Quantized {source} to {path}")
+    return path
+
+
+class OnnxCausalLM:
+    """ONNX Runtime session callable like a Hugging Face causal language model."""
+
+    def __init__(self, path: str, intra_op_num_threads: int | None = None) -> None:
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_num_threads is not None:
+            options.intra_op_num_threads = intra_op_num_threads
+        self.path = path
+        self.session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+
+    def __call__(
+        self, input_ids: torch.Tensor, attention_mask: torch.Tensor | None = None
+    ) -> CausalLMOutput:
+        if attention_mask is None:
+            attention_mask = torch.ones_like(input_ids)
+        (logits,) = self.session.run(
+            ["logits"],
+            {
+                "input_ids": input_ids.numpy().astype(np.int64),
+                "attention_mask": attention_mask.numpy().astype(np.int64),
+            },
+        )
+        return CausalLMOutput(logits=torch.from_numpy(logits))
+
+
+def load_onnx_model(model_name: str, dtype: str) -> tuple[Any, Any]:
+    """Load (exporting on first use) an ONNX reference model and its tokenizer.
+
+    Raises:
+        ValueError: If ``dtype`` is neither 'float32' nor 'int8'
+    """
+    if dtype not in ONNX_DTYPES:
+        raise ValueError(f"Unsupported dtype for the ONNX backend: {dtype}")
+    path = onnx_model_path(model_name)
+    if not os.path.exists(path):
+        export_onnx(model_name, path)
+    if dtype == "int8":
+        quantized_path = onnx_model_path(model_name, variant="model.int8")
+        if not os.path.exists(quantized_path):
+            quantize_onnx(path, quantized_path)
+        path = quantized_path
+    model = OnnxCausalLM(path, intra_op_num_threads=torch.get_num_threads())
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return model, tokenizer
@@ -0,0 +1,342 @@
+"""Paired scoring of attacked texts against their clean originals.
+
+A word swap leaves every token before the first swapped word unchanged, so
+the clean and attacked versions of a text share a token prefix. The prefix
+they have in common is run through the model once, and its key/value cache is
+reused to score the two diverging suffixes. Every token is still scored with
+its full left context, so both scores are those of independent forward
+passes, while the shared prefix is computed once instead of twice.
+
+Pairs are batched like ordinary samples: the prefixes of many pairs of
+similar length run in one padded forward pass, and their suffixes in a second
+one. Texts are deduplicated across both columns first, so a clean text that
+was attacked several times, or a repeated pair, is scored once; a text whose
+partner is already scored in another pair, or that shares no prefix with it,
+is scored with the batched engine instead.
+
+The per-token NLL of both texts of a pair comes out of the same passes, so
+``score_text_pairs_with_token_nll`` returns it at no extra cost.
+
+Paired scoring needs a PyTorch model that returns ``past_key_values`` and
+truncated scoring. Otherwise (sliding-window scoring, ONNX models) each
+column is scored independently with the batched engine.
+"""
+
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+
+from a4s_eval.perplexity.dedup import dedup_texts
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    encode_texts,
+    get_pad_token_id,
+    is_scorable,
+    make_buckets,
+    pad_batch,
+    score_texts_with_token_nll,
+    scores_from_token_nll,
+    token_nll_from_logits,
+    token_nll_token_ids,
+)
+from a4s_eval.utils.profiling import count, stage
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    """Return the number of leading tokens two sequences have in common."""
+    n = min(len(a), len(b))
+    mismatch = np.flatnonzero(np.asarray(a[:n]) != np.asarray(b[:n]))
+    return int(mismatch[0]) if len(mismatch) else n
+
+
+def supports_prefix_cache(model: Any) -> bool:
+    """Return True if the model can resume from a key/value cache."""
+    return isinstance(model, torch.nn.Module)
+
+
+def repeat_cache(cache: Any, n: int) -> Any:
+    """Repeat every row of a key/value cache ``n`` times, in place if possible."""
+    if isinstance(cache, tuple):
+        # Legacy format: one (key, value) pair of tensors per layer
+        return tuple(
+            tuple(tensor.repeat_interleave(n, dim=0) for tensor in layer)
+            for layer in cache
+        )
+    cache.batch_repeat_interleave(n)
+    return cache
+
+
+def shared_prefix_length(clean_ids: Sequence[int], attacked_ids: Sequence[int]) -> int:
+    """Return the number of prefix tokens a pair can share.
+
+    At least one token of each sequence is left to its suffix, so sequences
+    that are equal or prefixes of one another are handled too.
+    """
+    return min(
+        common_prefix_length(clean_ids, attacked_ids),
+        min(len(clean_ids), len(attacked_ids)) - 1,
+    )
+
+
+def paired_token_nll(
+    pairs: Sequence[tuple[Sequence[int], Sequence[int]]],
+    model: Any,
+    pad_token_id: int,
+    config: ScoringConfig,
+    progress: bool = False,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Compute the NLL of every token of pairs of sequences sharing a prefix.
+
+    Pairs are bucketed by length. For each bucket, the shared prefixes run in
+    one right-padded pass with ``use_cache=True``; the cache is repeated for
+    both rows of every pair, and the two suffixes of all pairs run in a second
+    pass on top of it, with position ids continuing their prefix. Each pair
+    counts as two rows against the batch size and token budget.
+
+    Args:
+        pairs (Sequence[tuple[Sequence[int], Sequence[int]]]): Token ids of
+            each clean and attacked sequence, sharing at least one token
+        model (Any): Causal language model returning ``past_key_values``
+        pad_token_id (int): Token id used to pad shorter rows
+        config (ScoringConfig): Batching settings
+        progress (bool): Whether to display a progress bar over batches
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray]]: For each pair, the NLL of tokens
+            1 to n - 1 of the clean and of the attacked sequence
+    """
+    prefixes = [shared_prefix_length(clean, attacked) for clean, attacked in pairs]
+    if min(prefixes, default=1) < 1:
+        raise ValueError("Every pair must share at least one prefix token")
+    lengths = [max(len(clean), len(attacked)) for clean, attacked in pairs]
+    buckets = make_buckets(
+        lengths,
+        max(1, config.batch_size // 2),
+        max(1, config.max_tokens_per_batch // 2),
+    )
+
+    token_nll: list[tuple[np.ndarray, np.ndarray]] = []
+    order: list[int] = []
+    for bucket in tqdm(buckets, desc="Scoring pairs", disable=not progress):
+        prefix_ids, prefix_mask = pad_batch(
+            [pairs[i][0][: prefixes[i]] for i in bucket], pad_token_id
+        )
+        # Rows 2r and 2r + 1 are the clean and attacked suffixes of pair r
+        suffixes = [ids[prefixes[i] :] for i in bucket for ids in pairs[i]]
+        suffix_ids, suffix_mask = pad_batch(suffixes, pad_token_id)
+        suffix_prefixes = torch.as_tensor([prefixes[i] for i in bucket])
+        position_ids = suffix_prefixes.repeat_interleave(2)[:, None] + torch.arange(
+            suffix_ids.shape[1]
+        )
+        with torch.no_grad(), stage("forward"):
+            out = model(
+                input_ids=prefix_ids, attention_mask=prefix_mask, use_cache=True
+            )
+            suffix_logits = model(
+                input_ids=suffix_ids,
+                attention_mask=torch.cat(
+                    [prefix_mask.repeat_interleave(2, dim=0), suffix_mask], dim=1
+                ),
+                position_ids=position_ids,
+                past_key_values=repeat_cache(out.past_key_values, 2),
+                use_cache=False,
+            ).logits
+
+        # Prefix position j predicts prefix token j + 1, and the last prefix
+        # position the first token of both suffixes
+        prefix_nll = token_nll_from_logits(out.logits, prefix_ids, prefix_mask)[0]
+        last_logits = out.logits[torch.arange(len(bucket)), suffix_prefixes - 1]
+        first_nll = F.cross_entropy(
+            last_logits.float().repeat_interleave(2, dim=0),
+            suffix_ids[:, 0],
+            reduction="none",
+        )
+        suffix_nll = token_nll_from_logits(suffix_logits, suffix_ids, suffix_mask)[0]
+        prefix_nll, first_nll, suffix_nll = (
+            prefix_nll.numpy(),
+            first_nll.numpy(),
+            suffix_nll.numpy(),
+        )
+        for row, i in enumerate(bucket):
+            shared = prefix_nll[row, : prefixes[i] - 1]
+            clean, attacked = (
+                np.concatenate(
+                    [
+                        shared,
+                        first_nll[2 * row + side : 2 * row + side + 1],
+                        suffix_nll[2 * row + side, : len(suffixes[2 * row + side]) - 1],
+                    ]
+                ).astype(np.float32)
+                for side in range(2)
+            )
+            token_nll.append((clean, attacked))
+            order.append(i)
+
+    result = dict(zip(order, token_nll))
+    return [result[i] for i in range(len(pairs))]
+
+
+def score_text_pairs_with_token_nll(
+    clean_texts: Sequence[Any],
+    attacked_texts: Sequence[Any],
+    model: Any,
+    tokenizer: Any,
+    config: ScoringConfig | None = None,
+    progress: bool = False,
+    clean_token_ids: Sequence[Sequence[int]] | None = None,
+    attacked_token_ids: Sequence[Sequence[int]] | None = None,
+) -> tuple[
+    tuple[np.ndarray, list[np.ndarray | None]],
+    tuple[np.ndarray, list[np.ndarray | None]],
+]:
+    """Compute the perplexity and per-token NLL of clean and attacked texts.
+
+    Non-string and blank values are scored as ``inf`` and get no token NLL,
+    as in ``score_texts_with_token_nll``.
+
+    Args:
+        clean_texts (Sequence[Any]): Original texts
+        attacked_texts (Sequence[Any]): Attacked version of each original text
+        model (Any): Causal language model in eval mode
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Truncation and batching settings,
+            defaults if None
+        progress (bool): Whether to display a progress bar over batches
+        clean_token_ids (Sequence[Sequence[int]] | None): Untruncated token
+            ids of each clean text, tokenized if None
+        attacked_token_ids (Sequence[Sequence[int]] | None): Untruncated token
+            ids of each attacked text, tokenized if None
+
+    Returns:
+        tuple[tuple[np.ndarray, list[np.ndarray | None]], tuple[np.ndarray,
+            list[np.ndarray | None]]]: Perplexity and token NLL of each clean
+            text, then of each attacked text, in input order
+
+    Raises:
+        ValueError: If the two columns differ in length
+    """
+    if len(clean_texts) != len(attacked_texts):
+        raise ValueError(
+            f"Got {len(clean_texts)} clean texts and {len(attacked_texts)} "
+            "attacked texts"
+        )
+    config = config or ScoringConfig()
+    if config.stride is not None or not supports_prefix_cache(model):
+        # No prefix can be shared: each column is scored in its own batches
+        return (
+            score_texts_with_token_nll(
+                clean_texts, model, tokenizer, config, progress, clean_token_ids
+            ),
+            score_texts_with_token_nll(
+                attacked_texts, model, tokenizer, config, progress, attacked_token_ids
+            ),
+        )
+
+    n_pairs = len(clean_texts)
+    with stage("dedup"):
+        dedup = dedup_texts([*clean_texts, *attacked_texts])
+    scorable = [i for i, text in enumerate(dedup.unique_texts) if is_scorable(text)]
+    stored_ids = None
+    if clean_token_ids is not None and attacked_token_ids is not None:
+        # Row of the first occurrence of each distinct text, to read its tokens
+        first_rows = np.unique(dedup.inverse, return_index=True)[1]
+        row_ids = [*clean_token_ids, *attacked_token_ids]
+        stored_ids = [row_ids[first_rows[i]] for i in scorable]
+    token_ids = dict(
+        zip(
+            scorable,
+            encode_texts(
+                [dedup.unique_texts[i] for i in scorable],
+                tokenizer,
+                config,
+                stored_ids,
+            ),
+        )
+    )
+
+    # Every distinct text is scored once: with its partner if both are still
+    # unscored and share a prefix, else on its own
+    pairs: list[tuple[int, int]] = []
+    taken: set[int] = set()
+    for clean, attacked in dict.fromkeys(
+        zip(dedup.inverse[:n_pairs].tolist(), dedup.inverse[n_pairs:].tolist())
+    ):
+        if (
+            clean != attacked
+            and clean in token_ids
+            and attacked in token_ids
+            and not {clean, attacked} & taken
+            and shared_prefix_length(token_ids[clean], token_ids[attacked]) >= 1
+        ):
+            pairs.append((clean, attacked))
+            taken.update((clean, attacked))
+    alone = [i for i in scorable if i not in taken]
+    count("distinct_texts", dedup.n_unique)
+    count("paired_texts", len(taken))
+
+    pad_token_id = get_pad_token_id(tokenizer)
+    unique_nll: list[np.ndarray | None] = [None] * dedup.n_unique
+    alone_nll = token_nll_token_ids(
+        [token_ids[i] for i in alone], model, pad_token_id, config, progress
+    )
+    for i, nll in zip(alone, alone_nll):
+        unique_nll[i] = nll
+    pair_nll = paired_token_nll(
+        [(token_ids[clean], token_ids[attacked]) for clean, attacked in pairs],
+        model,
+        pad_token_id,
+        config,
+        progress,
+    )
+    for (clean, attacked), (clean_nll, attacked_nll) in zip(pairs, pair_nll):
+        unique_nll[clean] = clean_nll
+        unique_nll[attacked] = attacked_nll
+
+    unique_scores = np.full(dedup.n_unique, np.inf, dtype=np.float64)
+    unique_scores[scorable] = scores_from_token_nll(
+        [unique_nll[i] for i in scorable]
+    )
+    scores = dedup.expand(unique_scores)
+    token_nll = [unique_nll[i] for i in dedup.inverse]
+    return (
+        (scores[:n_pairs], token_nll[:n_pairs]),
+        (scores[n_pairs:], token_nll[n_pairs:]),
+    )
+
+
+def score_text_pairs(
+    clean_texts: Sequence[Any],
+    attacked_texts: Sequence[Any],
+    model: Any,
+    tokenizer: Any,
+    config: ScoringConfig | None = None,
+    progress: bool = False,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Compute the perplexity of clean texts and of their attacked versions.
+
+    Texts are scored as in ``score_text_pairs_with_token_nll``, whose token
+    NLL is dropped.
+
+    Args:
+        clean_texts (Sequence[Any]): Original texts
+        attacked_texts (Sequence[Any]): Attacked version of each original text
+        model (Any): Causal language model in eval mode
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Truncation and batching settings,
+            defaults if None
+        progress (bool): Whether to display a progress bar over batches
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Perplexity of each clean text and of
+            each attacked text, in input order
+
+    Raises:
+        ValueError: If the two columns differ in length
+    """
+    (clean_scores, _), (attacked_scores, _) = score_text_pairs_with_token_nll(
+        clean_texts, attacked_texts, model, tokenizer, config, progress
+    )
+    return clean_scores, attacked_scores
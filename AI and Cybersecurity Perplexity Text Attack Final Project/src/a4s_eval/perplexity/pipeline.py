@@ -0,0 +1,338 @@
+"""Streaming attack-and-score pipeline.
+
+Rows are read from a parquet file in chunks and flow through connected stages
+(attack, clean scoring and attacked scoring), each running in its own thread
+and linked to the next one by a bounded queue. Scoring therefore overlaps with
+the attack, and only a few chunks per stage are held in memory whatever the
+size of the dataset. Every chunk is appended to a single parquet table that
+joins each clean row with its attacked text and both perplexity scores.
+"""
+
+import os
+import queue
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from tqdm import tqdm
+
+from a4s_eval.perplexity.engine import ScoringConfig
+from a4s_eval.perplexity.model_cache import ReferenceModel
+from a4s_eval.perplexity.score_cache import ScoreCache
+from a4s_eval.perplexity.scoring import compute_perplexities, default_scoring_config
+from a4s_eval.perplexity.sharding import ShardedScorer
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.utils.profiling import stage
+
+logger = get_logger()
+
+# Interval at which blocked stages check whether another stage failed
+_POLL_SECONDS = 0.1
+
+# End-of-stream marker passed down the queues
+_DONE = object()
+
+Stage = Callable[[pd.DataFrame], pd.DataFrame]
+
+
+@dataclass
+class PipelineResult:
+    """Summary of a pipeline run.
+
+    Attributes:
+        output_path (str): Path of the joined result table.
+        n_rows (int): Number of rows written.
+        n_chunks (int): Number of chunks that went through the stages.
+        seconds (float): Wall time of the run.
+    """
+
+    output_path: str
+    n_rows: int
+    n_chunks: int
+    seconds: float
+
+
+def iter_parquet_chunks(
+    path: str, chunk_size: int, limit: int | None = None
+) -> Iterator[pd.DataFrame]:
+    """Read a parquet file as a stream of DataFrame chunks.
+
+    Args:
+        path (str): Parquet file to read
+        chunk_size (int): Maximum number of rows per chunk
+        limit (int | None): Maximum number of rows to read in total
+
+    Returns:
+        Iterator[pd.DataFrame]: Chunks in file order
+    """
+    remaining = limit
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+        with stage("load_parquet"):
+            chunk = batch.to_pandas()
+        if remaining is not None:
+            chunk = chunk.head(remaining)
+            remaining -= len(chunk)
+        if not chunk.empty:
+            yield chunk
+        if remaining == 0:
+            return
+
+
+def attack_stage(
+    attack: Callable[[str], str],
+    text_column: str = "context",
+    attacked_column: str = "attacked_context",
+) -> Stage:
+    """Build a stage that adds the attacked version of each text."""
+
+    def run(chunk: pd.DataFrame) -> pd.DataFrame:
+        with stage("attack"):
+            chunk[attacked_column] = [attack(text) for text in chunk[text_column]]
+        return chunk
+
+    return run
+
+
+def score_stage(
+    reference: ReferenceModel,
+    text_column: str,
+    score_column: str,
+    config: ScoringConfig | None = None,
+    score_cache: ScoreCache | None = None,
+    scorer: ShardedScorer | None = None,
+) -> Stage:
+    """Build a stage that adds the perplexity of each text."""
+
+    def run(chunk: pd.DataFrame) -> pd.DataFrame:
+        result = compute_perplexities(
+            chunk[text_column].tolist(),
+            reference,
+            config,
+            score_cache=score_cache,
+            scorer=scorer,
+        )
+        chunk[score_column] = result.scores
+        return chunk
+
+    return run
+
+
+def _get(inbox: queue.Queue, stop: threading.Event) -> Any:
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _put(outbox: queue.Queue, item: Any, stop: threading.Event) -> None:
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=_POLL_SECONDS)
+            return
+        except queue.Full:
+            continue
+
+
+def run_stages(
+    source: Iterable[Any],
+    stages: Sequence[Callable[[Any], Any]],
+    sink: Callable[[Any], None],
+    queue_size: int = 2,
+) -> int:
+    """Run items through a chain of stages connected by bounded queues.
+
+    The source and every stage run in their own thread, the sink in the
+    calling thread. Items reach the sink in source order. If any stage fails,
+    all threads stop and the first error is raised.
+
+    Args:
+        source (Iterable[Any]): Items to process
+        stages (Sequence[Callable[[Any], Any]]): Functions applied in order
+        sink (Callable[[Any], None]): Consumer of the processed items
+        queue_size (int): Capacity of each queue between two stages
+
+    Returns:
+        int: Number of items that reached the sink
+    """
+    stop = threading.Event()
+    errors: list[BaseException] = []
+    queues: list[queue.Queue] = [
+        queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)
+    ]
+
+    def fail(error: BaseException) -> None:
+        errors.append(error)
+        stop.set()
+
+    def read() -> None:
+        try:
+            for item in source:
+                _put(queues[0], item, stop)
+                if stop.is_set():
+                    return
+        except BaseException as error:
+            fail(error)
+        _put(queues[0], _DONE, stop)
+
+    def work(
+        fn: Callable[[Any], Any], inbox: queue.Queue, outbox: queue.Queue
+    ) -> None:
+        try:
+            while (item := _get(inbox, stop)) is not _DONE:
+                _put(outbox, fn(item), stop)
+        except BaseException as error:
+            fail(error)
+        _put(outbox, _DONE, stop)
+
+    # Each thread runs in its own copy of this context, so that its stages are
+    # recorded into the caller's profile runs
+    threads = [
+        threading.Thread(
+            target=copy_context().run,
+            args=(read,),
+            name="pipeline-source",
+            daemon=True,
+        )
+    ]
+    for i, fn in enumerate(stages):
+        threads.append(
+            threading.Thread(
+                target=copy_context().run,
+                args=(work, fn, queues[i], queues[i + 1]),
+                name=f"pipeline-stage-{i}",
+                daemon=True,
+            )
+        )
+    for thread in threads:
+        thread.start()
+
+    n_items = 0
+    try:
+        while (item := _get(queues[-1], stop)) is not _DONE:
+            sink(item)
+            n_items += 1
+    except BaseException as error:
+        fail(error)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+    return n_items
+
+
+def run_pipeline(
+    input_path: str,
+    output_path: str,
+    attack: Callable[[str], str],
+    reference: ReferenceModel,
+    config: ScoringConfig | None = None,
+    score_cache: ScoreCache | None = None,
+    text_column: str = "context",
+    chunk_size: int = 64,
+    queue_size: int = 2,
+    limit: int | None = None,
+    progress: bool = False,
+) -> PipelineResult:
+    """Attack and score a dataset in one streaming pass.
+
+    The output table holds every input column plus ``attacked_<text_column>``,
+    ``clean_score`` and ``attacked_score``. It is written to a temporary file
+    and renamed once complete, so a failed run never leaves a partial table.
+
+    Args:
+        input_path (str): Parquet file of clean rows
+        output_path (str): Parquet file of joined results
+        attack (Callable[[str], str]): Returns the attacked version of a text
+        reference (ReferenceModel): Reference model used for both scores
+        config (ScoringConfig | None): Scoring settings, read from the
+            environment if None
+        score_cache (ScoreCache | None): Persistent score store to consult
+        text_column (str): Column holding the texts to attack
+        chunk_size (int): Number of rows per chunk
+        queue_size (int): Number of chunks buffered between two stages
+        limit (int | None): Maximum number of rows to process
+        progress (bool): Whether to display a progress bar over rows
+
+    Returns:
+        PipelineResult: Output path and run statistics
+    """
+    start = time.perf_counter()
+    config = config or default_scoring_config()
+    attacked_column = f"attacked_{text_column}"
+
+    total = pq.ParquetFile(input_path).metadata.num_rows
+    if limit is not None:
+        total = min(total, limit)
+
+    # Both scoring stages share one worker pool when scoring is sharded
+    scorer = (
+        ShardedScorer(reference.key, config, config.num_workers)
+        if config.num_workers > 1
+        else None
+    )
+    pool: ContextManager[Any] = scorer if scorer is not None else nullcontext()
+
+    stages = [
+        attack_stage(attack, text_column, attacked_column),
+        score_stage(reference, text_column, "clean_score", config, score_cache, scorer),
+        score_stage(
+            reference, attacked_column, "attacked_score", config, score_cache, scorer
+        ),
+    ]
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    writer: pq.ParquetWriter | None = None
+    n_rows = 0
+
+    def write(chunk: pd.DataFrame) -> None:
+        nonlocal writer, n_rows
+        with stage("write_results"):
+            if writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    chunk, schema=writer.schema, preserve_index=False
+                )
+            writer.write_table(table)
+        n_rows += len(chunk)
+        bar.update(len(chunk))
+
+    try:
+        with (
+            pool,
+            tqdm(total=total, desc="Processing rows", disable=not progress) as bar,
+        ):
+            n_chunks = run_stages(
+                iter_parquet_chunks(input_path, chunk_size, limit),
+                stages,
+                write,
+                queue_size=queue_size,
+            )
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, output_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    seconds = time.perf_counter() - start
+    logger.info(f"Pipeline wrote {n_rows} rows to {output_path} in {seconds:.1f}s")
+    return PipelineResult(
+        output_path=output_path, n_rows=n_rows, n_chunks=n_chunks, seconds=seconds
+    )
@@ -0,0 +1,142 @@
+"""Accuracy report of a quantized reference model against float32.
+
+Quantization speeds up scoring but shifts the perplexity of every text. For
+attack detection what matters is that scores stay close and, above all, that
+texts keep the same ordering, so the report gives both the score deviation
+and the Spearman rank correlation on a sample of texts, next to the speedup.
+"""
+
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Sequence
+
+import numpy as np
+from scipy.stats import spearmanr
+
+from a4s_eval.perplexity.dedup import dedup_texts
+from a4s_eval.perplexity.engine import ScoringConfig, is_scorable, score_texts
+from a4s_eval.perplexity.model_cache import ReferenceModelCache, reference_model_cache
+
+
+@dataclass
+class QuantizationReport:
+    """Deviation of quantized scores from the float32 scores of the same texts.
+
+    Attributes:
+        n_samples (int): Number of texts with a finite score in both runs.
+        mean_relative_deviation (float): Mean of |quantized - fp32| / fp32.
+        max_relative_deviation (float): Largest relative deviation.
+        mean_log_deviation (float): Mean absolute difference of the mean
+            token NLL (log perplexity).
+        spearman (float): Rank correlation between the two sets of scores.
+        reference_seconds (float): Scoring time of the float32 model.
+        quantized_seconds (float): Scoring time of the quantized model.
+    """
+
+    n_samples: int
+    mean_relative_deviation: float
+    max_relative_deviation: float
+    mean_log_deviation: float
+    spearman: float
+    reference_seconds: float = 0.0
+    quantized_seconds: float = 0.0
+
+    @property
+    def speedup(self) -> float:
+        if not self.quantized_seconds:
+            return float("nan")
+        return self.reference_seconds / self.quantized_seconds
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**asdict(self), "speedup": self.speedup}
+
+
+def compare_scores(
+    reference_scores: np.ndarray, quantized_scores: np.ndarray
+) -> QuantizationReport:
+    """Compare two sets of perplexity scores of the same texts.
+
+    Texts that are not finitely scored by both models are ignored.
+
+    Args:
+        reference_scores (np.ndarray): Float32 perplexities
+        quantized_scores (np.ndarray): Quantized perplexities, in the same order
+
+    Returns:
+        QuantizationReport: Deviation statistics, without timings
+    """
+    reference_scores = np.asarray(reference_scores, dtype=np.float64)
+    quantized_scores = np.asarray(quantized_scores, dtype=np.float64)
+    finite = np.isfinite(reference_scores) & np.isfinite(quantized_scores)
+    ref, quant = reference_scores[finite], quantized_scores[finite]
+    if not len(ref):
+        nan = float("nan")
+        return QuantizationReport(0, nan, nan, nan, nan)
+
+    relative = np.abs(quant - ref) / ref
+    spearman = float(spearmanr(ref, quant).statistic) if len(ref) > 1 else 1.0
+    return QuantizationReport(
+        n_samples=int(len(ref)),
+        mean_relative_deviation=float(relative.mean()),
+        max_relative_deviation=float(relative.max()),
+        mean_log_deviation=float(np.abs(np.log(quant) - np.log(ref)).mean()),
+        spearman=spearman,
+    )
+
+
+def quantization_report(
+    texts: Sequence[Any],
+    model_name: str = "distilgpt2",
+    dtype: str = "int8",
+    backend: str = "onnx",
+    sample_size: int = 200,
+    seed: int = 0,
+    config: ScoringConfig | None = None,
+    cache: ReferenceModelCache = reference_model_cache,
+) -> QuantizationReport:
+    """Score a sample of texts with the float32 and the quantized model.
+
+    Both models are loaded before timing, so the timings only cover scoring.
+
+    Args:
+        texts (Sequence[Any]): Texts to sample from
+        model_name (str): Reference model name
+        dtype (str): Quantized dtype to evaluate
+        backend (str): Backend of both models
+        sample_size (int): Number of distinct texts to score
+        seed (int): Seed of the sample
+        config (ScoringConfig | None): Scoring configuration
+        cache (ReferenceModelCache): Cache the models are loaded through
+
+    Returns:
+        QuantizationReport: Deviation statistics and timings
+    """
+    config = config or ScoringConfig()
+    candidates = [
+        text for text in dedup_texts(texts).unique_texts if is_scorable(text)
+    ]
+    rng = np.random.default_rng(seed)
+    picked = rng.choice(
+        len(candidates), min(sample_size, len(candidates)), replace=False
+    )
+    sample = [candidates[i] for i in sorted(picked)]
+
+    reference = cache.get(model_name, dtype="float32", backend=backend)
+    quantized = cache.get(model_name, dtype=dtype, backend=backend)
+
+    start = time.perf_counter()
+    reference_scores = score_texts(
+        sample, reference.model, reference.tokenizer, config
+    )
+    reference_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    quantized_scores = score_texts(
+        sample, quantized.model, quantized.tokenizer, config
+    )
+    quantized_seconds = time.perf_counter() - start
+
+    report = compare_scores(reference_scores, quantized_scores)
+    report.reference_seconds = reference_seconds
+    report.quantized_seconds = quantized_seconds
+    return report
@@ -0,0 +1,154 @@
+"""Persistent on-disk cache of perplexity scores.
+
+Scores depend only on the reference model weights, the tokenizer, the
+truncation length (or sliding window) and the text itself. They are stored in
+a SQLite database under ``CACHE_DIR`` keyed by those values, so re-running an
+experiment only scores texts that were never seen before, and an interrupted
+run resumes from the last committed chunk.
+"""
+
+import math
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Iterable, Sequence
+
+from a4s_eval.utils import env
+
+# Directory name for cached scores, next to the dataset and model caches
+SCORE_DIR = "scores"
+SCORE_DB_FILE = "perplexity_scores.sqlite"
+
+# Maximum number of host parameters per SQLite statement
+_QUERY_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class ScoreNamespace:
+    """Everything except the text that determines a perplexity score.
+
+    Attributes:
+        model_id (str): Identifier of the reference model weights.
+        tokenizer_revision (str): Fingerprint of the tokenizer.
+        max_length (int): Truncation length or sliding-window size.
+        stride (int): Sliding-window stride, 0 when texts are truncated.
+    """
+
+    model_id: str
+    tokenizer_revision: str
+    max_length: int
+    stride: int = 0
+
+
+class ScoreCache:
+    """SQLite-backed store of perplexity scores keyed by text digest."""
+
+    def __init__(self, path: str | None = None) -> None:
+        if path is None:
+            cache_dir = f"{env.CACHE_DIR}/{SCORE_DIR}"
+            os.makedirs(cache_dir, exist_ok=True)
+            path = f"{cache_dir}/{SCORE_DB_FILE}"
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scores (
+                model_id TEXT NOT NULL,
+                tokenizer_revision TEXT NOT NULL,
+                max_length INTEGER NOT NULL,
+                stride INTEGER NOT NULL,
+                text_digest TEXT NOT NULL,
+                score REAL,
+                PRIMARY KEY (
+                    model_id, tokenizer_revision, max_length, stride, text_digest
+                )
+            ) WITHOUT ROWID
+            """
+        )
+        self._conn.commit()
+
+    def get_many(
+        self, namespace: ScoreNamespace, digests: Sequence[str]
+    ) -> dict[str, float]:
+        """Look up the cached scores of several texts.
+
+        Args:
+            namespace (ScoreNamespace): Model, tokenizer and truncation settings
+            digests (Sequence[str]): Digests of the texts to look up
+
+        Returns:
+            dict[str, float]: Cached score of each digest found in the store
+        """
+        found: dict[str, float] = {}
+        with self._lock:
+            for start in range(0, len(digests), _QUERY_CHUNK):
+                chunk = list(digests[start : start + _QUERY_CHUNK])
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"""
+                    SELECT text_digest, score FROM scores
+                    WHERE model_id = ? AND tokenizer_revision = ?
+                    AND max_length = ? AND stride = ?
+                    AND text_digest IN ({placeholders})
+                    """,
+                    (
+                        namespace.model_id,
+                        namespace.tokenizer_revision,
+                        namespace.max_length,
+                        namespace.stride,
+                        *chunk,
+                    ),
+                )
+                for digest, score in rows:
+                    # SQLite stores NaN as NULL
+                    found[digest] = math.nan if score is None else score
+        return found
+
+    def put_many(
+        self, namespace: ScoreNamespace, items: Iterable[tuple[str, float]]
+    ) -> None:
+        """Store scores and commit them durably.
+
+        Args:
+            namespace (ScoreNamespace): Model, tokenizer and truncation settings
+            items (Iterable[tuple[str, float]]): (text digest, score) pairs
+        """
+        rows = [
+            (
+                namespace.model_id,
+                namespace.tokenizer_revision,
+                namespace.max_length,
+                namespace.stride,
+                digest,
+                None if math.isnan(score) else float(score),
+            )
+            for digest, score in items
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_score_cache: ScoreCache | None = None
+
+
+def get_score_cache() -> ScoreCache:
+    """Return the process-wide score cache stored under ``CACHE_DIR``."""
+    global _default_score_cache
+    if _default_score_cache is None:
+        _default_score_cache = ScoreCache()
+    return _default_score_cache
@@ -0,0 +1,292 @@
+"""Dataset-level perplexity scoring shared by the metric and the experiments.
+
+This module chains the stages that turn a column of texts into perplexity
+scores: deduplication of repeated texts, lookup of previously computed scores
+in the persistent score cache, batched scoring of the remaining texts with the
+reference model, and fan-out of the scores to every input row.
+
+Optionally, the negative log-likelihood of every token is kept as well. The
+score cache only holds scores, so in that mode every distinct text is scored.
+
+Texts can also be scored through the ``log_likelihood`` of any
+``TextGenerationModel`` instead of a reference model, with the same
+deduplication; scores of arbitrary models are not cached.
+"""
+
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, ContextManager, Sequence
+
+import numpy as np
+from tqdm import tqdm
+
+from a4s_eval.perplexity.dedup import DedupResult, dedup_texts
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    is_scorable,
+    score_texts,
+    score_texts_with_token_nll,
+)
+from a4s_eval.perplexity.model_cache import ReferenceModel
+from a4s_eval.perplexity.score_cache import (
+    ScoreCache,
+    ScoreNamespace,
+    get_score_cache,
+)
+from a4s_eval.perplexity.sharding import ShardedScorer
+from a4s_eval.perplexity.token_store import TokenStore, ensure_token_store
+from a4s_eval.service.functional_model import LogLikelihoodFn
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.utils.profiling import count, stage
+
+logger = get_logger()
+
+# Number of distinct texts scored between two commits to the score cache
+CHECKPOINT_SIZE = 512
+
+
+@dataclass
+class ScoringResult:
+    """Scores of a text column and statistics about how they were computed.
+
+    Attributes:
+        scores (np.ndarray): Perplexity of every input row, in input order.
+        n_rows (int): Number of input rows.
+        n_unique (int): Number of distinct texts.
+        n_cached (int): Number of distinct texts served by the score cache.
+        digests (list[str]): Digest of the text of every input row.
+        token_nll (list[np.ndarray | None] | None): NLL of the tokens of every
+            input row after the first (None for texts that cannot be scored),
+            if requested.
+    """
+
+    scores: np.ndarray
+    n_rows: int
+    n_unique: int
+    n_cached: int = 0
+    digests: list[str] = field(default_factory=list)
+    token_nll: list[np.ndarray | None] | None = None
+
+    @property
+    def dedup_ratio(self) -> float:
+        return self.n_rows / self.n_unique if self.n_unique else 1.0
+
+
+def default_scoring_config(max_length: int = 1024) -> ScoringConfig:
+    """Build the scoring configuration from the environment settings."""
+    return ScoringConfig(
+        batch_size=env.PERPLEXITY_BATCH_SIZE,
+        max_tokens_per_batch=env.PERPLEXITY_MAX_TOKENS_PER_BATCH,
+        max_length=max_length,
+        stride=env.PERPLEXITY_STRIDE or None,
+        num_workers=env.PERPLEXITY_NUM_WORKERS,
+    )
+
+
+def default_score_cache() -> ScoreCache | None:
+    """Return the persistent score cache unless disabled in the environment."""
+    return get_score_cache() if env.PERPLEXITY_SCORE_CACHE else None
+
+
+def default_token_store(
+    dedup: DedupResult, reference: ReferenceModel
+) -> TokenStore | None:
+    """Return the token store of a column unless disabled in the environment."""
+    return ensure_token_store(dedup, reference) if env.PERPLEXITY_TOKEN_STORE else None
+
+
+def compute_perplexities(
+    texts: Sequence[Any],
+    reference: ReferenceModel,
+    config: ScoringConfig | None = None,
+    progress: bool = False,
+    score_cache: ScoreCache | None = None,
+    scorer: ShardedScorer | None = None,
+    token_nll: bool = False,
+    token_store: TokenStore | None = None,
+    dedup: DedupResult | None = None,
+) -> ScoringResult:
+    """Score a column of texts, computing each distinct text only once.
+
+    Distinct texts are scored in checkpoints of ``CHECKPOINT_SIZE`` texts per
+    worker, in-process or across a pool of ``config.num_workers`` processes. When
+    a score cache is given, cached scores are reused and new scores are
+    committed after every checkpoint, so an interrupted run loses at most one
+    checkpoint of work.
+
+    Args:
+        texts (Sequence[Any]): Texts to score
+        reference (ReferenceModel): Reference model and tokenizer
+        config (ScoringConfig | None): Batching settings, read from the
+            environment if None
+        progress (bool): Whether to display a progress bar over texts
+        score_cache (ScoreCache | None): Persistent score store to consult
+        scorer (ShardedScorer | None): Worker pool to score with, kept open
+            after the call. If None, a pool is started for this call when
+            ``config.num_workers`` is greater than one
+        token_nll (bool): Whether to also return the per-token NLL of every
+            row. Cached scores are then not reused
+        token_store (TokenStore | None): Token ids of the distinct texts of
+            ``texts``, read instead of tokenizing the texts again
+        dedup (DedupResult | None): Deduplication of ``texts``, if already
+            computed (e.g. to find their token store)
+
+    Returns:
+        ScoringResult: Per-row scores and deduplication statistics
+    """
+    config = config or default_scoring_config()
+    if token_store is not None and len(token_store) != len(texts):
+        raise ValueError(
+            f"Token store holds {len(token_store)} rows for {len(texts)} texts"
+        )
+
+    if dedup is None:
+        with stage("dedup"):
+            dedup = dedup_texts(texts)
+    elif dedup.n_rows != len(texts):
+        raise ValueError(f"Deduplication covers {dedup.n_rows} of {len(texts)} texts")
+    if token_store is not None and token_store.n_unique != dedup.n_unique:
+        raise ValueError(
+            f"Token store holds {token_store.n_unique} distinct texts for "
+            f"{dedup.n_unique}"
+        )
+    unique_scores = np.full(dedup.n_unique, np.nan, dtype=np.float64)
+    unique_nll: list[np.ndarray | None] = [None] * dedup.n_unique
+    pending = list(range(dedup.n_unique))
+
+    namespace = ScoreNamespace(
+        model_id=reference.model_id,
+        tokenizer_revision=reference.tokenizer_revision,
+        max_length=config.max_length,
+        stride=config.stride or 0,
+    )
+    if score_cache is not None and not token_nll:
+        with stage("score_cache"):
+            cached = score_cache.get_many(namespace, dedup.digests)
+        pending = [i for i in pending if dedup.digests[i] not in cached]
+        for i, digest in enumerate(dedup.digests):
+            if digest in cached:
+                unique_scores[i] = cached[digest]
+
+    n_cached = dedup.n_unique - len(pending)
+    count("texts", dedup.n_rows)
+    count("distinct_texts", dedup.n_unique)
+    count("cached_texts", n_cached)
+    logger.info(
+        f"Scoring {len(pending)} distinct texts out of {dedup.n_rows} rows "
+        f"(dedup ratio {dedup.ratio:.2f}x, {n_cached} cached)"
+    )
+
+    pool: ContextManager[Any] = nullcontext()
+    if scorer is None and config.num_workers > 1:
+        scorer = ShardedScorer(reference.key, config, config.num_workers)
+        pool = scorer
+
+    def score_chunk(
+        chunk: list[int],
+    ) -> tuple[np.ndarray, list[np.ndarray | None] | None]:
+        chunk_texts = [dedup.unique_texts[i] for i in chunk]
+        chunk_ids = (
+            token_store.take_texts(chunk) if token_store is not None else None
+        )
+        if token_nll and scorer is not None:
+            return scorer.score_with_token_nll(chunk_texts, chunk_ids)
+        if token_nll:
+            return score_texts_with_token_nll(
+                chunk_texts,
+                reference.model,
+                reference.tokenizer,
+                config,
+                token_ids=chunk_ids,
+            )
+        if scorer is not None:
+            return scorer.score(chunk_texts, chunk_ids), None
+        scores = score_texts(
+            chunk_texts,
+            reference.model,
+            reference.tokenizer,
+            config,
+            token_ids=chunk_ids,
+        )
+        return scores, None
+
+    checkpoint_size = CHECKPOINT_SIZE * config.num_workers
+    with (
+        pool,
+        tqdm(total=len(pending), desc="Scoring texts", disable=not progress) as bar,
+    ):
+        for start in range(0, len(pending), checkpoint_size):
+            chunk = pending[start : start + checkpoint_size]
+            chunk_scores, chunk_nll = score_chunk(chunk)
+            unique_scores[chunk] = chunk_scores
+            if chunk_nll is not None:
+                for i, nll in zip(chunk, chunk_nll):
+                    unique_nll[i] = nll
+            if score_cache is not None:
+                with stage("score_cache"):
+                    score_cache.put_many(
+                        namespace,
+                        zip([dedup.digests[i] for i in chunk], chunk_scores.tolist()),
+                    )
+            bar.update(len(chunk))
+
+    return ScoringResult(
+        scores=dedup.expand(unique_scores),
+        n_rows=dedup.n_rows,
+        n_unique=dedup.n_unique,
+        n_cached=n_cached,
+        digests=[dedup.digests[i] for i in dedup.inverse],
+        token_nll=[unique_nll[i] for i in dedup.inverse] if token_nll else None,
+    )
+
+
+def score_with_log_likelihood(
+    texts: Sequence[Any],
+    log_likelihood: LogLikelihoodFn,
+    token_nll: bool = False,
+) -> ScoringResult:
+    """Score a column of texts through a model's log-likelihood function.
+
+    Distinct scorable texts are passed to ``log_likelihood`` in batches of
+    ``CHECKPOINT_SIZE``; the model batches its forward passes within each.
+    As with the reference model, texts that cannot be scored get ``inf`` and
+    texts of a single token get ``nan``.
+
+    Args:
+        texts (Sequence[Any]): Texts to score
+        log_likelihood (LogLikelihoodFn): Batched log-likelihood of a
+            ``TextGenerationModel``
+        token_nll (bool): Whether to also return the per-token NLL of every row
+
+    Returns:
+        ScoringResult: Per-row scores and deduplication statistics
+    """
+    with stage("dedup"):
+        dedup = dedup_texts(texts)
+    unique_scores = np.full(dedup.n_unique, np.inf, dtype=np.float64)
+    unique_nll: list[np.ndarray | None] = [None] * dedup.n_unique
+    pending = [
+        i for i, text in enumerate(dedup.unique_texts) if is_scorable(text)
+    ]
+    count("texts", dedup.n_rows)
+    count("distinct_texts", dedup.n_unique)
+    logger.info(
+        f"Scoring {len(pending)} distinct texts out of {dedup.n_rows} rows "
+        f"through the model's log-likelihood (dedup ratio {dedup.ratio:.2f}x)"
+    )
+
+    for start in range(0, len(pending), CHECKPOINT_SIZE):
+        chunk = pending[start : start + CHECKPOINT_SIZE]
+        result = log_likelihood([dedup.unique_texts[i] for i in chunk])
+        unique_scores[chunk] = result.perplexities()
+        for i, log_probs in zip(chunk, result.token_log_probs):
+            unique_nll[i] = -np.asarray(log_probs, dtype=np.float32)
+
+    return ScoringResult(
+        scores=dedup.expand(unique_scores),
+        n_rows=dedup.n_rows,
+        n_unique=dedup.n_unique,
+        digests=[dedup.digests[i] for i in dedup.inverse],
+        token_nll=[unique_nll[i] for i in dedup.inverse] if token_nll else None,
+    )
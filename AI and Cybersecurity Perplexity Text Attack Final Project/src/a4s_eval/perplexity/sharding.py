@@ -0,0 +1,258 @@
+"""Multi-process CPU sharding for perplexity scoring.
+
+A pool of worker processes each loads the reference model once and runs with
+its own share of the CPU cores as torch intra-op threads. Texts are split into
+length-balanced shards that are scored in parallel and merged back in input
+order.
+"""
+
+import heapq
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.sharedctypes import Synchronized
+from types import TracebackType
+from typing import Any, Callable, Sequence
+
+import numpy as np
+import torch
+
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    score_texts_with_token_nll,
+)
+from a4s_eval.perplexity.model_cache import (
+    ReferenceModel,
+    ReferenceModelKey,
+    reference_model_cache,
+)
+
+# Number of shards per worker, so that faster workers pick up remaining work
+SHARDS_PER_WORKER = 4
+
+# State of the current worker process, set by the pool initializer
+_worker_key: ReferenceModelKey | None = None
+_worker_config: ScoringConfig | None = None
+
+
+def make_shards(costs: Sequence[float], n_shards: int) -> list[list[int]]:
+    """Split items into shards of balanced total cost.
+
+    Items are assigned from the most to the least expensive, each to the shard
+    with the lowest total so far (longest-processing-time-first heuristic).
+
+    Args:
+        costs (Sequence[float]): Estimated cost of each item
+        n_shards (int): Number of shards to create
+
+    Returns:
+        list[list[int]]: Non-empty shards of item indices, each in input order
+    """
+    n_shards = max(1, min(n_shards, len(costs)))
+    heap = [(0.0, shard) for shard in range(n_shards)]
+    shards: list[list[int]] = [[] for _ in range(n_shards)]
+    for idx in sorted(range(len(costs)), key=lambda i: costs[i], reverse=True):
+        total, shard = heapq.heappop(heap)
+        shards[shard].append(idx)
+        heapq.heappush(heap, (total + costs[idx], shard))
+    return [sorted(shard) for shard in shards if shard]
+
+
+def text_cost(text: Any) -> float:
+    """Estimate the scoring cost of a text from its length in characters."""
+    return float(len(text)) if isinstance(text, str) else 0.0
+
+
+def threads_per_worker(num_workers: int) -> int:
+    """Share the available CPU cores evenly between workers."""
+    return max(1, len(available_cpus()) // num_workers)
+
+
+def available_cpus() -> list[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _init_worker(
+    key: ReferenceModelKey,
+    config: ScoringConfig,
+    n_threads: int,
+    counter: Synchronized,  # type: ignore[type-arg]
+) -> None:
+    """Pin the worker to its cores, limit torch threads and load the model."""
+    global _worker_key, _worker_config
+
+    with counter.get_lock():
+        worker_index = counter.value
+        counter.value += 1
+
+    cpus = available_cpus()[worker_index * n_threads : (worker_index + 1) * n_threads]
+    if hasattr(os, "sched_setaffinity") and len(cpus) == n_threads:
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(n_threads)
+
+    reference_model_cache.get(key.model_name, dtype=key.dtype, backend=key.backend)
+    _worker_key = key
+    _worker_config = config
+
+
+def _worker_reference() -> ReferenceModel:
+    if _worker_key is None or _worker_config is None:
+        raise RuntimeError("Scoring worker was not initialized")
+    return reference_model_cache.get(
+        _worker_key.model_name, dtype=_worker_key.dtype, backend=_worker_key.backend
+    )
+
+
+def _score_shard_with_token_nll(
+    texts: list[Any], token_ids: list[np.ndarray] | None = None
+) -> tuple[np.ndarray, list[np.ndarray | None]]:
+    reference = _worker_reference()
+    return score_texts_with_token_nll(
+        texts, reference.model, reference.tokenizer, _worker_config, token_ids=token_ids
+    )
+
+
+def _score_shard(
+    texts: list[Any], token_ids: list[np.ndarray] | None = None
+) -> np.ndarray:
+    # Only the scores are sent back to the parent process
+    return _score_shard_with_token_nll(texts, token_ids)[0]
+
+
+def _shard_token_ids(
+    token_ids: Sequence[Sequence[int]] | None, shard: list[int]
+) -> list[np.ndarray] | None:
+    if token_ids is None:
+        return None
+    # Rows are copied out of any memory map to be sent to the worker
+    return [np.array(token_ids[i], dtype=np.int32) for i in shard]
+
+
+class ShardedScorer:
+    """Process pool scoring texts with one reference model per worker.
+
+    The pool is started lazily and kept alive until the scorer is closed, so
+    the model load cost is paid once per worker for all calls to ``score``.
+    ``score`` may be called from several threads, which share the pool.
+    """
+
+    def __init__(
+        self, key: ReferenceModelKey, config: ScoringConfig, num_workers: int
+    ) -> None:
+        self.key = key
+        self.config = config
+        self.num_workers = num_workers
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            return self._start_pool()
+
+    def _start_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forking a process with an initialized torch thread pool can
+            # deadlock, so workers are spawned
+            context = mp.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.num_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    self.key,
+                    self.config,
+                    threads_per_worker(self.num_workers),
+                    context.Value("i", 0),
+                ),
+            )
+        return self._pool
+
+    def _map_shards(
+        self,
+        score_shard: Callable[[list[Any], list[np.ndarray] | None], Any],
+        texts: Sequence[Any],
+        token_ids: Sequence[Sequence[int]] | None,
+    ) -> list[tuple[list[int], Any]]:
+        """Score length-balanced shards of texts in the pool, in input order."""
+        shards = make_shards(
+            [text_cost(text) for text in texts], self.num_workers * SHARDS_PER_WORKER
+        )
+        pool = self._get_pool()
+        futures = [
+            (
+                shard,
+                pool.submit(
+                    score_shard,
+                    [texts[i] for i in shard],
+                    _shard_token_ids(token_ids, shard),
+                ),
+            )
+            for shard in shards
+        ]
+        return [(shard, future.result()) for shard, future in futures]
+
+    def score(
+        self,
+        texts: Sequence[Any],
+        token_ids: Sequence[Sequence[int]] | None = None,
+    ) -> np.ndarray:
+        """Score texts across the worker pool.
+
+        Args:
+            texts (Sequence[Any]): Texts to score
+            token_ids (Sequence[Sequence[int]] | None): Untruncated token ids
+                of each text, tokenized by the workers if None
+
+        Returns:
+            np.ndarray: Perplexity of each text, in input order
+        """
+        scores = np.full(len(texts), np.inf, dtype=np.float64)
+        for shard, shard_scores in self._map_shards(_score_shard, texts, token_ids):
+            scores[shard] = shard_scores
+        return scores
+
+    def score_with_token_nll(
+        self,
+        texts: Sequence[Any],
+        token_ids: Sequence[Sequence[int]] | None = None,
+    ) -> tuple[np.ndarray, list[np.ndarray | None]]:
+        """Score texts across the worker pool, keeping the per-token NLL.
+
+        Args:
+            texts (Sequence[Any]): Texts to score
+            token_ids (Sequence[Sequence[int]] | None): Untruncated token ids
+                of each text, tokenized by the workers if None
+
+        Returns:
+            tuple[np.ndarray, list[np.ndarray | None]]: Perplexity and token
+                NLL of each text, in input order
+        """
+        scores = np.full(len(texts), np.inf, dtype=np.float64)
+        token_nll: list[np.ndarray | None] = [None] * len(texts)
+        for shard, (shard_scores, shard_nll) in self._map_shards(
+            _score_shard_with_token_nll, texts, token_ids
+        ):
+            scores[shard] = shard_scores
+            for i, nll in zip(shard, shard_nll):
+                token_nll[i] = nll
+        return scores, token_nll
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self) -> "ShardedScorer":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
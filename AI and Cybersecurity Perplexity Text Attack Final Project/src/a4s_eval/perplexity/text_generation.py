@@ -0,0 +1,143 @@
+"""``TextGenerationModel`` functions backed by a causal language model.
+
+A run that already holds a causal language model, such as a reference model
+of the cache or the model under evaluation, exposes it to the metrics as a
+``TextGenerationModel``. Its ``log_likelihood`` scores texts with the batched
+scoring engine (length-sorted buckets bounded by ``max_tokens_per_batch``) and
+returns only the log-probs of the tokens, so the perplexity metric can score
+through the model instead of loading a second one.
+"""
+
+from typing import Any, Sequence
+
+import numpy as np
+import torch
+
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    get_pad_token_id,
+    is_scorable,
+    pad_batch,
+    score_texts_with_token_nll,
+)
+from a4s_eval.service.functional_model import (
+    GenerateLogitsFn,
+    GenerateTextFn,
+    LogLikelihoodFn,
+    LogLikelihoods,
+    TextGenerationModel,
+)
+from a4s_eval.typing import Array, TextInput, TextOutput
+from a4s_eval.utils.profiling import stage
+
+
+def causal_lm_log_likelihood(
+    model: Any, tokenizer: Any, config: ScoringConfig | None = None
+) -> LogLikelihoodFn:
+    """Build the batched log-likelihood function of a causal language model.
+
+    Texts that cannot be scored (non-string or blank) get no token log-probs
+    and a log-likelihood of ``-inf``.
+
+    Args:
+        model (Any): Causal language model in eval mode
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Batching and truncation settings,
+            defaults if None
+
+    Returns:
+        LogLikelihoodFn: Scores a batch of texts
+    """
+    config = config or ScoringConfig()
+
+    def log_likelihood(texts: Sequence[str]) -> LogLikelihoods:
+        _, token_nll = score_texts_with_token_nll(texts, model, tokenizer, config)
+        token_log_probs = [
+            np.empty(0) if nll is None else -nll.astype(np.float64)
+            for nll in token_nll
+        ]
+        return LogLikelihoods(
+            sequence_log_probs=np.array(
+                [
+                    lp.sum() if is_scorable(text) else -np.inf
+                    for text, lp in zip(texts, token_log_probs)
+                ],
+                dtype=np.float64,
+            ),
+            token_log_probs=token_log_probs,
+        )
+
+    return log_likelihood
+
+
+def causal_lm_logits(model: Any, tokenizer: Any) -> GenerateLogitsFn:
+    """Build a function returning the next-token logits after each text."""
+
+    def generate_logits(text_input: TextInput) -> Array:
+        texts = [text_input] if isinstance(text_input, str) else list(text_input)
+        with stage("tokenize"):
+            token_ids = tokenizer(texts)["input_ids"]
+        input_ids, attention_mask = pad_batch(token_ids, get_pad_token_id(tokenizer))
+        with torch.no_grad(), stage("forward"):
+            logits = model(input_ids=input_ids, attention_mask=attention_mask).logits
+        # Logits at the last real (right-padded) position of every text
+        last = attention_mask.sum(dim=1) - 1
+        next_logits = logits[torch.arange(len(texts)), last]
+        return next_logits[0] if isinstance(text_input, str) else next_logits
+
+    return generate_logits
+
+
+def causal_lm_generate(model: Any, tokenizer: Any) -> GenerateTextFn:
+    """Build a greedy text generation function.
+
+    Raises:
+        NotImplementedError: When called, if the model cannot generate (the
+            ONNX backend only computes logits)
+    """
+
+    def generate_text(text_input: TextInput, **kwargs: Any) -> TextOutput:
+        if not hasattr(model, "generate"):
+            raise NotImplementedError(f"{type(model).__name__} cannot generate text")
+        texts = [text_input] if isinstance(text_input, str) else list(text_input)
+        outputs = []
+        for text in texts:
+            encoding = tokenizer(text, return_tensors="pt")
+            with torch.no_grad():
+                ids = model.generate(
+                    **encoding,
+                    max_new_tokens=kwargs.get("max_new_tokens", 20),
+                    do_sample=False,
+                    pad_token_id=get_pad_token_id(tokenizer),
+                )
+            outputs.append(
+                tokenizer.decode(
+                    ids[0, encoding["input_ids"].shape[1] :],
+                    skip_special_tokens=True,
+                )
+            )
+        return outputs[0] if isinstance(text_input, str) else outputs
+
+    return generate_text
+
+
+def causal_lm_model(
+    model: Any, tokenizer: Any, config: ScoringConfig | None = None
+) -> TextGenerationModel:
+    """Expose a causal language model as a ``TextGenerationModel``.
+
+    Args:
+        model (Any): Causal language model in eval mode, such as the ``model``
+            of a ``ReferenceModel``
+        tokenizer (Any): Tokenizer matching ``model``
+        config (ScoringConfig | None): Batching and truncation settings of
+            ``log_likelihood``, defaults if None
+
+    Returns:
+        TextGenerationModel: Generation, logits and log-likelihood functions
+    """
+    return TextGenerationModel(
+        generate_text=causal_lm_generate(model, tokenizer),
+        generate_logits=causal_lm_logits(model, tokenizer),
+        log_likelihood=causal_lm_log_likelihood(model, tokenizer, config),
+    )
@@ -0,0 +1,174 @@
+"""Vectorized statistics over stored per-token negative log-likelihoods.
+
+The token NLL of all rows is held as one flat array of values and the offsets
+delimiting each row, the layout of an Arrow list column. Every statistic is
+computed for all rows at once with segment sums over the flat array, without
+running the model again or looping over rows in Python.
+
+Index ``j`` of a row holds the NLL of token ``j + 1`` given tokens ``0..j``:
+the first token has no prediction and no entry.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+import pyarrow as pa
+
+
+@dataclass(frozen=True)
+class TokenNLL:
+    """Per-token NLL of a column of rows.
+
+    Attributes:
+        values (np.ndarray): NLL of all tokens of all rows, concatenated.
+        offsets (np.ndarray): Start of each row in ``values``, followed by the
+            end of the last row.
+        valid (np.ndarray): Whether each row was scored; rows that were not
+            have no tokens.
+    """
+
+    values: np.ndarray
+    offsets: np.ndarray
+    valid: np.ndarray
+
+    @classmethod
+    def from_arrow(cls, column: pa.Array | pa.ChunkedArray) -> "TokenNLL":
+        """Read a list column such as the ``token_nll`` column of a measures file."""
+        if isinstance(column, pa.ChunkedArray):
+            column = column.combine_chunks()
+        offsets = column.offsets.to_numpy().astype(np.int64)
+        values = column.values.to_numpy()[offsets[0] : offsets[-1]]
+        return cls(
+            values=values.astype(np.float32),
+            offsets=offsets - offsets[0],
+            valid=column.is_valid().to_numpy(zero_copy_only=False),
+        )
+
+    @classmethod
+    def from_arrays(cls, token_nll: Sequence[np.ndarray | None]) -> "TokenNLL":
+        """Pack per-row arrays, such as ``ScoringResult.token_nll``."""
+        lengths = [0 if nll is None else len(nll) for nll in token_nll]
+        offsets = np.zeros(len(token_nll) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        present = [nll for nll in token_nll if nll is not None]
+        return cls(
+            values=(
+                np.concatenate(present).astype(np.float32)
+                if present
+                else np.empty(0, dtype=np.float32)
+            ),
+            offsets=offsets,
+            valid=np.array([nll is not None for nll in token_nll], dtype=bool),
+        )
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Number of scored tokens of each row."""
+        return np.diff(self.offsets)
+
+    def _row_of_values(self) -> np.ndarray:
+        return np.repeat(np.arange(self.n_rows), self.lengths)
+
+    def _cumsum(self) -> np.ndarray:
+        cumsum = np.zeros(len(self.values) + 1, dtype=np.float64)
+        np.cumsum(self.values, dtype=np.float64, out=cumsum[1:])
+        return cumsum
+
+    def sum(self) -> np.ndarray:
+        """Total NLL of each row."""
+        cumsum = self._cumsum()
+        return cumsum[self.offsets[1:]] - cumsum[self.offsets[:-1]]
+
+    def mean(self) -> np.ndarray:
+        """Mean token NLL of each row (nan for rows without tokens)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.sum() / self.lengths
+
+    def perplexity(self) -> np.ndarray:
+        """Perplexity of each row, ``inf`` for rows that were not scored.
+
+        Rows of a single token were scored but have no prediction target and
+        give ``nan``, as in the scoring engine.
+        """
+        scores = np.exp(self.mean())
+        scores[~self.valid] = np.inf
+        return scores
+
+    def _first_of_rows(self, order: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # ``order`` groups values by row, so each row's first entry is at its
+        # offset; only rows with tokens have one
+        rows = np.flatnonzero(self.lengths)
+        return rows, order[self.offsets[rows]]
+
+    def max(self) -> np.ndarray:
+        """Highest token NLL (maximum surprise) of each row, nan if empty."""
+        result = np.full(self.n_rows, np.nan)
+        order = np.lexsort((-self.values, self._row_of_values()))
+        rows, first = self._first_of_rows(order)
+        result[rows] = self.values[first]
+        return result
+
+    def argmax(self) -> np.ndarray:
+        """Index of the most surprising token of each row, -1 if empty.
+
+        The index is that of the token in the row, so it is one more than the
+        index of its NLL.
+        """
+        result = np.full(self.n_rows, -1, dtype=np.int64)
+        order = np.lexsort((-self.values, self._row_of_values()))
+        rows, first = self._first_of_rows(order)
+        result[rows] = first - self.offsets[rows] + 1
+        return result
+
+    def at(self, token_positions: Sequence[int] | np.ndarray) -> np.ndarray:
+        """NLL of one token per row, such as the first token of a swapped word.
+
+        Args:
+            token_positions (Sequence[int] | np.ndarray): Index of a token in
+                each row
+
+        Returns:
+            np.ndarray: NLL of each selected token, nan where the position has
+                no entry (the first token, or beyond the row)
+        """
+        positions = np.asarray(token_positions, dtype=np.int64) - 1
+        present = (positions >= 0) & (positions < self.lengths)
+        result = np.full(self.n_rows, np.nan)
+        result[present] = self.values[self.offsets[:-1][present] + positions[present]]
+        return result
+
+    def windowed_perplexity(self, window: int) -> np.ndarray:
+        """Highest perplexity over windows of ``window`` consecutive tokens.
+
+        Locates the least fluent passage of each row. Rows shorter than the
+        window have a single window covering the whole row.
+
+        Args:
+            window (int): Number of tokens per window
+
+        Returns:
+            np.ndarray: Perplexity of the worst window of each row, nan if the
+                row has no tokens
+        """
+        if window < 1:
+            raise ValueError(f"window must be positive, got {window}")
+        cumsum = self._cumsum()
+        starts = np.arange(len(self.values))
+        rows = self._row_of_values()
+        full = starts + window <= self.offsets[1:][rows]
+
+        worst = np.full(self.n_rows, -np.inf)
+        np.maximum.at(
+            worst,
+            rows[full],
+            (cumsum[starts[full] + window] - cumsum[starts[full]]) / window,
+        )
+        short = self.lengths < window
+        worst[short] = self.mean()[short]
+        worst[self.lengths == 0] = np.nan
+        return np.exp(worst)
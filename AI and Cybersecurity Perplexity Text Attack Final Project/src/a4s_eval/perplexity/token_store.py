@@ -0,0 +1,194 @@
+"""Pre-tokenized, memory-mapped token store for dataset columns.
+
+Tokenizing a dataset column costs the same on every run. The token ids of a
+column are computed once with batched calls to the fast tokenizer and stored
+under ``CACHE_DIR/tokens`` as three flat arrays: the concatenated, untruncated
+token ids of every distinct text, the offsets delimiting each distinct text,
+and the index of the text of every row. A text repeated across rows is stored
+once. A store is keyed by the tokenizer fingerprint and a digest of the
+deduplicated column (the digests of its distinct texts and its row index), so
+it is reused by any later run on the same data and rebuilt when either
+changes. The digests are those the scoring already computes, so finding the
+store does not hash the texts again.
+
+The arrays are opened memory-mapped and the token ids of a row are a view into
+them, read without copying. Truncation to the model context is a slice of
+that view.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Any, Sequence
+
+import numpy as np
+
+from a4s_eval.perplexity.dedup import DedupResult
+from a4s_eval.perplexity.engine import is_scorable
+from a4s_eval.perplexity.model_cache import ReferenceModel
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.utils.profiling import stage
+
+logger = get_logger()
+
+# Directory name for token stores, next to the dataset and model caches
+TOKEN_DIR = "tokens"
+INPUT_IDS_FILE = "input_ids.npy"
+OFFSETS_FILE = "offsets.npy"
+ROWS_FILE = "rows.npy"
+META_FILE = "meta.json"
+
+# Number of texts per call to the tokenizer
+TOKENIZE_BATCH_ROWS = 1024
+
+
+def column_digest(dedup: DedupResult) -> str:
+    """Return a digest identifying a column from its deduplication."""
+    digest = hashlib.blake2b(digest_size=16)
+    for text_digest in dedup.digests:
+        digest.update(text_digest.encode("utf-8"))
+        digest.update(b"\n")
+    digest.update(dedup.inverse.astype(np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def token_store_dir(tokenizer_revision: str, data_digest: str) -> str:
+    return f"{env.CACHE_DIR}/{TOKEN_DIR}/{tokenizer_revision[:16]}-{data_digest}"
+
+
+def tokenize_batched(
+    texts: Sequence[Any], tokenizer: Any, batch_rows: int = TOKENIZE_BATCH_ROWS
+) -> list[np.ndarray]:
+    """Tokenize texts without truncation, ``batch_rows`` texts per call.
+
+    Values that cannot be scored get no tokens.
+
+    Args:
+        texts (Sequence[Any]): Texts to tokenize
+        tokenizer (Any): Tokenizer, preferably a fast one
+        batch_rows (int): Number of texts per call to the tokenizer
+
+    Returns:
+        list[np.ndarray]: int32 token ids of each text
+    """
+    token_ids = [np.empty(0, dtype=np.int32)] * len(texts)
+    valid = [i for i, text in enumerate(texts) if is_scorable(text)]
+    for start in range(0, len(valid), batch_rows):
+        batch = valid[start : start + batch_rows]
+        encodings = tokenizer(
+            [texts[i] for i in batch], return_attention_mask=False, verbose=False
+        )["input_ids"]
+        for i, ids in zip(batch, encodings):
+            token_ids[i] = np.asarray(ids, dtype=np.int32)
+    return token_ids
+
+
+class TokenStore:
+    """Memory-mapped token ids of the rows of a dataset column.
+
+    Distinct texts are numbered in order of first occurrence, like the
+    ``unique_texts`` of the ``DedupResult`` the store was built from.
+
+    Args:
+        path (str): Directory written by ``build_token_store``
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.input_ids = np.load(os.path.join(path, INPUT_IDS_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+        self.rows = np.load(os.path.join(path, ROWS_FILE), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def n_unique(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> np.ndarray:
+        """Token ids of a row, as a view into the memory-mapped array."""
+        return self.text_ids(self.rows[row])
+
+    def text_ids(self, text: int) -> np.ndarray:
+        """Token ids of a distinct text, as a view into the memory-mapped array."""
+        return self.input_ids[self.offsets[text] : self.offsets[text + 1]]
+
+    def take(self, rows: Sequence[int]) -> list[np.ndarray]:
+        return [self[row] for row in rows]
+
+    def take_texts(self, texts: Sequence[int]) -> list[np.ndarray]:
+        return [self.text_ids(text) for text in texts]
+
+
+def build_token_store(
+    dedup: DedupResult, tokenizer: Any, path: str
+) -> TokenStore:
+    """Tokenize the distinct texts of a column and write its token store.
+
+    The files are written to a temporary directory that is renamed once
+    complete, so readers never see a partial store.
+
+    Args:
+        dedup (DedupResult): Deduplicated texts of the column
+        tokenizer (Any): Tokenizer of the reference model
+        path (str): Directory of the store
+
+    Returns:
+        TokenStore: The new store
+    """
+    with stage("tokenize"):
+        unique_ids = tokenize_batched(dedup.unique_texts, tokenizer)
+    offsets = np.zeros(dedup.n_unique + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in unique_ids], out=offsets[1:])
+    input_ids = (
+        np.concatenate(unique_ids) if unique_ids else np.empty(0, dtype=np.int32)
+    )
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path))
+    try:
+        np.save(os.path.join(tmp_dir, INPUT_IDS_FILE), input_ids)
+        np.save(os.path.join(tmp_dir, OFFSETS_FILE), offsets)
+        np.save(os.path.join(tmp_dir, ROWS_FILE), dedup.inverse.astype(np.int64))
+        with open(os.path.join(tmp_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "tokenizer": getattr(tokenizer, "name_or_path", ""),
+                    "n_rows": dedup.n_rows,
+                    "n_unique": dedup.n_unique,
+                    "n_tokens": int(offsets[-1]),
+                },
+                f,
+            )
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Another process finished the same store first
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    logger.info(f"Built token store {path} ({int(offsets[-1])} tokens)")
+    return TokenStore(path)
+
+
+def ensure_token_store(
+    dedup: DedupResult, reference: ReferenceModel
+) -> TokenStore:
+    """Return the token store of a column, building it on first use.
+
+    Args:
+        dedup (DedupResult): Deduplicated texts of the column
+        reference (ReferenceModel): Reference model whose tokenizer is used
+
+    Returns:
+        TokenStore: Store whose distinct text ``i`` holds the token ids of
+            ``dedup.unique_texts[i]`` and whose row ``i`` those of row ``i``
+    """
+    path = token_store_dir(reference.tokenizer_revision, column_digest(dedup))
+    if os.path.isdir(path):
+        return TokenStore(path)
+    return build_token_store(dedup, reference.tokenizer, path)
@@ -1,5 +1,7 @@
 from dataclasses import dataclass
-from typing import Any, Protocol
+from typing import Any, Protocol, Sequence
+
+import numpy as np
 
 from a4s_eval.typing import Array, TextInput, TextOutput
 
@@ -36,6 +38,49 @@ class GenerateLogitsFn(Protocol):
     def __call__(self, text_input: TextInput) -> Array: ...
 
 
+@dataclass(frozen=True)
+class LogLikelihoods:
+    """Log-likelihood of a batch of texts under a language model.
+
+    Index ``j`` of the token log-probs of a text holds the log-prob of token
+    ``j + 1`` given tokens ``0..j``: the first token has no prediction and no
+    entry.
+
+    Attributes:
+        sequence_log_probs (np.ndarray): Sum of the token log-probs of each
+            text.
+        token_log_probs (list[np.ndarray]): Log-prob of each token of each
+            text after the first.
+    """
+
+    sequence_log_probs: np.ndarray
+    token_log_probs: list[np.ndarray]
+
+    @property
+    def n_tokens(self) -> np.ndarray:
+        """Number of scored tokens of each text."""
+        return np.array([len(lp) for lp in self.token_log_probs], dtype=np.int64)
+
+    def perplexities(self) -> np.ndarray:
+        """Perplexity of each text, nan for texts without a scored token."""
+        n_tokens = self.n_tokens
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(
+                n_tokens > 0,
+                np.exp(-np.asarray(self.sequence_log_probs) / n_tokens),
+                np.nan,
+            )
+
+
+class LogLikelihoodFn(Protocol):
+    """Return the log-likelihood of every text of a batch.
+
+    Only log-probs leave the model, rather than ``[seq, vocab]`` logits.
+    """
+
+    def __call__(self, texts: Sequence[str]) -> LogLikelihoods: ...
+
+
 @dataclass(frozen=True)
 class TabularClassificationModel:
     predict_class: PredictClassFn
@@ -53,3 +98,4 @@ class TabularRegressionModel:
 class TextGenerationModel:
     generate_text: GenerateTextFn
     generate_logits: GenerateLogitsFn | None = None
+    log_likelihood: LogLikelihoodFn | None = None
@@ -0,0 +1,146 @@
+"""Local load generation against the scoring service.
+
+The service runs in a background thread with uvicorn on a free local port,
+and a closed-loop load generator keeps ``concurrency`` requests in flight,
+each client sending its next request as soon as the previous one returns.
+Each run reports the throughput in requests per second, the p50/p99 latency
+seen by the clients and the mean size of the micro-batches the requests were
+scored in.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Iterator, Sequence
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+
+# Time allowed for the service to start, including loading the model
+STARTUP_TIMEOUT_SECONDS = 300.0
+
+
+@dataclass
+class LoadResult:
+    """Measurements of one load level.
+
+    Attributes:
+        concurrency (int): Number of requests kept in flight.
+        n_requests (int): Number of requests sent.
+        n_errors (int): Number of requests that failed.
+        seconds (float): Wall time of the run.
+        requests_per_second (float): Successful requests per second.
+        latency_p50_ms (float): Median latency seen by the clients.
+        latency_p99_ms (float): 99th percentile latency seen by the clients.
+        mean_batch_size (float): Mean micro-batch size of the requests.
+    """
+
+    concurrency: int
+    n_requests: int
+    n_errors: int
+    seconds: float
+    requests_per_second: float
+    latency_p50_ms: float
+    latency_p99_ms: float
+    mean_batch_size: float
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@contextmanager
+def serve(app: FastAPI, host: str = "127.0.0.1", port: int = 0) -> Iterator[str]:
+    """Run an application with uvicorn in a background thread.
+
+    Args:
+        app (FastAPI): Application to serve
+        host (str): Interface to listen on
+        port (int): Port to listen on, a free one if 0
+
+    Returns:
+        Iterator[str]: Base URL of the running service
+
+    Raises:
+        RuntimeError: If the service does not start in time
+    """
+    server = uvicorn.Server(
+        uvicorn.Config(app, host=host, port=port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, name="scoring-service", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            server.should_exit = True
+            raise RuntimeError("Scoring service did not start")
+        time.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+async def _generate(
+    url: str, texts: Sequence[str], concurrency: int, n_requests: int
+) -> LoadResult:
+    requests = itertools.islice(itertools.cycle(texts), n_requests)
+    latencies: list[float] = []
+    batch_sizes: list[int] = []
+    errors = 0
+
+    async def client(http: httpx.AsyncClient) -> None:
+        nonlocal errors
+        for text in requests:
+            start = time.perf_counter()
+            try:
+                response = await http.post("/score", json={"text": text})
+                response.raise_for_status()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            batch_sizes.append(response.json()["batch_size"])
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=None) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        seconds = time.perf_counter() - start
+
+    p50, p99 = (
+        np.percentile(latencies, [50, 99]) * 1000 if latencies else (np.nan, np.nan)
+    )
+    return LoadResult(
+        concurrency=concurrency,
+        n_requests=n_requests,
+        n_errors=errors,
+        seconds=seconds,
+        requests_per_second=len(latencies) / seconds,
+        latency_p50_ms=float(p50),
+        latency_p99_ms=float(p99),
+        mean_batch_size=float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+    )
+
+
+def run_load(
+    url: str, texts: Sequence[str], concurrency: int, n_requests: int
+) -> LoadResult:
+    """Send ``n_requests`` requests, ``concurrency`` at a time, to a service.
+
+    Args:
+        url (str): Base URL of the service
+        texts (Sequence[str]): Texts to score, cycled through
+        concurrency (int): Number of requests kept in flight
+        n_requests (int): Total number of requests
+
+    Returns:
+        LoadResult: Throughput and latency of the run
+    """
+    return asyncio.run(_generate(url, texts, concurrency, n_requests))
@@ -0,0 +1,186 @@
+"""Dynamic micro-batching of concurrent single-text scoring requests.
+
+A model forward pass over a padded batch costs little more than over a single
+text, so scoring concurrent requests one by one wastes most of the model's
+throughput. The batcher queues requests and scores them together: a batch
+starts with the oldest waiting request and closes when it holds
+``max_batch_size`` texts or ``max_wait_seconds`` after that request arrived,
+whichever comes first. Requests arriving while a batch is being scored wait
+for the next one, so batches grow with the load and a lone request waits at
+most ``max_wait_seconds``.
+
+Batches are scored one at a time in a dedicated thread, so the event loop
+keeps accepting requests while the model runs.
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+
+BatchScorer = Callable[[list[str]], Sequence[float]]
+
+
+@dataclass
+class ScoredText:
+    """Score of one request and how it was computed.
+
+    Attributes:
+        score (float): Score of the text.
+        batch_size (int): Number of texts scored in the same batch.
+        queue_seconds (float): Time between the request and its batch start.
+        batch_seconds (float): Time spent scoring the batch.
+    """
+
+    score: float
+    batch_size: int
+    queue_seconds: float
+    batch_seconds: float
+
+
+@dataclass
+class BatcherStats:
+    """Counters of a batcher since it started."""
+
+    requests: int = 0
+    batches: int = 0
+    batch_sizes: dict[int, int] = field(default_factory=dict)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.requests / self.batches if self.batches else 0.0
+
+
+@dataclass
+class _Request:
+    text: str
+    arrival: float
+    future: asyncio.Future
+
+
+class MicroBatcher:
+    """Coalesces concurrent ``submit`` calls into batches of a scoring function.
+
+    Args:
+        score_batch (BatchScorer): Scores a list of texts, one score per text
+        max_batch_size (int): Maximum number of texts per batch
+        max_wait_seconds (float): Maximum time a request waits for its batch
+            to fill up
+    """
+
+    def __init__(
+        self,
+        score_batch: BatchScorer,
+        max_batch_size: int = 32,
+        max_wait_seconds: float = 0.005,
+    ) -> None:
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got {max_batch_size}")
+        self.score_batch = score_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.stats = BatcherStats()
+        self._queue: asyncio.Queue[_Request] | None = None
+        self._task: asyncio.Task | None = None
+        self._executor: ThreadPoolExecutor | None = None
+
+    async def start(self) -> None:
+        """Start batching on the running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="micro-batcher"
+        )
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop batching; requests still waiting fail with ``CancelledError``."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            self._queue.get_nowait().future.cancel()
+        self._executor.shutdown(wait=True)
+        self._task = self._queue = self._executor = None
+
+    async def submit(self, text: str) -> ScoredText:
+        """Score one text as part of the next batch.
+
+        Raises:
+            RuntimeError: If the batcher is not started
+            Exception: Whatever the scoring function raised for the batch
+        """
+        if self._task is None:
+            raise RuntimeError("MicroBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Request(text, time.perf_counter(), future))
+        return await future
+
+    async def _next_batch(self) -> list[_Request]:
+        batch = [await self._queue.get()]
+        deadline = batch[0].arrival + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                # Take what is already queued, without waiting any longer
+                while len(batch) < self.max_batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                break
+            get = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait({get}, timeout=timeout)
+            if not get.done():
+                get.cancel()
+                try:
+                    # The request may have been taken just before the cancel
+                    await get
+                except asyncio.CancelledError:
+                    break
+            batch.append(get.result())
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Requests whose client went away are not scored
+            batch = [request for request in batch if not request.future.done()]
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                scores = await loop.run_in_executor(
+                    self._executor, self.score_batch, [r.text for r in batch]
+                )
+            except Exception as e:
+                logger.error(f"Scoring a batch of {len(batch)} texts failed: {e!r}")
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+                continue
+            seconds = time.perf_counter() - start
+
+            self.stats.requests += len(batch)
+            self.stats.batches += 1
+            self.stats.batch_sizes[len(batch)] = (
+                self.stats.batch_sizes.get(len(batch), 0) + 1
+            )
+            for request, score in zip(batch, scores):
+                if not request.future.done():
+                    request.future.set_result(
+                        ScoredText(
+                            score=float(score),
+                            batch_size=len(batch),
+                            queue_seconds=start - request.arrival,
+                            batch_seconds=seconds,
+                        )
+                    )
@@ -0,0 +1,143 @@
+"""HTTP service scoring texts with the perplexity metric's reference model.
+
+The service serves perplexity as an online filter for adversarial inputs.
+Each request carries one text. Concurrent requests are coalesced into
+micro-batches (see ``a4s_eval.service.micro_batcher``) that are scored with
+the reference model, which is loaded once when the service starts. Run it
+with::
+
+    uvicorn a4s_eval.service.scoring_service:app --port 8080
+
+The batch size and the maximum time a request waits for its batch to fill up
+are read from ``SCORING_MAX_BATCH_SIZE`` and ``SCORING_MAX_WAIT_MS``. Client
+texts are not written to the persistent score cache unless
+``SCORING_SERVICE_SCORE_CACHE`` is set.
+"""
+
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request
+from pydantic import BaseModel
+
+from a4s_eval.service.micro_batcher import BatchScorer, MicroBatcher
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+
+
+class ScoreRequest(BaseModel):
+    text: str
+
+
+class ScoreResponse(BaseModel):
+    """Score of a text, None if it cannot be scored (e.g. it is empty)."""
+
+    score: float | None
+    latency_ms: float
+    queue_ms: float
+    batch_size: int
+
+
+def perplexity_scorer(max_batch_size: int) -> BatchScorer:
+    """Load the reference model and return a function scoring with it.
+
+    A micro-batch is scored in one forward pass when it fits in
+    ``PERPLEXITY_MAX_TOKENS_PER_BATCH`` padded tokens, in-process: the
+    service scores one batch at a time and needs no pool of workers.
+
+    The score cache is off by default: it would store a digest of every text
+    clients send, without a size limit, and commit to SQLite on the request
+    path.
+    """
+    # Imported here, so that an app built with another scorer does not import
+    # torch and transformers
+    from a4s_eval.metrics.model_metrics.perplexity_metric import reference_model
+    from a4s_eval.perplexity.score_cache import get_score_cache
+    from a4s_eval.perplexity.scoring import (
+        compute_perplexities,
+        default_scoring_config,
+    )
+
+    reference = reference_model()
+    score_cache = get_score_cache() if env.SCORING_SERVICE_SCORE_CACHE else None
+    config = replace(
+        default_scoring_config(), batch_size=max_batch_size, num_workers=1
+    )
+
+    def score_batch(texts: list[str]) -> list[float]:
+        result = compute_perplexities(
+            texts, reference, config=config, score_cache=score_cache
+        )
+        return result.scores.tolist()
+
+    return score_batch
+
+
+def create_app(
+    score_batch: BatchScorer | None = None,
+    max_batch_size: int | None = None,
+    max_wait_ms: float | None = None,
+) -> FastAPI:
+    """Build the scoring service.
+
+    Args:
+        score_batch (BatchScorer | None): Scores a list of texts; the
+            perplexity of the reference model, loaded at startup, if None
+        max_batch_size (int | None): Maximum number of texts per batch,
+            ``SCORING_MAX_BATCH_SIZE`` if None
+        max_wait_ms (float | None): Maximum time a request waits for its batch
+            to fill up, ``SCORING_MAX_WAIT_MS`` if None
+
+    Returns:
+        FastAPI: The application
+    """
+    max_batch_size = max_batch_size or env.SCORING_MAX_BATCH_SIZE
+    max_wait_ms = env.SCORING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+        start = time.perf_counter()
+        scorer = score_batch or perplexity_scorer(max_batch_size)
+        logger.info(f"Scoring service ready in {time.perf_counter() - start:.2f}s")
+        batcher = MicroBatcher(scorer, max_batch_size, max_wait_ms / 1000)
+        await batcher.start()
+        app.state.batcher = batcher
+        try:
+            yield
+        finally:
+            await batcher.stop()
+
+    app = FastAPI(title="A4S perplexity scoring", lifespan=lifespan)
+
+    @app.post("/score", response_model=ScoreResponse)
+    async def score(body: ScoreRequest, request: Request) -> ScoreResponse:
+        start = time.perf_counter()
+        scored = await request.app.state.batcher.submit(body.text)
+        return ScoreResponse(
+            score=scored.score if math.isfinite(scored.score) else None,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            queue_ms=scored.queue_seconds * 1000,
+            batch_size=scored.batch_size,
+        )
+
+    @app.get("/health")
+    async def health(request: Request) -> dict:
+        batcher: MicroBatcher = request.app.state.batcher
+        return {
+            "status": "ok",
+            "max_batch_size": batcher.max_batch_size,
+            "max_wait_ms": batcher.max_wait_seconds * 1000,
+            "requests": batcher.stats.requests,
+            "batches": batcher.stats.batches,
+            "mean_batch_size": batcher.stats.mean_batch_size,
+        }
+
+    return app
+
+
+app = create_app()
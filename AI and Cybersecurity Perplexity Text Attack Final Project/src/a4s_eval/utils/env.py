@@ -17,11 +17,66 @@ def handle_bool_var(envvar: str) -> bool:
     return str(envvar).lower() == "true"
 
 
+def check_perplexity_model(backend: str, dtype: str) -> None:
+    """Reject reference model settings that would only fail when it loads.
+
+    Raises:
+        ValueError: If ``backend`` is unknown, or ``dtype`` is 'int8' with
+            another backend than 'onnx'
+    """
+    if backend not in ("torch", "onnx"):
+        raise ValueError(
+            f"PERPLEXITY_BACKEND={backend!r} is not supported, use 'torch' or 'onnx'"
+        )
+    if dtype == "int8" and backend != "onnx":
+        raise ValueError(
+            "PERPLEXITY_DTYPE='int8' requires PERPLEXITY_BACKEND='onnx' "
+            f"(got {backend!r})"
+        )
+
+
 API_URL = os.getenv("API_URL", "http://a4s-api:8000")
 API_PREFIX = os.getenv("API_PREFIX", "/api/v1")
 API_URL_PREFIX = f"{API_URL}{API_PREFIX}"
 CACHE_DIR = os.getenv("CACHE_DIR", "/tmp/cache")
 
+# Perplexity scoring configuration
+PERPLEXITY_BATCH_SIZE = int(os.getenv("PERPLEXITY_BATCH_SIZE", "16"))
+PERPLEXITY_MAX_TOKENS_PER_BATCH = int(
+    os.getenv("PERPLEXITY_MAX_TOKENS_PER_BATCH", "4096")
+)
+# Runtime of the reference model: 'torch' or 'onnx'
+PERPLEXITY_BACKEND = os.getenv("PERPLEXITY_BACKEND", "torch")
+# Weight dtype of the reference model ('int8' quantizes the onnx backend)
+PERPLEXITY_DTYPE = os.getenv("PERPLEXITY_DTYPE", "float32")
+check_perplexity_model(PERPLEXITY_BACKEND, PERPLEXITY_DTYPE)
+# Sliding-window stride for texts longer than the model context (0 truncates)
+PERPLEXITY_STRIDE = int(os.getenv("PERPLEXITY_STRIDE", "0"))
+# Number of scoring processes, each with its own share of the CPU cores
+PERPLEXITY_NUM_WORKERS = int(os.getenv("PERPLEXITY_NUM_WORKERS", "1"))
+# Reuse scores persisted under CACHE_DIR/scores across runs
+PERPLEXITY_SCORE_CACHE = handle_bool_var(os.getenv("PERPLEXITY_SCORE_CACHE", "true"))
+# Reuse token ids of dataset columns persisted under CACHE_DIR/tokens across runs
+PERPLEXITY_TOKEN_STORE = handle_bool_var(os.getenv("PERPLEXITY_TOKEN_STORE", "true"))
+# Store the per-token NLL of every row next to its score in the experiment outputs
+PERPLEXITY_TOKEN_NLL = handle_bool_var(os.getenv("PERPLEXITY_TOKEN_NLL", "false"))
+# Score attacked texts together with their clean originals, sharing the prefix
+PERPLEXITY_PAIRED = handle_bool_var(os.getenv("PERPLEXITY_PAIRED", "false"))
+# Memory budget of the reference model cache, for the estimated size of its
+# models and the process RSS (0 disables eviction)
+REFERENCE_MODEL_CACHE_MAX_RSS_MB = int(
+    os.getenv("REFERENCE_MODEL_CACHE_MAX_RSS_MB", "4096")
+)
+
+# Profiler trace captured for profiled runs: "cprofile", "torch" or "" for none
+PROFILE_TRACE = os.getenv("PROFILE_TRACE", "")
+
+# Number of processes running the adversarial attack in run_attack.py
+ATTACK_NUM_WORKERS = int(os.getenv("ATTACK_NUM_WORKERS", "1"))
+# Local word embedding (GloVe/word2vec text) for the word swap attack; empty
+# uses TextAttack's counter-fitted embedding, downloaded on first use
+ATTACK_EMBEDDING_PATH = os.getenv("ATTACK_EMBEDDING_PATH", "")
+
 REDIS_SSL_CERT_REQS = handle_bool_var(os.getenv("REDIS_SSL_CERT_REQS", "true"))
 
 BROCKER_SSL_CERT_REQS = handle_bool_var(os.getenv("BROCKER_SSL_CERT_REQS", "true"))
@@ -106,3 +161,17 @@ def get_celery_broker_url() -> str:
 
 
 CELERY_BROKER_URL = get_celery_broker_url()
+
+# Rows of the dataset scored by each chunk task of the Celery worker
+WORKER_CHUNK_ROWS = int(os.getenv("WORKER_CHUNK_ROWS", "2048"))
+# Comma-separated metrics whose models each worker process loads at startup
+WORKER_WARM_METRICS = os.getenv("WORKER_WARM_METRICS", "perplexity")
+
+# Maximum number of texts the scoring service scores in one batch
+SCORING_MAX_BATCH_SIZE = int(os.getenv("SCORING_MAX_BATCH_SIZE", "32"))
+# Maximum time in milliseconds a scoring request waits for its batch to fill up
+SCORING_MAX_WAIT_MS = float(os.getenv("SCORING_MAX_WAIT_MS", "5"))
+# Whether the scoring service reads and writes the persistent score cache
+SCORING_SERVICE_SCORE_CACHE = handle_bool_var(
+    os.getenv("SCORING_SERVICE_SCORE_CACHE", "false")
+)
@@ -0,0 +1,34 @@
+"""Process memory utilities for A4S evaluation.
+
+This module provides helpers to read the resident set size (RSS) of the current
+process, used to enforce memory budgets and to report memory usage.
+"""
+
+import os
+import resource
+import sys
+
+
+def current_rss_bytes() -> int | None:
+    """Return the current resident set size of the process in bytes.
+
+    Returns:
+        int | None: Current RSS, or None if it cannot be read on this platform
+    """
+    try:
+        with open("/proc/self/statm") as f_in:
+            resident_pages = int(f_in.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def peak_rss_bytes() -> int:
+    """Return the peak resident set size of the process in bytes.
+
+    Returns:
+        int: Highest RSS reached by the process so far
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
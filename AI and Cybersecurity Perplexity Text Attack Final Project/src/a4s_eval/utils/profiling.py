@@ -0,0 +1,213 @@
+"""Stage timers, counters and opt-in profiler traces for runs.
+
+A run is opened with ``profile_run``. While it is active, code in the same
+context records the time spent in named stages with ``with stage("forward"):``
+and counts items with ``count("texts", n)``. Both are no-ops outside a run, so
+library code can be instrumented unconditionally. Stages may nest, so their
+times can overlap.
+
+Open runs are held in a context variable: runs opened concurrently in
+different threads (e.g. metrics of the evaluation engine) do not record each
+other's stages, while threads started with ``contextvars.copy_context`` (e.g.
+pipeline stages) record into the runs of the context that started them.
+
+When the run ends, its summary (wall time, seconds and calls per stage,
+counters) is logged on the ``a4s_eval.profiling`` logger, which formats it
+with the JSON formatter.
+
+Set ``PROFILE_TRACE`` to ``cprofile`` or ``torch`` to also capture a profiler
+trace of the run under ``CACHE_DIR/profiles``: a ``.prof`` file for
+``pstats``/snakeviz, or a Chrome trace (``chrome://tracing``, Perfetto) in
+which the stages appear as labelled ranges.
+"""
+
+import cProfile
+import datetime as dt
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Iterator
+
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+
+logger = get_logger()
+summary_logger = logger.getChild("profiling")
+
+# Directory name for profiler traces, next to the other caches
+PROFILE_DIR = "profiles"
+
+# Accepted values of PROFILE_TRACE, besides "" which disables traces
+TRACE_MODES = ("cprofile", "torch")
+
+
+@dataclass
+class StageStats:
+    """Accumulated time and number of calls of a stage."""
+
+    seconds: float = 0.0
+    calls: int = 0
+
+
+@dataclass
+class Profiler:
+    """Stage times and counters of one run.
+
+    Attributes:
+        name (str): Name of the run in its summary and trace file.
+        stages (dict[str, StageStats]): Time and calls of each stage, in order
+            of first use.
+        counters (dict[str, int]): Value of each counter.
+        trace_path (str | None): File of the profiler trace, if one is taken.
+    """
+
+    name: str
+    stages: dict[str, StageStats] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+    trace_path: str | None = None
+    started: float = field(default_factory=time.perf_counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, stage_name: str, seconds: float) -> None:
+        with self._lock:
+            stats = self.stages.setdefault(stage_name, StageStats())
+            stats.seconds += seconds
+            stats.calls += 1
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> dict[str, Any]:
+        """Return the wall time, stages and counters as a JSON-ready dict."""
+        with self._lock:
+            return {
+                "run": self.name,
+                "wall_seconds": round(time.perf_counter() - self.started, 6),
+                "stages": {
+                    name: {"seconds": round(stats.seconds, 6), "calls": stats.calls}
+                    for name, stats in self.stages.items()
+                },
+                "counters": dict(self.counters),
+                "trace": self.trace_path,
+            }
+
+
+# Runs open in the current context, outermost first; stages are recorded into
+# all of them
+_active: ContextVar[tuple[Profiler, ...]] = ContextVar("profile_runs", default=())
+# Whether a run of the current context takes a torch profiler trace
+_torch_trace: ContextVar[bool] = ContextVar("profile_torch_trace", default=False)
+# Held by the run taking a torch trace: the torch profiler is process-wide
+_torch_trace_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a stage of every active run (no-op when no run is active).
+
+    Args:
+        name (str): Name of the stage, e.g. 'tokenize' or 'forward'
+    """
+    active = _active.get()
+    if not active:
+        yield
+        return
+    with ExitStack() as labels:
+        if _torch_trace.get():
+            import torch
+
+            labels.enter_context(torch.profiler.record_function(name))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            for profiler in active:
+                profiler.add(name, elapsed)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add ``n`` to a counter of every active run (no-op when none is active)."""
+    for profiler in _active.get():
+        profiler.count(name, n)
+
+
+def trace_file(name: str, mode: str) -> str:
+    timestamp = dt.datetime.now().strftime("%Y%m%dT%H%M%S")
+    suffix = ".prof" if mode == "cprofile" else ".json"
+    return f"{env.CACHE_DIR}/{PROFILE_DIR}/{name}-{timestamp}{suffix}"
+
+
+@contextmanager
+def profile_run(name: str, trace: str | None = None) -> Iterator[Profiler]:
+    """Collect the stages and counters of a run and log their summary.
+
+    Only the outermost run of a context takes a trace, since profilers cannot
+    be nested. A torch trace is skipped, with a warning, while another thread
+    takes one.
+
+    Args:
+        name (str): Name of the run, e.g. the experiment script
+        trace (str | None): 'cprofile' or 'torch' to capture a profiler trace,
+            '' for none, or None to read ``PROFILE_TRACE``
+
+    Yields:
+        Profiler: The stage times and counters of the run
+
+    Raises:
+        ValueError: If ``trace`` is not a known trace mode
+    """
+    trace = env.PROFILE_TRACE if trace is None else trace
+    if trace and trace not in TRACE_MODES:
+        raise ValueError(f"Unknown trace mode {trace!r}, expected one of {TRACE_MODES}")
+    if _active.get():
+        trace = ""
+    if trace == "torch" and not _torch_trace_lock.acquire(blocking=False):
+        logger.warning(f"Run {name} takes no torch trace: another run takes one")
+        trace = ""
+
+    profiler = Profiler(name)
+    cprofiler = None
+    torch_profiler = None
+    if trace:
+        profiler.trace_path = trace_file(name, trace)
+        os.makedirs(os.path.dirname(profiler.trace_path), exist_ok=True)
+    if trace == "cprofile":
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+    elif trace == "torch":
+        import torch
+
+        torch_profiler = torch.profiler.profile(
+            activities=[torch.profiler.ProfilerActivity.CPU]
+        )
+        try:
+            torch_profiler.__enter__()
+        except BaseException:
+            _torch_trace_lock.release()
+            raise
+        torch_token = _torch_trace.set(True)
+
+    token = _active.set((*_active.get(), profiler))
+    try:
+        yield profiler
+    finally:
+        _active.reset(token)
+        if cprofiler is not None:
+            cprofiler.disable()
+            cprofiler.dump_stats(profiler.trace_path)
+        if torch_profiler is not None:
+            _torch_trace.reset(torch_token)
+            try:
+                torch_profiler.__exit__(None, None, None)
+                torch_profiler.export_chrome_trace(profiler.trace_path)
+            finally:
+                _torch_trace_lock.release()
+        summary = profiler.summary()
+        summary_logger.info(
+            f"Profile of {name}: {summary['wall_seconds']:.2f}s", extra=summary
+        )
@@ -0,0 +1,43 @@
+"""Celery application of the evaluation worker.
+
+The broker and result backend are read from ``CELERY_BROKER_URL`` and
+``REDIS_BACKEND_URL`` (see ``a4s_eval.utils.env``). Start a worker on each
+node with::
+
+    celery -A a4s_eval.worker.celery_app worker --loglevel=info
+
+Tests run the tasks eagerly, or with the in-memory broker and backend, by
+updating ``celery_app.conf``.
+"""
+
+import ssl
+
+from celery import Celery
+
+from a4s_eval.utils import env
+
+celery_app = Celery(
+    "a4s_eval",
+    broker=env.CELERY_BROKER_URL,
+    backend=env.REDIS_BACKEND_URL,
+    include=["a4s_eval.worker.tasks"],
+)
+
+celery_app.conf.update(
+    task_serializer="json",
+    result_serializer="json",
+    accept_content=["json"],
+    # Chunk tasks are long: each worker process reserves one at a time, and
+    # acknowledges it once done so that the chunk of a lost worker is
+    # redelivered to another one
+    worker_prefetch_multiplier=1,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+)
+
+if env.MQ_USE_SSL:
+    celery_app.conf.broker_use_ssl = {
+        "cert_reqs": (
+            ssl.CERT_REQUIRED if env.BROCKER_SSL_CERT_REQS else ssl.CERT_NONE
+        )
+    }
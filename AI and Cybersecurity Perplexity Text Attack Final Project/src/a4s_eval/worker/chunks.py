@@ -0,0 +1,284 @@
+"""Evaluation jobs split into chunks of rows, and the reduction of their results.
+
+A job names a parquet file rather than carrying its rows: each chunk task
+reads only its own rows, from storage shared by the worker nodes, and runs the
+job's metrics on them with the ``EvaluationEngine``. Chunk results travel
+through the Celery result backend as JSON and are reduced into one result per
+metric, following the reduction the metric was registered with:
+
+* ``concat``: per-sample measures, such as perplexity, are joined in row order.
+* ``mean``: per-dataset measures, such as accuracy, are averaged weighted by
+  the number of rows of each chunk.
+
+JSON has no values for non-finite scores, which tell texts that cannot be
+scored (``inf``) from texts of a single token (``nan``), so chunk results
+carry them as the strings "inf", "-inf" and "nan".
+"""
+
+import math
+import time
+import uuid
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pydantic import BaseModel, Field
+
+from a4s_eval.data_model.evaluation import (
+    DataShape,
+    Dataset,
+    Evaluation,
+    Model,
+    Project,
+)
+from a4s_eval.data_model.measure import Measure, MeasureBatch
+from a4s_eval.metric_registries.evaluation_engine import EvaluationResult, MetricRun
+from a4s_eval.utils import env
+
+
+class EvaluationJob(BaseModel):
+    """Evaluation of a dataset stored as a parquet file.
+
+    Attributes:
+        pid (uuid.UUID): Evaluation id.
+        project (Project): Project the evaluation belongs to.
+        dataset_pid (uuid.UUID): Dataset id.
+        shape (DataShape): Features, target and date of the dataset.
+        data_path (str): Parquet file readable by every worker.
+        metrics (list[str] | None): Metrics to run, all registered ones that
+            do not need a model if None.
+        chunk_rows (int): Number of rows per chunk task.
+    """
+
+    pid: uuid.UUID
+    project: Project
+    dataset_pid: uuid.UUID
+    shape: DataShape
+    data_path: str
+    metrics: list[str] | None = None
+    chunk_rows: int = Field(default_factory=lambda: env.WORKER_CHUNK_ROWS, gt=0)
+
+    def columns(self) -> list[str]:
+        """Return the dataset columns the metrics can use."""
+        features = [*self.shape.features, self.shape.target, self.shape.date]
+        return list(dict.fromkeys(f.name for f in features if f is not None))
+
+    def evaluation(self, data: pd.DataFrame) -> Evaluation:
+        """Build the evaluation of some rows of the dataset."""
+        dataset = Dataset(pid=self.dataset_pid, shape=self.shape, data=data)
+        return Evaluation(
+            pid=self.pid,
+            dataset=dataset,
+            model=Model(pid=self.pid, dataset=dataset),
+            project=self.project,
+        )
+
+
+def chunk_ranges(n_rows: int, chunk_rows: int) -> list[tuple[int, int]]:
+    """Split ``n_rows`` rows into consecutive ``[start, stop)`` ranges."""
+    return [
+        (start, min(start + chunk_rows, n_rows))
+        for start in range(0, n_rows, chunk_rows)
+    ]
+
+
+def count_rows(path: str) -> int:
+    """Return the number of rows of a parquet file from its metadata."""
+    return pq.ParquetFile(path).metadata.num_rows
+
+
+def read_rows(
+    path: str, start: int, stop: int, columns: Sequence[str] | None = None
+) -> pd.DataFrame:
+    """Read the rows ``[start, stop)`` of a parquet file.
+
+    Only the row groups overlapping the range are read, so a chunk task does
+    not load the whole file.
+
+    Args:
+        path (str): Parquet file to read
+        start (int): First row
+        stop (int): Row after the last one
+        columns (Sequence[str] | None): Columns to read, all if None
+
+    Returns:
+        pd.DataFrame: The rows, indexed from ``start``
+    """
+    parquet = pq.ParquetFile(path)
+    groups = []
+    first_row = None
+    offset = 0
+    for index in range(parquet.num_row_groups):
+        n_rows = parquet.metadata.row_group(index).num_rows
+        if offset < stop and offset + n_rows > start:
+            groups.append(index)
+            first_row = offset if first_row is None else first_row
+        offset += n_rows
+
+    columns = list(columns) if columns is not None else None
+    if not groups:
+        return parquet.schema_arrow.empty_table().select(
+            columns or parquet.schema_arrow.names
+        ).to_pandas()
+    table = parquet.read_row_groups(groups, columns=columns)
+    table = table.slice(start - first_row, stop - start)
+    return table.to_pandas().set_axis(pd.RangeIndex(start, start + table.num_rows))
+
+
+def dump_measures(measures: Sequence[Measure]) -> dict[str, Any]:
+    """Serialize the measures of a metric, keeping batches columnar."""
+    if isinstance(measures, MeasureBatch):
+        return {"batch": measures.to_json(lossless=True)}
+    return {
+        "measures": [
+            {
+                **m.model_dump(mode="json"),
+                "score": m.score if math.isfinite(m.score) else str(m.score),
+            }
+            for m in measures
+        ]
+    }
+
+
+def load_measures(payload: dict[str, Any]) -> Sequence[Measure]:
+    if "batch" in payload:
+        return MeasureBatch.from_json(payload["batch"])
+    return [Measure.model_validate(m) for m in payload["measures"]]
+
+
+def dump_result(result: EvaluationResult, n_rows: int) -> dict[str, Any]:
+    """Serialize the result of an evaluation of ``n_rows`` rows as JSON."""
+    return {
+        "n_rows": n_rows,
+        "load_seconds": result.load_seconds,
+        "wall_seconds": result.wall_seconds,
+        "artifacts": [str(key) for key in result.artifacts],
+        "runs": [
+            {
+                "name": run.name,
+                "executor": run.executor,
+                "wall_seconds": run.wall_seconds,
+                "error": run.error,
+                **dump_measures(run.measures),
+            }
+            for run in result.runs
+        ],
+    }
+
+
+def load_result(payload: dict[str, Any]) -> EvaluationResult:
+    """Rebuild an ``EvaluationResult`` serialized by ``dump_result``."""
+    return EvaluationResult(
+        runs=[
+            MetricRun(
+                name=run["name"],
+                executor=run["executor"],
+                measures=load_measures(run),
+                wall_seconds=run["wall_seconds"],
+                error=run["error"],
+            )
+            for run in payload["runs"]
+        ],
+        load_seconds=payload["load_seconds"],
+        wall_seconds=payload["wall_seconds"],
+        artifacts=payload["artifacts"],
+    )
+
+
+def concat_measures(chunks: Sequence[Sequence[Measure]]) -> Sequence[Measure]:
+    """Join per-sample measures of consecutive chunks in row order."""
+    if chunks and all(isinstance(c, MeasureBatch) for c in chunks):
+        first = chunks[0]
+        if all(
+            (c.name, c.feature_pid) == (first.name, first.feature_pid) for c in chunks
+        ):
+            return MeasureBatch(
+                name=first.name,
+                scores=np.concatenate([c.scores for c in chunks]),
+                time=max(c.time for c in chunks),
+                feature_pid=first.feature_pid,
+            )
+    return [measure for chunk in chunks for measure in chunk]
+
+
+def mean_measures(
+    chunks: Sequence[Sequence[Measure]], weights: Sequence[int]
+) -> list[Measure]:
+    """Average per-dataset measures of chunks, weighted by their number of rows.
+
+    Raises:
+        ValueError: If the chunks do not return the same measures
+    """
+    first = list(chunks[0])
+    for chunk in chunks:
+        if [(m.name, m.feature_pid) for m in chunk] != [
+            (m.name, m.feature_pid) for m in first
+        ]:
+            raise ValueError("Chunks returned different measures")
+    return [
+        Measure(
+            name=measure.name,
+            score=float(
+                np.average([chunk[i].score for chunk in chunks], weights=weights)
+            ),
+            time=max(chunk[i].time for chunk in chunks),
+            feature_pid=measure.feature_pid,
+        )
+        for i, measure in enumerate(first)
+    ]
+
+
+def reduce_results(
+    chunks: Sequence[dict[str, Any]],
+    reductions: dict[str, str],
+    submitted: float | None = None,
+) -> EvaluationResult:
+    """Reduce the serialized results of the chunks of a dataset, in row order.
+
+    A metric that failed on any chunk is reported with the first error and no
+    measures. The wall time of a metric is its total over the chunks.
+
+    Args:
+        chunks (Sequence[dict[str, Any]]): Results of ``dump_result``, one per
+            chunk
+        reductions (dict[str, str]): 'concat' or 'mean' for each metric
+        submitted (float | None): ``time.time()`` at which the job was
+            submitted, used for the wall time of the evaluation
+
+    Returns:
+        EvaluationResult: One run per metric, over all the rows
+    """
+    results = [load_result(chunk) for chunk in chunks]
+    weights = [chunk["n_rows"] for chunk in chunks]
+    runs = []
+    for index, run in enumerate(results[0].runs if results else []):
+        chunk_runs = [result.runs[index] for result in results]
+        errors = [r.error for r in chunk_runs if r.error is not None]
+        reduced = MetricRun(name=run.name, executor=run.executor, error=None)
+        if errors:
+            reduced.error = errors[0]
+        else:
+            measures = [r.measures for r in chunk_runs]
+            try:
+                if reductions.get(run.name, "concat") == "mean":
+                    reduced.measures = mean_measures(measures, weights)
+                else:
+                    reduced.measures = concat_measures(measures)
+                reduced.wall_seconds = sum(r.wall_seconds for r in chunk_runs)
+            except ValueError as e:
+                reduced.error = repr(e)
+        runs.append(reduced)
+
+    return EvaluationResult(
+        runs=runs,
+        load_seconds=sum(result.load_seconds for result in results),
+        wall_seconds=(
+            time.time() - submitted
+            if submitted is not None
+            else sum(result.wall_seconds for result in results)
+        ),
+        artifacts=list(
+            dict.fromkeys(key for result in results for key in result.artifacts)
+        ),
+    )
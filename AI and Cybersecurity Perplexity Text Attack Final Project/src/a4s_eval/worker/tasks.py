@@ -0,0 +1,152 @@
+"""Celery tasks evaluating a dataset in chunks across worker nodes.
+
+``evaluate`` receives an ``EvaluationJob``, splits its dataset into chunks of
+``chunk_rows`` rows and replaces itself with a chord: one ``evaluate_chunk``
+task per chunk, run by any worker, and a ``reduce_chunks`` callback combining
+their results. The result of ``evaluate`` is therefore the reduced result,
+serialized as JSON; ``load_result`` turns it back into an
+``EvaluationResult``::
+
+    payload = evaluate.delay(job.model_dump(mode="json")).get()
+    result = load_result(payload)
+
+Each worker process loads the models of the metrics listed in
+``WORKER_WARM_METRICS`` when it starts, and keeps them in its reference model
+cache for all the chunks it scores.
+
+Jobs do not carry a model: the worker only runs metrics that evaluate the
+dataset itself, as perplexity does. A job naming a metric that needs a
+functional model is rejected by ``evaluate`` before any chunk is scheduled.
+"""
+
+import multiprocessing as mp
+import sys
+import time
+from typing import Any, Sequence
+
+from celery import Task, chord
+from celery.signals import worker_process_init
+
+from a4s_eval.metric_registries import model_metric_registry
+from a4s_eval.metric_registries.evaluation_engine import EvaluationEngine
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import get_logger
+from a4s_eval.worker.celery_app import celery_app
+from a4s_eval.worker.chunks import (
+    EvaluationJob,
+    chunk_ranges,
+    count_rows,
+    dump_result,
+    read_rows,
+    reduce_results,
+)
+
+logger = get_logger()
+
+
+def warm_up_metrics(names: Sequence[str]) -> list[str]:
+    """Import metrics and load their models in this process.
+
+    A metric module loads its models in an optional ``warm_up()`` function.
+    A metric that fails to warm up is logged and loaded on first use instead.
+
+    Returns:
+        list[str]: Names of the metrics that were warmed up
+    """
+    warmed = []
+    for name in names:
+        start = time.perf_counter()
+        try:
+            module = sys.modules[model_metric_registry.get(name).__module__]
+            if hasattr(module, "warm_up"):
+                module.warm_up()
+        except Exception as e:
+            logger.error(f"Could not warm up metric {name}: {e!r}")
+            continue
+        warmed.append(name)
+        logger.info(f"Warmed up metric {name} in {time.perf_counter() - start:.2f}s")
+    return warmed
+
+
+def job_metrics(metrics: Sequence[str] | None) -> list[str]:
+    """Return the metrics an evaluation job runs.
+
+    Jobs do not carry a model, so they can only run metrics registered with
+    ``needs_model=False``. A job that names no metrics runs all of those.
+
+    Raises:
+        KeyError: If a metric is not in the registry
+        ValueError: If a metric needs a functional model
+    """
+    if metrics is not None:
+        EvaluationEngine(metrics=metrics).check_model(None)
+        return list(metrics)
+    names = model_metric_registry.names()
+    for name in names:
+        # Importing the metric registers whether it needs a model
+        model_metric_registry.get(name)
+    return [name for name in names if not model_metric_registry.needs_model(name)]
+
+
+@worker_process_init.connect
+def _warm_up_worker_process(**kwargs: Any) -> None:
+    names = [name.strip() for name in env.WORKER_WARM_METRICS.split(",")]
+    warm_up_metrics([name for name in names if name])
+
+
+@celery_app.task(bind=True, name="a4s_eval.evaluate")
+def evaluate(self: Task, job: dict[str, Any]) -> Any:
+    """Split an evaluation job into chunk tasks and reduce their results."""
+    submitted = time.time()
+    parsed = EvaluationJob.model_validate(job)
+    parsed.metrics = job_metrics(parsed.metrics)
+    job = parsed.model_dump(mode="json")
+    n_rows = count_rows(parsed.data_path)
+    ranges = chunk_ranges(n_rows, parsed.chunk_rows)
+    logger.info(
+        f"Evaluation {parsed.pid}: {n_rows} rows in {len(ranges)} chunks of "
+        f"{parsed.chunk_rows}"
+    )
+    if not ranges or self.request.is_eager:
+        # Eager tasks (task_always_eager, as in tests) cannot wait on a chord
+        chunks = [evaluate_chunk(job, start, stop) for start, stop in ranges]
+        return reduce_chunks(chunks, job, submitted)
+    return self.replace(
+        chord(
+            [evaluate_chunk.s(job, start, stop) for start, stop in ranges],
+            reduce_chunks.s(job, submitted),
+        )
+    )
+
+
+@celery_app.task(name="a4s_eval.evaluate_chunk")
+def evaluate_chunk(job: dict[str, Any], start: int, stop: int) -> dict[str, Any]:
+    """Run the metrics of a job on the rows ``[start, stop)`` of its dataset."""
+    parsed = EvaluationJob.model_validate(job)
+    data = read_rows(parsed.data_path, start, stop, parsed.columns())
+    # Celery's prefork workers are daemonic and cannot start metric processes
+    engine = EvaluationEngine(
+        metrics=parsed.metrics, use_processes=not mp.current_process().daemon
+    )
+    result = engine.run(parsed.evaluation(data))
+    return dump_result(result, n_rows=len(data))
+
+
+@celery_app.task(name="a4s_eval.reduce_chunks")
+def reduce_chunks(
+    chunks: list[dict[str, Any]], job: dict[str, Any], submitted: float
+) -> dict[str, Any]:
+    """Combine the chunk results of a job into one result per metric."""
+    parsed = EvaluationJob.model_validate(job)
+    names = [run["name"] for run in chunks[0]["runs"]] if chunks else []
+    for name in names:
+        # Importing the metric registers its reduction
+        model_metric_registry.get(name)
+    result = reduce_results(
+        chunks,
+        {name: model_metric_registry.reduction(name) for name in names},
+        submitted=submitted,
+    )
+    for name, error in result.errors.items():
+        logger.error(f"Evaluation {parsed.pid}: metric {name} failed: {error}")
+    return dump_result(result, n_rows=sum(chunk["n_rows"] for chunk in chunks))
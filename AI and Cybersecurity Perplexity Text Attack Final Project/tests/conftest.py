@@ -0,0 +1,11 @@
+import pytest
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+
+@pytest.fixture(scope="session")
+def reference_lm():
+    """Loads the distilgpt2 reference model once for the whole session."""
+    model = AutoModelForCausalLM.from_pretrained("distilgpt2")
+    tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
+    model.eval()
+    return model, tokenizer
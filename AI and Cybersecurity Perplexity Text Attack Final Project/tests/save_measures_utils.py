@@ -1,12 +1,28 @@
-import pandas as pd
-from a4s_eval.data_model.measure import Measure
-import os
+from typing import Sequence
+from a4s_eval.data_model.measure import Measure, MeasureBatch
+from a4s_eval.perplexity.measures_io import write_measures
 
 OUTPUT_FOLDER = "./tests/data/measures/"
 
 
-def save_measures(name: str, measures: list[Measure]) -> None:
-    df = pd.DataFrame([m.model_dump() for m in measures])
-    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+def save_measures(
+    name: str,
+    measures: Sequence[Measure],
+    row_ids: Sequence[str] | None = None,
+    digests: Sequence[str | None] | None = None,
+) -> None:
+    """Save measures to an Arrow file, like the experiment scripts.
 
-    df.to_csv(OUTPUT_FOLDER + name.lower().replace(' ', '_') + ".csv", index=False)
+    Rows are identified by their position and have no text digest unless
+    given.
+    """
+    if isinstance(measures, MeasureBatch):
+        scores = measures.scores
+    else:
+        scores = [m.score for m in measures]
+    write_measures(
+        OUTPUT_FOLDER + name.lower().replace(' ', '_') + ".arrow",
+        row_ids if row_ids is not None else [str(i) for i in range(len(scores))],
+        digests if digests is not None else [None] * len(scores),
+        scores,
+    )
@@ -0,0 +1,94 @@
+import pandas as pd
+
+from a4s_eval.attack.checkpoint import AttackCheckpoint, dataset_row_ids
+
+
+def test_checkpoint_resumes_completed_rows(tmp_path):
+    """Rows recorded before an interruption are found again on restart."""
+    path = str(tmp_path / "checkpoint.jsonl")
+    with AttackCheckpoint(path, flush_every=2) as checkpoint:
+        checkpoint.append("a", "first text", "first attacked")
+        checkpoint.append("b", "second\ntext", "second attacked")
+
+    restarted = AttackCheckpoint(path)
+    assert restarted.completed_ids() == {"a", "b"}
+    with restarted:
+        restarted.append("c", "third", "third attacked")
+
+    rows = AttackCheckpoint(path).rows()
+    assert list(rows) == ["a", "b", "c"]
+    assert rows["b"]["original_text"] == "second\ntext"
+
+
+def test_checkpoint_writes_full_batches(tmp_path):
+    """Full batches are on disk before the checkpoint is closed."""
+    path = str(tmp_path / "checkpoint.jsonl")
+    checkpoint = AttackCheckpoint(path, flush_every=2)
+    for i in range(3):
+        checkpoint.append(str(i), "text", "attacked")
+
+    assert AttackCheckpoint(path).completed_ids() == {"0", "1"}
+    assert checkpoint.completed_ids() == {"0", "1", "2"}
+    checkpoint.close()
+    assert AttackCheckpoint(path).completed_ids() == {"0", "1", "2"}
+
+
+def test_checkpoint_discards_torn_record(tmp_path):
+    """A record cut short by a crash is dropped and attacked again."""
+    path = tmp_path / "checkpoint.jsonl"
+    with AttackCheckpoint(str(path)) as checkpoint:
+        checkpoint.append("a", "text", "attacked")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"row_id": "b", "original_te')
+
+    checkpoint = AttackCheckpoint(str(path))
+    assert checkpoint.completed_ids() == {"a"}
+    with checkpoint:
+        checkpoint.append("b", "text", "attacked")
+    assert AttackCheckpoint(str(path)).completed_ids() == {"a", "b"}
+
+
+def test_checkpoint_reattacks_rows_whose_text_changed(tmp_path):
+    """Rows keyed by position are not reused once the dataset is reordered."""
+    path = str(tmp_path / "checkpoint.jsonl")
+    with AttackCheckpoint(path) as checkpoint:
+        checkpoint.append("0", "first text", "first attacked")
+        checkpoint.append("1", "second text", "second attacked")
+
+    reordered = {"0": "second text", "1": "first text", "2": "third text"}
+    checkpoint = AttackCheckpoint(path)
+    assert checkpoint.completed_ids(reordered) == set()
+    assert checkpoint.completed_ids({"1": "second text"}) == {"1"}
+
+    with checkpoint:
+        checkpoint.append("0", "second text", "second attacked again")
+    rows = AttackCheckpoint(path).rows()
+    assert rows["0"]["attacked_text"] == "second attacked again"
+    assert AttackCheckpoint(path).completed_ids(reordered) == {"0"}
+
+
+def test_dataset_row_ids():
+    """The id column is used when unique, row positions otherwise."""
+    df = pd.DataFrame({"id": ["x", "y"], "context": ["a", "b"]})
+    assert dataset_row_ids(df) == ["x", "y"]
+    assert dataset_row_ids(df.assign(id=["x", "x"])) == ["0", "1"]
+    assert dataset_row_ids(df.drop(columns="id")) == ["0", "1"]
+
+
+def test_checkpoint_reattacks_rows_of_other_parameters(tmp_path):
+    """Rows attacked with other parameters are not reused."""
+    path = str(tmp_path / "checkpoint.jsonl")
+    params = {"embedding": "glove.txt-1-2", "max_candidates": 10}
+    with AttackCheckpoint(path, params=params) as checkpoint:
+        checkpoint.append("a", "text", "attacked")
+
+    assert AttackCheckpoint(path, params=dict(params)).completed_ids() == {"a"}
+
+    changed = AttackCheckpoint(path, params={**params, "max_candidates": 5})
+    assert changed.is_stale()
+    assert changed.completed_ids() == set()
+    with changed:
+        changed.append("b", "text", "attacked again")
+
+    assert list(AttackCheckpoint(path, params=changed.params).rows()) == ["b"]
+    assert list(AttackCheckpoint(f"{path}.stale", params=params).rows()) == ["a"]
@@ -0,0 +1,30 @@
+import pytest
+
+from a4s_eval.attack.parallel import ParallelAttack
+
+
+class ReverseWords:
+    """Deterministic stand-in for the word swap attack."""
+
+    def __call__(self, text):
+        return " ".join(reversed(text.split()))
+
+
+TEXTS = [f"text number {i} with a few words" for i in range(37)]
+
+
+def test_serial_attack():
+    """A single worker attacks in-process, in input order."""
+    with ParallelAttack(ReverseWords, num_workers=1) as attacker:
+        results = list(attacker.map(TEXTS))
+    assert results == [ReverseWords()(text) for text in TEXTS]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5])
+def test_parallel_attack_matches_serial(chunk_size):
+    """Several workers produce exactly the serial output, in input order."""
+    with ParallelAttack(ReverseWords, num_workers=1) as attacker:
+        serial = list(attacker.map(TEXTS))
+    with ParallelAttack(ReverseWords, num_workers=2, chunk_size=chunk_size) as attacker:
+        parallel = list(attacker.map(iter(TEXTS)))
+    assert parallel == serial
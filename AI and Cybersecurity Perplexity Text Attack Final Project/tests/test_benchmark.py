@@ -0,0 +1,96 @@
+import dataclasses
+
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.benchmark import (
+    BenchmarkCase,
+    BenchmarkReport,
+    CorpusSpec,
+    compare_to_baseline,
+    measure_startup,
+    run_benchmark,
+    sample_corpus,
+    synthetic_corpus,
+)
+
+
+def test_corpora_are_deterministic_and_length_controlled():
+    """The same spec always gives the same texts, within the word range."""
+    spec = CorpusSpec("short", n_texts=50, min_words=5, max_words=12, seed=3)
+    texts = synthetic_corpus(spec)
+
+    assert texts == synthetic_corpus(spec)
+    assert texts != synthetic_corpus(dataclasses.replace(spec, seed=4))
+    assert all(5 <= len(text.split()) <= 12 for text in texts)
+
+    pool = [" ".join(["word"] * n) for n in range(1, 40)] + [None, ""]
+    sample = sample_corpus(list(reversed(pool)), CorpusSpec("pool", 20, 10, 20))
+    assert sample == sample_corpus(pool, CorpusSpec("pool", 20, 10, 20))
+    assert len(sample) == 20
+    assert all(10 <= len(text.split()) <= 20 for text in sample)
+
+    with pytest.raises(ValueError):
+        sample_corpus(pool, CorpusSpec("pool", 5, 100, 200))
+
+
+def test_run_benchmark_reports_every_metric(tmp_path):
+    """A case reports throughput, latency percentiles, memory and load time."""
+    texts = synthetic_corpus(CorpusSpec("tiny", 10, 4, 16))
+    cases = [BenchmarkCase(corpus="tiny", batch_size=size) for size in (1, 4)]
+    report = run_benchmark(cases, {"tiny": texts}, isolate=False)
+
+    for case, result in zip(cases, report.results):
+        assert result.case == case
+        assert result.n_texts == 10
+        assert result.n_tokens > result.n_texts
+        assert result.texts_per_second > 0
+        assert result.tokens_per_second == pytest.approx(
+            result.texts_per_second * result.n_tokens / result.n_texts
+        )
+        assert 0 < result.latency_p50_ms <= result.latency_p95_ms
+        assert result.latency_p95_ms <= result.latency_p99_ms
+        assert result.peak_rss_mb > 0
+        assert result.model_load_seconds > 0
+
+    path = tmp_path / "benchmark.json"
+    report.save(str(path))
+    loaded = BenchmarkReport.load(str(path))
+    assert loaded.results == report.results
+    assert loaded.startup == report.startup == {}
+    assert loaded.environment["torch"]
+
+
+def test_compare_to_baseline_flags_regressions_beyond_threshold():
+    """Only metrics worse than the baseline by more than the threshold count."""
+    texts = synthetic_corpus(CorpusSpec("tiny", 4, 4, 8))
+    baseline = run_benchmark(
+        [BenchmarkCase(corpus="tiny", batch_size=4)], {"tiny": texts}, isolate=False
+    )
+    result = baseline.results[0]
+    current = BenchmarkReport(
+        results=[
+            dataclasses.replace(
+                result,
+                texts_per_second=result.texts_per_second * 0.8,
+                latency_p99_ms=result.latency_p99_ms * 1.05,
+                peak_rss_mb=result.peak_rss_mb * 0.5,
+            ),
+            dataclasses.replace(result, case=BenchmarkCase(corpus="other")),
+        ]
+    )
+
+    baseline.startup = {"a4s_eval": 0.010, "a4s_eval.utils": 0.020}
+    current.startup = {"a4s_eval": 0.020, "a4s_eval.utils": 0.021}
+
+    regressions = compare_to_baseline(current, baseline, threshold=0.1)
+    assert [r.metric for r in regressions] == ["texts_per_second", "import_seconds"]
+    assert np.isclose(regressions[0].change, -0.2)
+    assert regressions[1].key == "startup|a4s_eval"
+    assert compare_to_baseline(current, baseline, threshold=1.5) == []
+
+
+def test_measure_startup_times_a_fresh_import():
+    """Startup is timed in a new interpreter, so cached imports do not count."""
+    seconds = measure_startup("a4s_eval.metric_registries", repeats=1)
+    assert 0 < seconds < 10
@@ -0,0 +1,31 @@
+import numpy as np
+
+from a4s_eval.perplexity.dedup import NON_TEXT_DIGEST, dedup_texts, text_digest
+
+
+def test_dedup_preserves_first_occurrence_order():
+    """Distinct texts are kept in first-occurrence order."""
+    texts = ["context b", "context a", "context b", "context a", "context c"]
+    result = dedup_texts(texts)
+
+    assert result.unique_texts == ["context b", "context a", "context c"]
+    assert result.inverse.tolist() == [0, 1, 0, 1, 2]
+    assert result.n_rows == 5
+    assert result.n_unique == 3
+    assert result.ratio == 5 / 3
+
+
+def test_dedup_expand_restores_row_order():
+    """Scores of distinct texts are fanned back out to every row."""
+    texts = ["x", "y", "x", None, "y", None]
+    result = dedup_texts(texts)
+
+    unique_scores = np.array([1.0, 2.0, np.inf])
+    assert result.expand(unique_scores).tolist() == [1.0, 2.0, 1.0, np.inf, 2.0, np.inf]
+
+
+def test_text_digest_normalizes_unicode():
+    """Composed and decomposed forms of the same text share a digest."""
+    assert text_digest("café") == text_digest("café")
+    assert text_digest("cafe") != text_digest("café")
+    assert text_digest(None) == NON_TEXT_DIGEST
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from a4s_eval.data_model.evaluation import (
+    DataShape,
+    Dataset,
+    Evaluation,
+    Feature,
+    FeatureType,
+    Model,
+    Project,
+)
+from a4s_eval.data_model.measure import Measure
+from a4s_eval.metric_registries.artifacts import shared_artifact, shared_predictions
+from a4s_eval.metric_registries.evaluation_engine import EvaluationEngine
+from a4s_eval.metric_registries.model_metric_registry import ModelMetricRegistry
+from a4s_eval.service.functional_model import TabularClassificationModel
+from a4s_eval.utils import env
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Perplexity measures how well a probability model predicts a sample.",
+    "The quick brown fox jumps over the lazy dog.",
+]
+
+
+def make_evaluation(data: pd.DataFrame | None) -> Evaluation:
+    shape = DataShape(
+        features=[
+            Feature(
+                pid=uuid.uuid4(),
+                name="context",
+                feature_type=FeatureType.TEXT,
+                min_value=None,
+                max_value=None,
+            )
+        ]
+    )
+    dataset = Dataset(pid=uuid.uuid4(), shape=shape, data=data)
+    return Evaluation(
+        pid=uuid.uuid4(),
+        dataset=dataset,
+        model=Model(pid=uuid.uuid4(), dataset=dataset),
+        project=Project(
+            pid=uuid.uuid4(), name="test", frequency="1d", window_size="1d"
+        ),
+    )
+
+
+def text_lengths(dataset: Dataset) -> list[int]:
+    return [len(text) for text in dataset.data["context"]]
+
+
+def process_metric(datashape, model, dataset, functional_model):
+    """Scores the id of the process the metric runs in."""
+    return [Measure(name="pid", score=os.getpid(), time=datetime.now())]
+
+
+@pytest.fixture
+def functional_model():
+    return TabularClassificationModel(
+        predict_class=lambda x: [len(row[0]) % 2 for row in x], predict_proba=None
+    )
+
+
+def test_metrics_run_concurrently_and_share_artifacts(functional_model):
+    """Thread metrics overlap in time and compute shared artifacts once."""
+    calls = {"lengths": 0, "predict": 0}
+    barrier = threading.Barrier(2, timeout=10)
+
+    def lengths(dataset):
+        calls["lengths"] += 1
+        return text_lengths(dataset)
+
+    def counting_model():
+        def predict(x):
+            calls["predict"] += 1
+            return functional_model.predict_class(x)
+
+        return TabularClassificationModel(predict_class=predict, predict_proba=None)
+
+    def make_metric(name):
+        def metric(datashape, model, dataset, functional_model):
+            # Both metrics must be running for either to pass the barrier
+            barrier.wait()
+            values = shared_artifact("lengths", lambda: lengths(dataset))
+            predictions = shared_predictions(datashape, dataset, functional_model)
+            time.sleep(0.05)
+            score = sum(values) + sum(predictions)
+            return [Measure(name=name, score=score, time=datetime.now())]
+
+        return metric
+
+    registry = ModelMetricRegistry()
+    registry.register("first", make_metric("first"))
+    registry.register("second", make_metric("second"))
+    result = EvaluationEngine(registry).run(
+        make_evaluation(pd.DataFrame({"context": TEXTS})), counting_model()
+    )
+
+    assert result.errors == {}
+    assert [run.name for run in result.runs] == ["first", "second"]
+    assert all(run.wall_seconds >= 0.05 for run in result.runs)
+    assert result.measures[0].score == result.measures[1].score
+    assert calls == {"lengths": 1, "predict": 1}
+    assert set(result.artifacts) == {"lengths", ("predict_class", ("context",))}
+
+
+def test_dataset_is_loaded_once_and_failures_are_isolated(functional_model):
+    """The loader runs once for all metrics and a failing metric is reported."""
+    loads = []
+
+    def load_data(dataset):
+        loads.append(dataset.pid)
+        return pd.DataFrame({"context": TEXTS})
+
+    def count_rows(datashape, model, dataset, functional_model):
+        assert model.dataset.data is dataset.data
+        return [Measure(name="rows", score=len(dataset.data), time=datetime.now())]
+
+    def failing(datashape, model, dataset, functional_model):
+        raise RuntimeError("broken metric")
+
+    registry = ModelMetricRegistry()
+    registry.register("rows", count_rows)
+    registry.register("failing", failing)
+    registry.register("rows_again", count_rows)
+    result = EvaluationEngine(registry, load_data=load_data).run(
+        make_evaluation(None), functional_model
+    )
+
+    assert len(loads) == 1
+    assert [m.score for m in result.measures] == [3, 3]
+    assert "broken metric" in result.errors["failing"]
+    assert result.load_seconds <= result.wall_seconds
+
+    with pytest.raises(ValueError):
+        EvaluationEngine(registry).run(make_evaluation(None), functional_model)
+
+
+def test_model_free_metrics_run_without_functional_model():
+    """Without a model, metrics that need one are rejected before any runs."""
+    calls = []
+
+    def count_rows(datashape, model, dataset, functional_model):
+        calls.append(functional_model)
+        return [Measure(name="rows", score=len(dataset.data), time=datetime.now())]
+
+    registry = ModelMetricRegistry()
+    registry.register("rows", count_rows, needs_model=False)
+    registry.register("predictions", count_rows)
+    evaluation = make_evaluation(pd.DataFrame({"context": TEXTS}))
+
+    result = EvaluationEngine(registry, metrics=["rows"]).run(evaluation)
+    assert [m.score for m in result.measures] == [3]
+    assert calls == [None]
+
+    with pytest.raises(ValueError, match="predictions"):
+        EvaluationEngine(registry).run(evaluation)
+    assert calls == [None]
+
+
+def test_process_metrics_run_in_another_process(functional_model):
+    registry = ModelMetricRegistry()
+    registry.register("pid", process_metric, executor="process")
+    with pytest.raises(ValueError):
+        registry.register("bad", process_metric, executor="gpu")
+
+    # The lambda of the fixture model cannot be pickled to another process
+    model = TabularClassificationModel(predict_class=len, predict_proba=None)
+    result = EvaluationEngine(registry).run(
+        make_evaluation(pd.DataFrame({"context": TEXTS})), model
+    )
+
+    assert result.errors == {}
+    assert result.runs[0].executor == "process"
+    assert result.measures[0].score != os.getpid()
+
+
+def test_perplexity_metric_through_engine(monkeypatch, tmp_path, functional_model):
+    """The registered perplexity metric runs lazily and shares its token store."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    result = EvaluationEngine(metrics=["perplexity"]).run(
+        make_evaluation(pd.DataFrame({"context": TEXTS})), functional_model
+    )
+
+    assert result.errors == {}
+    assert len(result.measures) == len(TEXTS)
+    assert result.measures[0].score == result.measures[2].score
+    assert [key[0] for key in result.artifacts] == ["token_store"]
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from a4s_eval.data_model.measure import Measure, MeasureBatch
+
+
+@pytest.fixture
+def batch() -> MeasureBatch:
+    return MeasureBatch(
+        name="perplexity",
+        scores=[12.5, np.inf, 40.0, 7.25],
+        time=datetime(2025, 1, 2, 3, 4, 5),
+        feature_pid=uuid.uuid4(),
+    )
+
+
+def test_batch_is_a_sequence_of_measures(batch):
+    """Indexing and iteration build the same Measure objects as before."""
+    assert len(batch) == 4
+    assert batch[0] == Measure(
+        name="perplexity",
+        score=12.5,
+        time=batch.time,
+        feature_pid=batch.feature_pid,
+    )
+    assert [m.score for m in batch] == [12.5, np.inf, 40.0, 7.25]
+    assert batch.to_measures() == list(batch)
+
+    tail = batch[2:]
+    assert isinstance(tail, MeasureBatch)
+    np.testing.assert_array_equal(tail.scores, [40.0, 7.25])
+
+    with pytest.raises(ValueError):
+        MeasureBatch(name="x", scores=np.ones((2, 2)), time=batch.time)
+
+
+def test_bulk_serialization_matches_measures(batch):
+    """DataFrame, Arrow and JSON hold the same rows as the Measure dumps."""
+    expected = pd.DataFrame([m.model_dump() for m in batch])
+    pd.testing.assert_frame_equal(batch.to_dataframe(), expected)
+
+    table = batch.to_arrow()
+    assert table.column_names == ["name", "score", "time", "feature_pid"]
+    assert table.column("score").to_pylist() == [12.5, np.inf, 40.0, 7.25]
+    assert set(table.column("time").to_pylist()) == {batch.time}
+    assert set(table.column("feature_pid").to_pylist()) == {str(batch.feature_pid)}
+
+    data = batch.to_json()
+    # Non-finite scores are null, as in Measure.model_dump_json
+    assert json.loads(data)["scores"] == [
+        json.loads(m.model_dump_json())["score"] for m in batch
+    ]
+    restored = MeasureBatch.from_json(data)
+    assert restored.time == batch.time
+    assert restored.feature_pid == batch.feature_pid
+    np.testing.assert_array_equal(restored.scores, [12.5, np.nan, 40.0, 7.25])
+
+
+def test_batch_without_feature_pid():
+    batch = MeasureBatch(name="accuracy", scores=[0.5], time=datetime.now())
+    assert batch.to_dataframe()["feature_pid"].tolist() == [None]
+    assert MeasureBatch.from_json(batch.to_json()).feature_pid is None
+
+
+def test_importing_measures_does_not_import_pandas_or_pyarrow():
+    code = (
+        "import sys\n"
+        "import a4s_eval.data_model.measure\n"
+        "print([m for m in ('pandas', 'pyarrow') if m in sys.modules])\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, sys.path))},
+    ).stdout
+    assert output.splitlines()[-1] == "[]"
@@ -0,0 +1,50 @@
+import os
+
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.dedup import text_digest
+from a4s_eval.perplexity.measures_io import (
+    MEASURE_SCHEMA,
+    load_measures,
+    read_measures,
+    write_measures,
+)
+
+TEXTS = ["context a", "context b", "context a", "context c", "context d"]
+ROW_IDS = [f"q{i}" for i in range(len(TEXTS))]
+SCORES = np.array([12.5, 30.0, 12.5, np.inf, 7.25])
+
+
+def test_measures_round_trip(tmp_path):
+    """Row ids, digests and scores are read back in row order."""
+    path = tmp_path / "measures.arrow"
+    digests = [text_digest(text) for text in TEXTS]
+
+    assert write_measures(path, ROW_IDS, digests, SCORES) == len(TEXTS)
+
+    df = load_measures(path)
+    assert df.columns.tolist() == ["row_id", "text_digest", "score"]
+    assert df["row_id"].tolist() == ROW_IDS
+    assert df["text_digest"].tolist() == digests
+    np.testing.assert_array_equal(df["score"].to_numpy(), SCORES)
+    assert not os.path.exists(f"{path}.tmp")
+
+
+def test_measures_are_written_in_batches(tmp_path):
+    """The file holds one record batch per ``batch_rows`` rows."""
+    path = tmp_path / "measures.arrow"
+    write_measures(path, ROW_IDS, [None] * len(TEXTS), SCORES, batch_rows=2)
+
+    table = read_measures(path)
+    assert table.schema == MEASURE_SCHEMA
+    assert [len(batch) for batch in table.to_batches()] == [2, 2, 1]
+    assert table.column("text_digest").null_count == len(TEXTS)
+
+
+def test_measures_reject_misaligned_columns(tmp_path):
+    """Columns of different lengths are rejected before anything is written."""
+    path = tmp_path / "measures.arrow"
+    with pytest.raises(ValueError):
+        write_measures(path, ROW_IDS, ROW_IDS, SCORES[:3])
+    assert not os.path.exists(path)
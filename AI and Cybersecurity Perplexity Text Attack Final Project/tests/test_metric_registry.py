@@ -0,0 +1,98 @@
+import importlib
+import json
+import os
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import a4s_eval.metrics
+from a4s_eval.metric_registries import model_metric_registry
+from a4s_eval.metric_registries.manifest import MODEL_METRICS
+from a4s_eval.metric_registries.model_metric_registry import LazyMetric
+
+HEAVY_MODULES = ["torch", "transformers", "onnxruntime", "pandas"]
+
+
+def test_importing_registries_does_not_import_metric_modules():
+    """Listing metrics in a fresh interpreter imports none of their dependencies."""
+    code = (
+        "import json, sys\n"
+        "from a4s_eval.metric_registries import get_n_evaluation, "
+        "model_metric_registry\n"
+        "print(json.dumps({'names': model_metric_registry.names(), "
+        "'n': get_n_evaluation(), "
+        f"'loaded': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))\n"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env={**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, sys.path))},
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+
+    assert set(result["names"]) == set(MODEL_METRICS)
+    assert result["n"] == len(MODEL_METRICS)
+    assert result["loaded"] == []
+
+
+def test_manifest_matches_metric_modules():
+    """Every metric module is in the manifest and registers its declared names."""
+    modules = {
+        info.name
+        for info in pkgutil.walk_packages(
+            a4s_eval.metrics.__path__, f"{a4s_eval.metrics.__name__}."
+        )
+        if not info.ispkg
+    }
+    assert set(MODEL_METRICS.values()) == modules
+
+    for name, module in MODEL_METRICS.items():
+        func = model_metric_registry.get(name)
+        assert not isinstance(func, LazyMetric)
+        assert func.__module__ == module
+        assert model_metric_registry.get_functions()[name] is func
+
+
+@pytest.fixture
+def metric_module(tmp_path, monkeypatch):
+    """Writes a metric module that is not imported yet."""
+    (tmp_path / "lazy_metric_module.py").write_text(
+        "from a4s_eval.metric_registries.model_metric_registry import model_metric\n"
+        "\n"
+        "@model_metric(name='lazy_test_metric')\n"
+        "def lazy_test_metric(datashape, model, dataset, functional_model):\n"
+        "    return [datashape, model, dataset, functional_model]\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_metric_module"
+    sys.modules.pop("lazy_metric_module", None)
+    model_metric_registry.get_functions().pop("lazy_test_metric", None)
+
+
+def test_declared_metric_is_imported_on_first_call(metric_module):
+    model_metric_registry.declare("lazy_test_metric", metric_module)
+    proxy = model_metric_registry.get_functions()["lazy_test_metric"]
+    assert isinstance(proxy, LazyMetric)
+    assert metric_module not in sys.modules
+
+    assert proxy(1, 2, 3, 4) == [1, 2, 3, 4]
+    assert metric_module in sys.modules
+    func = model_metric_registry.get_functions()["lazy_test_metric"]
+    assert func is importlib.import_module(metric_module).lazy_test_metric
+
+    # Declaring again does not replace the registered metric
+    model_metric_registry.declare("lazy_test_metric", metric_module)
+    assert model_metric_registry.get("lazy_test_metric") is func
+
+
+def test_declared_metric_missing_from_its_module(metric_module):
+    model_metric_registry.declare("missing_metric", metric_module)
+    try:
+        with pytest.raises(LookupError):
+            model_metric_registry.get("missing_metric")
+    finally:
+        model_metric_registry.get_functions().pop("missing_metric")
@@ -0,0 +1,101 @@
+import pytest
+import torch
+
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+
+MODEL_SIZE = 100
+
+
+@pytest.fixture
+def cache_with_fake_loader():
+    """Creates a cache whose RSS is the number of cached fake models x 100."""
+    loaded = []
+
+    def fake_loader(model_name, dtype):
+        loaded.append(model_name)
+        return object(), object()
+
+    def fake_rss():
+        return len(cache.keys()) * MODEL_SIZE
+
+    cache = ReferenceModelCache(max_rss_bytes=2 * MODEL_SIZE, rss_fn=fake_rss)
+    cache.register_loader("fake", fake_loader)
+    return cache, loaded
+
+
+def test_cache_hits_and_misses(cache_with_fake_loader):
+    """A second request for the same model is served from the cache."""
+    cache, loaded = cache_with_fake_loader
+
+    first = cache.get("model-a", backend="fake")
+    second = cache.get("model-a", backend="fake")
+
+    assert first is second
+    assert loaded == ["model-a"]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.load_seconds >= 0.0
+
+
+def test_cache_key_includes_dtype(cache_with_fake_loader):
+    """The same model in another dtype is a separate entry."""
+    cache, loaded = cache_with_fake_loader
+
+    cache.get("model-a", dtype="float32", backend="fake")
+    cache.get("model-a", dtype="bfloat16", backend="fake")
+
+    assert len(loaded) == 2
+
+
+def test_cache_evicts_least_recently_used(cache_with_fake_loader):
+    """Exceeding the RSS budget evicts the least recently used model."""
+    cache, loaded = cache_with_fake_loader
+
+    cache.get("model-a", backend="fake")
+    cache.get("model-b", backend="fake")
+    cache.get("model-a", backend="fake")  # model-b is now least recently used
+    cache.get("model-c", backend="fake")
+
+    assert [key.model_name for key in cache.keys()] == ["model-a", "model-c"]
+    assert cache.stats.evictions == 1
+
+    cache.get("model-b", backend="fake")
+    assert loaded == ["model-a", "model-b", "model-c", "model-b"]
+
+
+def test_unknown_backend_raises():
+    """Requesting an unregistered backend is an error."""
+    with pytest.raises(ValueError):
+        ReferenceModelCache().get("model-a", backend="missing")
+
+
+def test_cache_evicts_by_estimated_size():
+    """Models are evicted against their parameter bytes when the RSS is unknown."""
+    cache = ReferenceModelCache(max_rss_bytes=250 * 4, rss_fn=lambda: None)
+    # 100 float32 parameters, 400 bytes per model
+    cache.register_loader("fake", lambda name, dtype: (torch.nn.Linear(99, 1), None))
+
+    for name in ["model-a", "model-b", "model-c"]:
+        cache.get(name, backend="fake")
+
+    assert [key.model_name for key in cache.keys()] == ["model-b", "model-c"]
+    assert cache.cached_bytes() == 800
+
+
+def test_stale_rss_evicts_one_model_per_load():
+    """An RSS that does not go down after an eviction does not empty the cache."""
+    rss = {"bytes": 0}
+    cache = ReferenceModelCache(max_rss_bytes=10_000, rss_fn=lambda: rss["bytes"])
+    cache.register_loader("fake", lambda name, dtype: (torch.nn.Linear(99, 1), None))
+    for name in ["model-a", "model-b", "model-c"]:
+        cache.get(name, backend="fake")
+
+    rss["bytes"] = 20_000
+    cache.get("model-d", backend="fake")
+
+    assert [key.model_name for key in cache.keys()] == [
+        "model-b",
+        "model-c",
+        "model-d",
+    ]
+    assert cache.stats.evictions == 1
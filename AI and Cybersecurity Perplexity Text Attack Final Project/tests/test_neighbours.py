@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pytest
+from textattack.shared import AttackedText, WordEmbedding
+from textattack.transformations import WordSwapEmbedding
+
+from a4s_eval.attack import neighbours
+from a4s_eval.attack.neighbours import (
+    MmapWordEmbedding,
+    embedding_key,
+    ensure_neighbour_table,
+    read_text_embedding,
+    top_k_neighbours,
+)
+from a4s_eval.attack.word_swap import FirstCandidateAttack
+from a4s_eval.utils import env
+
+VOCAB = [
+    "quick", "fast", "rapid", "brown", "tan", "fox", "wolf", "dog", "hound",
+    "lazy", "idle", "jumps", "leaps", "over", "the",
+]  # fmt: skip
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "A lazy hound leaps.",
+    "Nothing here is in the vocabulary.",
+]
+
+
+@pytest.fixture
+def embedding_file(tmp_path, monkeypatch):
+    """Writes a small GloVe-format embedding and caches tables in tmp_path."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path / "cache"))
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(len(VOCAB), 6)).astype(np.float32)
+    path = tmp_path / "embedding.txt"
+    with open(path, "w", encoding="utf-8") as f:
+        for word, vector in zip(VOCAB, vectors):
+            f.write(word + " " + " ".join(f"{x:.6f}" for x in vector) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("block_bytes", [256 << 20, 12 * 50 * 3])
+def test_top_k_neighbours_matches_brute_force(monkeypatch, block_bytes):
+    """Blocked top-k search matches a full sort of the distances."""
+    monkeypatch.setattr(neighbours, "_BLOCK_BYTES", block_bytes)
+    vectors = np.random.default_rng(1).normal(size=(50, 4)).astype(np.float32)
+    distances = np.linalg.norm(vectors[:, None] - vectors[None], axis=-1)
+    expected = np.argsort(distances, axis=1)[:, 1:6]
+
+    np.testing.assert_array_equal(top_k_neighbours(vectors, 5), expected)
+
+
+def test_table_is_built_once_and_memory_mapped(embedding_file):
+    """The table is cached under CACHE_DIR and opened memory-mapped."""
+    path = ensure_neighbour_table(embedding_file, k=3)
+    built_at = os.stat(path).st_mtime_ns
+    assert ensure_neighbour_table(embedding_file, k=3) == path
+    assert os.stat(path).st_mtime_ns == built_at
+
+    embedding = MmapWordEmbedding(path)
+    assert isinstance(embedding.neighbours, np.memmap)
+    assert embedding.neighbours.shape == (len(VOCAB), 3)
+    assert embedding.index2word(embedding.word2index("fox")) == "fox"
+    assert embedding.get_cos_sim("fox", "fox") == pytest.approx(1.0)
+    with pytest.raises(ValueError):
+        embedding.nearest_neighbours("fox", 4)
+
+
+def test_embedding_key_changes_with_the_file(embedding_file):
+    key = embedding_key(embedding_file)
+    assert embedding_key(embedding_file) == key
+
+    stat = os.stat(embedding_file)
+    os.utime(embedding_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert embedding_key(embedding_file) != key
+
+
+def test_attack_matches_textattack_embedding(embedding_file):
+    """Swaps read from the table are those of TextAttack's own lookup."""
+    source = read_text_embedding(embedding_file)
+    distances = np.linalg.norm(
+        source.vectors[:, None] - source.vectors[None], axis=-1
+    )
+    reference = WordSwapEmbedding(
+        max_candidates=3,
+        embedding=WordEmbedding(
+            source.vectors,
+            {word: i for i, word in enumerate(source.words)},
+            dict(enumerate(source.words)),
+            np.argsort(distances, axis=1),
+        ),
+    )
+    attack = FirstCandidateAttack(max_candidates=3, embedding_path=embedding_file)
+
+    for text in TEXTS:
+        candidates = reference(AttackedText(text))
+        expected = candidates[0].text if candidates else text
+        assert attack(text) == expected
@@ -0,0 +1,54 @@
+import os
+
+import numpy as np
+import pytest
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from a4s_eval.perplexity.engine import ScoringConfig, score_texts
+from a4s_eval.perplexity.onnx_backend import load_onnx_model, onnx_model_path
+from a4s_eval.utils import env
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Dog lazy the over jumps fox brown quick The",
+    "Super Bowl 50 was an American football game to determine the champion "
+    "of the National Football League (NFL) for the 2015 season.",
+    "Short text.",
+    "",
+]
+
+
+@pytest.fixture
+def onnx_cache_dir(tmp_path, monkeypatch):
+    """Exports ONNX models into a temporary cache directory."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_onnx_scores_match_torch(onnx_cache_dir):
+    """The ONNX backend reproduces the torch per-sample scores."""
+    torch_model = AutoModelForCausalLM.from_pretrained("distilgpt2").eval()
+    tokenizer = AutoTokenizer.from_pretrained("distilgpt2")
+    onnx_model, onnx_tokenizer = load_onnx_model("distilgpt2", "float32")
+    config = ScoringConfig(batch_size=3)
+
+    expected = score_texts(TEXTS, torch_model, tokenizer, config)
+    scores = score_texts(TEXTS, onnx_model, onnx_tokenizer, config)
+
+    np.testing.assert_allclose(scores, expected, rtol=1e-4)
+
+
+def test_onnx_export_is_cached(onnx_cache_dir):
+    """The model is exported once and reused by later loads."""
+    load_onnx_model("distilgpt2", "float32")
+    path = onnx_model_path("distilgpt2")
+    exported_at = os.stat(path).st_mtime_ns
+
+    load_onnx_model("distilgpt2", "float32")
+    assert os.stat(path).st_mtime_ns == exported_at
+
+
+def test_onnx_rejects_other_dtypes(onnx_cache_dir):
+    """Only float32 exports are supported."""
+    with pytest.raises(ValueError):
+        load_onnx_model("distilgpt2", "bfloat16")
@@ -0,0 +1,141 @@
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    score_texts,
+    score_texts_with_token_nll,
+)
+from a4s_eval.perplexity.paired import (
+    common_prefix_length,
+    score_text_pairs,
+    score_text_pairs_with_token_nll,
+)
+
+CLEAN = [
+    "Super Bowl 50 was an American football game to determine the champion "
+    "of the National Football League for the 2015 season.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Students build stronger relations with teachers who are supportive.",
+    "Identical texts share every token.",
+    "A text and a longer",
+    "",
+    "Short",
+]
+ATTACKED = [
+    "Super Bowl 50 was an American football game to determine the champion "
+    "of the National Football League for the 2015 campaign.",
+    "A quick brown fox jumps over the lazy dog.",
+    "Students build stronger relationships with teachers who are supportive.",
+    "Identical texts share every token.",
+    "A text and a longer version of it.",
+    "Not empty.",
+    "Short",
+]
+
+
+def test_common_prefix_length():
+    assert common_prefix_length([1, 2, 3, 4], [1, 2, 5, 4]) == 2
+    assert common_prefix_length([1, 2], [1, 2, 3]) == 2
+    assert common_prefix_length([7], [1]) == 0
+    assert common_prefix_length([], [1]) == 0
+
+
+def test_paired_scores_match_independent_scores(reference_lm):
+    """Both scores equal those of separate passes over each text."""
+    model, tokenizer = reference_lm
+    clean_scores, attacked_scores = score_text_pairs(
+        CLEAN, ATTACKED, model, tokenizer
+    )
+
+    np.testing.assert_allclose(
+        clean_scores, score_texts(CLEAN, model, tokenizer), rtol=1e-4
+    )
+    np.testing.assert_allclose(
+        attacked_scores, score_texts(ATTACKED, model, tokenizer), rtol=1e-4
+    )
+
+
+def test_paired_token_nll_matches_independent_token_nll(reference_lm):
+    model, tokenizer = reference_lm
+    for scored, texts in zip(
+        score_text_pairs_with_token_nll(CLEAN, ATTACKED, model, tokenizer),
+        [CLEAN, ATTACKED],
+    ):
+        scores, token_nll = scored
+        expected_scores, expected_nll = score_texts_with_token_nll(
+            texts, model, tokenizer
+        )
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-4)
+        for nll, expected in zip(token_nll, expected_nll):
+            if expected is None:
+                assert nll is None
+            else:
+                np.testing.assert_allclose(nll, expected, rtol=1e-4, atol=1e-5)
+
+
+def test_shared_prefix_is_run_once(reference_lm, monkeypatch):
+    """A late swap costs well under two independent passes over the text."""
+    model, tokenizer = reference_lm
+    n_tokens = []
+    forward = model.forward
+
+    def counting_forward(input_ids=None, **kwargs):
+        n_tokens.append(input_ids.numel())
+        return forward(input_ids=input_ids, **kwargs)
+
+    monkeypatch.setattr(model, "forward", counting_forward)
+    score_text_pairs(CLEAN[:1], ATTACKED[:1], model, tokenizer)
+
+    independent = 2 * len(tokenizer(CLEAN[0])["input_ids"])
+    assert sum(n_tokens) < 0.65 * independent
+
+
+def test_pairs_are_batched_and_deduplicated(reference_lm, monkeypatch):
+    """Repeated pairs are scored once, and all pairs share two forward passes."""
+    model, tokenizer = reference_lm
+    batch_sizes = []
+    forward = model.forward
+
+    def counting_forward(input_ids=None, **kwargs):
+        batch_sizes.append(input_ids.shape[0])
+        return forward(input_ids=input_ids, **kwargs)
+
+    monkeypatch.setattr(model, "forward", counting_forward)
+    clean, attacked = CLEAN[:3] * 4, ATTACKED[:3] * 4
+    clean_scores, attacked_scores = score_text_pairs(
+        clean, attacked, model, tokenizer, ScoringConfig(batch_size=8)
+    )
+
+    # The fox pair differs from its first token and is scored as 2 texts; the
+    # 2 other distinct pairs share one prefix pass and one suffix pass
+    assert batch_sizes == [2, 2, 4]
+    monkeypatch.undo()
+    np.testing.assert_allclose(
+        clean_scores, score_texts(clean, model, tokenizer), rtol=1e-4
+    )
+    np.testing.assert_allclose(
+        attacked_scores, score_texts(attacked, model, tokenizer), rtol=1e-4
+    )
+
+
+def test_sliding_window_pairs_are_scored_independently(reference_lm):
+    """Paired scoring falls back to the windowed engine when a stride is set."""
+    model, tokenizer = reference_lm
+    config = ScoringConfig(max_length=16, stride=8)
+    clean_scores, attacked_scores = score_text_pairs(
+        CLEAN, ATTACKED, model, tokenizer, config
+    )
+
+    np.testing.assert_allclose(
+        attacked_scores, score_texts(ATTACKED, model, tokenizer, config)
+    )
+    np.testing.assert_allclose(
+        clean_scores, score_texts(CLEAN, model, tokenizer, config)
+    )
+
+
+def test_pairs_must_align(reference_lm):
+    model, tokenizer = reference_lm
+    with pytest.raises(ValueError):
+        score_text_pairs(CLEAN, ATTACKED[:2], model, tokenizer)
@@ -0,0 +1,136 @@
+import math
+
+import pytest
+import torch
+
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    make_buckets,
+    make_windows,
+    score_texts,
+)
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Dog lazy the over jumps fox brown quick The",
+    "",
+    "Perplexity measures how well a probability model predicts a sample. "
+    "A lower perplexity score indicates that the language model is better "
+    "at predicting the text sample.",
+    None,
+    "Short text.",
+    "Super Bowl 50 was an American football game to determine the champion "
+    "of the National Football League (NFL) for the 2015 season.",
+]
+
+
+def per_text_perplexity(text, model, tokenizer):
+    """Reference implementation: one forward pass per text, batch size 1."""
+    if not isinstance(text, str) or not text.strip():
+        return float("inf")
+    input_ids = tokenizer.encode(
+        text, return_tensors="pt", truncation=True, max_length=1024
+    )
+    with torch.no_grad():
+        outputs = model(input_ids, labels=input_ids)
+    return torch.exp(outputs.loss).item()
+
+
+def test_make_buckets_respects_limits():
+    """Every index is bucketed once and no bucket exceeds the limits."""
+    lengths = [5, 100, 30, 30, 7, 64, 1, 250, 12]
+    buckets = make_buckets(lengths, batch_size=3, max_tokens_per_batch=200)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        width = max(lengths[i] for i in bucket)
+        assert len(bucket) <= 3
+        # An oversized sample is allowed on its own
+        assert len(bucket) == 1 or len(bucket) * width <= 200
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        ScoringConfig(batch_size=1),
+        ScoringConfig(batch_size=4),
+        ScoringConfig(batch_size=16, max_tokens_per_batch=64),
+    ],
+)
+def test_batched_scores_match_per_text(reference_lm, config):
+    """Batched scoring reproduces the per-text scores."""
+    model, tokenizer = reference_lm
+    expected = [per_text_perplexity(text, model, tokenizer) for text in TEXTS]
+
+    scores = score_texts(TEXTS, model, tokenizer, config)
+
+    assert len(scores) == len(TEXTS)
+    for score, ref in zip(scores, expected):
+        if math.isinf(ref):
+            assert math.isinf(score)
+        else:
+            assert score == pytest.approx(ref, rel=1e-4)
+
+
+def test_unscorable_inputs(reference_lm):
+    """Blank and non-string values are scored as infinity."""
+    model, tokenizer = reference_lm
+    scores = score_texts(["", "   ", None], model, tokenizer)
+    assert all(math.isinf(score) for score in scores)
+
+
+def test_make_windows_scores_every_token_once():
+    """Sliding windows overlap but score each token after the first once."""
+    windows = make_windows(10, max_length=4, stride=2)
+
+    assert windows == [(0, 4, 3), (2, 6, 2), (4, 8, 2), (6, 10, 2)]
+    assert sum(n_targets for _, _, n_targets in windows) == 9
+    assert make_windows(3, max_length=4, stride=2) == [(0, 3, 2)]
+
+
+def test_sliding_window_matches_truncation_for_short_texts(reference_lm):
+    """Texts that fit in one window get the same score as with truncation."""
+    model, tokenizer = reference_lm
+    truncated = score_texts(TEXTS, model, tokenizer, ScoringConfig())
+    windowed = score_texts(
+        TEXTS, model, tokenizer, ScoringConfig(max_length=1024, stride=512)
+    )
+    for score, ref in zip(windowed, truncated):
+        assert score == pytest.approx(ref, rel=1e-4)
+
+
+def test_sliding_window_matches_strided_reference(reference_lm):
+    """Batched windows reproduce a per-window loop over long texts."""
+    model, tokenizer = reference_lm
+    max_length, stride = 16, 8
+    texts = [TEXTS[3], TEXTS[6], TEXTS[0]]
+
+    expected = []
+    for text in texts:
+        input_ids = tokenizer.encode(text, return_tensors="pt")
+        total_nll, total_tokens, prev_end = 0.0, 0, 0
+        for begin in range(0, input_ids.size(1), stride):
+            end = min(begin + max_length, input_ids.size(1))
+            window = input_ids[:, begin:end]
+            labels = window.clone()
+            labels[:, : -(end - prev_end)] = -100
+            with torch.no_grad():
+                loss = model(window, labels=labels).loss
+            n_scored = (labels[:, 1:] != -100).sum().item()
+            total_nll += loss.item() * n_scored
+            total_tokens += n_scored
+            prev_end = end
+            if end == input_ids.size(1):
+                break
+        expected.append(math.exp(total_nll / total_tokens))
+
+    config = ScoringConfig(batch_size=4, max_length=max_length, stride=stride)
+    scores = score_texts(texts, model, tokenizer, config)
+    for score, ref in zip(scores, expected):
+        assert score == pytest.approx(ref, rel=1e-4)
+
+
+def test_invalid_stride_raises():
+    """The stride must leave at least one token of context per window."""
+    with pytest.raises(ValueError):
+        ScoringConfig(max_length=1024, stride=1024)
@@ -3,6 +3,7 @@ import pandas as pd
 import pytest
 import pathlib
 
+from a4s_eval.attack.checkpoint import dataset_row_ids
 from a4s_eval.data_model.evaluation import (
     Dataset,
     DataShape,
@@ -11,6 +12,7 @@ from a4s_eval.data_model.evaluation import (
     FeatureType,
 )
 from a4s_eval.metrics.model_metrics.perplexity_metric import perplexity
+from a4s_eval.perplexity.dedup import text_digest
 from a4s_eval.service.functional_model import TabularClassificationModel
 from tests.save_measures_utils import save_measures
 
@@ -83,5 +85,10 @@ def test_execute_perplexity_on_squad(
         f"Expected {len(squad_dataset.data)} measures, got {len(measures)}"
     )
     
-    # Save for inspection
-    save_measures("perplexity_data", measures)
+    # Save for inspection, next to (not over) the experiment outputs
+    save_measures(
+        "perplexity_execution",
+        measures,
+        row_ids=dataset_row_ids(squad_dataset.data),
+        digests=[text_digest(text) for text in squad_dataset.data["context"]],
+    )
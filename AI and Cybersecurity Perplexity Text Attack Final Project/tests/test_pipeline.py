@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from a4s_eval.perplexity.engine import ScoringConfig
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.pipeline import run_pipeline, run_stages
+from a4s_eval.perplexity.scoring import compute_perplexities
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Super Bowl 50 was an American football game.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Perplexity measures how well a probability model predicts a sample.",
+    "Short text.",
+    "Students are likely to build stronger relations with teachers.",
+    "",
+]
+
+
+def reverse_words(text):
+    """Deterministic stand-in for the adversarial transformation."""
+    return " ".join(reversed(text.split()))
+
+
+@pytest.fixture
+def clean_parquet(tmp_path):
+    path = tmp_path / "clean.parquet"
+    pd.DataFrame(
+        {"id": [f"q{i}" for i in range(len(TEXTS))], "context": TEXTS}
+    ).to_parquet(path)
+    return path
+
+
+def test_run_stages_keeps_order():
+    """Items go through every stage and reach the sink in source order."""
+    received = []
+    n_items = run_stages(
+        range(20), [lambda x: x + 1, lambda x: x * 2], received.append, queue_size=1
+    )
+
+    assert n_items == 20
+    assert received == [(x + 1) * 2 for x in range(20)]
+
+
+def test_run_stages_propagates_errors():
+    """A failing stage stops the pipeline and its error is raised."""
+
+    def fail_on_three(x):
+        if x == 3:
+            raise RuntimeError("stage failed")
+        return x
+
+    with pytest.raises(RuntimeError, match="stage failed"):
+        run_stages(range(1000), [fail_on_three], lambda x: None, queue_size=1)
+
+
+def test_pipeline_joins_attack_and_scores(tmp_path, clean_parquet):
+    """The joined table matches scoring each column separately."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    config = ScoringConfig(batch_size=4)
+    output_path = tmp_path / "results.parquet"
+
+    result = run_pipeline(
+        str(clean_parquet),
+        str(output_path),
+        reverse_words,
+        reference,
+        config,
+        chunk_size=2,
+        queue_size=1,
+    )
+    df = pd.read_parquet(output_path)
+
+    assert result.n_rows == len(TEXTS)
+    assert result.n_chunks == 4
+    assert df["id"].tolist() == [f"q{i}" for i in range(len(TEXTS))]
+    assert df["attacked_context"].tolist() == [reverse_words(t) for t in TEXTS]
+    expected_clean = compute_perplexities(TEXTS, reference, config).scores
+    expected_attacked = compute_perplexities(
+        df["attacked_context"].tolist(), reference, config
+    ).scores
+    np.testing.assert_allclose(df["clean_score"], expected_clean, rtol=1e-5)
+    np.testing.assert_allclose(df["attacked_score"], expected_attacked, rtol=1e-5)
+
+
+def test_pipeline_limit_and_failure(tmp_path, clean_parquet):
+    """Rows are limited on request and a failed run leaves no output table."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    output_path = tmp_path / "results.parquet"
+
+    result = run_pipeline(
+        str(clean_parquet), str(output_path), reverse_words, reference, limit=3
+    )
+    assert result.n_rows == 3
+    assert len(pd.read_parquet(output_path)) == 3
+
+    def broken_attack(text):
+        raise ValueError("attack failed")
+
+    failed_path = tmp_path / "failed.parquet"
+    with pytest.raises(ValueError, match="attack failed"):
+        run_pipeline(str(clean_parquet), str(failed_path), broken_attack, reference)
+    assert not os.path.exists(failed_path)
+    assert not os.path.exists(f"{failed_path}.tmp")
@@ -0,0 +1,115 @@
+import io
+import json
+import logging
+import pstats
+import threading
+
+import pytest
+
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.scoring import compute_perplexities
+from a4s_eval.utils import env
+from a4s_eval.utils.logging import JSONFormatter
+from a4s_eval.utils.profiling import count, profile_run, stage, summary_logger
+
+
+@pytest.fixture
+def json_summaries():
+    """Captures the profile summaries as formatted by the JSON formatter."""
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(JSONFormatter(fmt_keys={"level": "levelname"}))
+    level = summary_logger.level
+    summary_logger.setLevel(logging.INFO)
+    summary_logger.addHandler(handler)
+    yield lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+    summary_logger.removeHandler(handler)
+    summary_logger.setLevel(level)
+
+
+def test_stages_and_counters_are_recorded_in_active_runs(json_summaries):
+    """Stages count into every open run and are ignored outside of runs."""
+    with stage("outside"):
+        count("outside")
+
+    with profile_run("outer", trace="") as outer:
+        with stage("load"):
+            count("rows", 3)
+        with profile_run("inner", trace="") as inner:
+            for _ in range(2):
+                with stage("forward"):
+                    pass
+            count("rows", 2)
+
+    assert set(outer.stages) == {"load", "forward"}
+    assert outer.stages["forward"].calls == 2
+    assert set(inner.stages) == {"forward"}
+    assert outer.counters == {"rows": 5}
+    assert inner.counters == {"rows": 2}
+
+    inner_summary, outer_summary = json_summaries()
+    assert inner_summary["run"] == "inner"
+    assert outer_summary["run"] == "outer"
+    assert outer_summary["level"] == "INFO"
+    assert outer_summary["stages"]["forward"]["calls"] == 2
+    assert outer_summary["counters"] == {"rows": 5}
+    assert outer_summary["wall_seconds"] >= outer_summary["stages"]["load"]["seconds"]
+
+
+def test_concurrent_runs_record_their_own_stages():
+    """Runs open in different threads do not record each other's stages."""
+    both_open = threading.Barrier(2)
+    profilers = {}
+
+    def run(name):
+        with profile_run(name, trace="") as profiler:
+            both_open.wait()
+            with stage(f"{name}_only"):
+                count(name)
+            both_open.wait()
+        profilers[name] = profiler
+
+    threads = [threading.Thread(target=run, args=(name,)) for name in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(profilers["a"].stages) == {"a_only"}
+    assert profilers["a"].counters == {"a": 1}
+    assert set(profilers["b"].stages) == {"b_only"}
+
+
+def test_scoring_stages_are_profiled():
+    """Tokenization and forward passes of the scoring path are timed."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    texts = ["A first sentence to score.", "Another.", "A first sentence to score."]
+    with profile_run("scoring", trace="") as profiler:
+        compute_perplexities(texts, reference)
+
+    assert {"dedup", "tokenize", "forward"} <= set(profiler.stages)
+    assert profiler.counters["texts"] == 3
+    assert profiler.counters["distinct_texts"] == 2
+
+
+@pytest.mark.parametrize("trace", ["cprofile", "torch"])
+def test_trace_is_saved(monkeypatch, tmp_path, trace):
+    """The opt-in trace of a run is written under CACHE_DIR/profiles."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    with profile_run("traced", trace=trace) as profiler:
+        with stage("work"):
+            sum(range(10000))
+
+    assert profiler.trace_path.startswith(str(tmp_path / "profiles"))
+    if trace == "cprofile":
+        assert pstats.Stats(profiler.trace_path).total_calls > 0
+    else:
+        with open(profiler.trace_path) as f:
+            events = json.load(f)["traceEvents"]
+        assert any(event.get("name") == "work" for event in events)
+
+
+def test_unknown_trace_mode_is_rejected():
+    with pytest.raises(ValueError):
+        with profile_run("bad", trace="perf"):
+            pass
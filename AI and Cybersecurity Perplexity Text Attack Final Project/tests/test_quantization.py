@@ -0,0 +1,69 @@
+import math
+import os
+
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.model_cache import ReferenceModelCache, load_torch_model
+from a4s_eval.perplexity.onnx_backend import onnx_model_path
+from a4s_eval.perplexity.quantization import compare_scores, quantization_report
+from a4s_eval.utils import env
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Dog lazy the over jumps fox brown quick The",
+    "Super Bowl 50 was an American football game to determine the champion "
+    "of the National Football League (NFL) for the 2015 season.",
+    "Perplexity measures how well a probability model predicts a sample.",
+    "Short text.",
+    "",
+    None,
+]
+
+
+def test_compare_scores_identical():
+    """Identical scores have no deviation and a perfect rank correlation."""
+    scores = np.array([12.0, 40.0, 7.5, np.inf])
+    report = compare_scores(scores, scores.copy())
+
+    assert report.n_samples == 3
+    assert report.max_relative_deviation == 0.0
+    assert report.spearman == pytest.approx(1.0)
+
+
+def test_compare_scores_deviation_and_ranking():
+    """Deviation is relative to float32 and swapped ranks lower the correlation."""
+    reference = np.array([10.0, 20.0, 30.0, 40.0])
+    quantized = np.array([11.0, 20.0, 45.0, 40.0])
+    report = compare_scores(reference, quantized)
+
+    assert report.max_relative_deviation == pytest.approx(0.5)
+    assert report.mean_relative_deviation == pytest.approx((0.1 + 0.5) / 4)
+    assert report.spearman < 1.0
+
+
+def test_int8_report(tmp_path, monkeypatch):
+    """The int8 model is cached on disk and stays close to float32."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    report = quantization_report(TEXTS, sample_size=10, cache=ReferenceModelCache())
+
+    assert os.path.exists(onnx_model_path("distilgpt2", variant="model.int8"))
+    assert report.n_samples == 5
+    assert report.mean_relative_deviation < 0.1
+    assert report.spearman > 0.8
+    assert not math.isnan(report.speedup)
+
+
+def test_torch_backend_rejects_int8():
+    """Quantized scoring is only provided by the onnx backend."""
+    with pytest.raises(ValueError):
+        load_torch_model("distilgpt2", "int8")
+
+
+@pytest.mark.parametrize(
+    "backend, dtype", [("torch", "int8"), ("onnxruntime", "float32")]
+)
+def test_invalid_model_settings_are_rejected_when_read(backend, dtype):
+    with pytest.raises(ValueError, match="PERPLEXITY_"):
+        env.check_perplexity_model(backend, dtype)
+    env.check_perplexity_model("onnx", "int8")
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.score_cache import ScoreCache, ScoreNamespace
+from a4s_eval.perplexity.scoring import compute_perplexities
+
+NAMESPACE = ScoreNamespace(model_id="distilgpt2", tokenizer_revision="r1", max_length=1024)
+
+
+@pytest.fixture
+def score_cache(tmp_path):
+    """Creates a score cache in a temporary directory."""
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    yield cache
+    cache.close()
+
+
+def test_score_cache_round_trip(score_cache):
+    """Stored scores, including inf and nan, are read back."""
+    score_cache.put_many(NAMESPACE, [("a", 12.5), ("b", math.inf), ("c", math.nan)])
+
+    found = score_cache.get_many(NAMESPACE, ["a", "b", "c", "missing"])
+
+    assert found["a"] == 12.5
+    assert math.isinf(found["b"])
+    assert math.isnan(found["c"])
+    assert "missing" not in found
+
+
+def test_score_cache_namespaces_are_isolated(score_cache):
+    """A different truncation length or tokenizer does not reuse scores."""
+    score_cache.put_many(NAMESPACE, [("a", 12.5)])
+
+    other_length = ScoreNamespace("distilgpt2", "r1", 512)
+    other_tokenizer = ScoreNamespace("distilgpt2", "r2", 1024)
+
+    assert score_cache.get_many(other_length, ["a"]) == {}
+    assert score_cache.get_many(other_tokenizer, ["a"]) == {}
+
+
+def test_score_cache_persists_across_connections(tmp_path):
+    """Scores committed by one run are visible to the next one."""
+    path = str(tmp_path / "scores.sqlite")
+    first = ScoreCache(path)
+    first.put_many(NAMESPACE, [("a", 3.0)])
+    first.close()
+
+    second = ScoreCache(path)
+    assert second.get_many(NAMESPACE, ["a"]) == {"a": 3.0}
+    second.close()
+
+
+def test_warm_run_reuses_cached_scores(score_cache):
+    """A second scoring run is served entirely from the cache."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    texts = ["The quick brown fox.", "A lazy dog sleeps.", "The quick brown fox."]
+
+    cold = compute_perplexities(texts, reference, score_cache=score_cache)
+    warm = compute_perplexities(texts, reference, score_cache=score_cache)
+
+    assert cold.n_cached == 0
+    assert warm.n_cached == warm.n_unique == 2
+    np.testing.assert_allclose(warm.scores, cold.scores)
@@ -0,0 +1,131 @@
+import asyncio
+import math
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from a4s_eval.perplexity import score_cache
+from a4s_eval.service.load_generator import run_load, serve
+from a4s_eval.service.micro_batcher import MicroBatcher
+from a4s_eval.service.scoring_service import create_app
+from a4s_eval.utils import env
+
+
+class FakeScorer:
+    """Scores each text by its length, recording the size of every batch."""
+
+    def __init__(self, seconds: float = 0.0) -> None:
+        self.seconds = seconds
+        self.batch_sizes: list[int] = []
+
+    def __call__(self, texts: list[str]) -> list[float]:
+        self.batch_sizes.append(len(texts))
+        time.sleep(self.seconds)
+        return [float(len(text)) if text else math.nan for text in texts]
+
+
+async def submit_all(batcher: MicroBatcher, texts: list[str]) -> list:
+    await batcher.start()
+    try:
+        return await asyncio.gather(*(batcher.submit(text) for text in texts))
+    finally:
+        await batcher.stop()
+
+
+def test_concurrent_requests_are_batched():
+    """Concurrent requests share batches of at most max_batch_size texts."""
+    scorer = FakeScorer(seconds=0.05)
+    batcher = MicroBatcher(scorer, max_batch_size=4, max_wait_seconds=0.2)
+    texts = ["a" * n for n in range(1, 11)]
+    results = asyncio.run(submit_all(batcher, texts))
+
+    assert [result.score for result in results] == [len(text) for text in texts]
+    assert sorted(scorer.batch_sizes) == [2, 4, 4]
+    assert batcher.stats.requests == 10
+    assert batcher.stats.batches == 3
+
+
+def test_lone_request_waits_at_most_max_wait():
+    scorer = FakeScorer()
+    batcher = MicroBatcher(scorer, max_batch_size=8, max_wait_seconds=0.05)
+
+    start = time.perf_counter()
+    [result] = asyncio.run(submit_all(batcher, ["text"]))
+    elapsed = time.perf_counter() - start
+
+    assert result.batch_size == 1
+    assert 0.04 <= result.queue_seconds <= elapsed < 1.0
+
+
+def test_scoring_errors_fail_the_batch_only():
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("model failed")
+        return [1.0] * len(texts)
+
+    async def run():
+        batcher = MicroBatcher(flaky, max_batch_size=2, max_wait_seconds=0.01)
+        await batcher.start()
+        try:
+            with pytest.raises(RuntimeError, match="model failed"):
+                await batcher.submit("first")
+            return await batcher.submit("second")
+        finally:
+            await batcher.stop()
+
+    assert asyncio.run(run()).score == 1.0
+
+
+def test_score_endpoint():
+    scorer = FakeScorer()
+    with TestClient(create_app(scorer, max_batch_size=4, max_wait_ms=1)) as client:
+        response = client.post("/score", json={"text": "hello"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["score"] == 5.0
+        assert body["batch_size"] == 1
+        assert body["latency_ms"] >= body["queue_ms"] >= 0
+
+        # Texts that cannot be scored get no score
+        assert client.post("/score", json={"text": ""}).json()["score"] is None
+        assert client.post("/score", json={}).status_code == 422
+
+        health = client.get("/health").json()
+        assert health["requests"] == 2
+        assert health["max_batch_size"] == 4
+
+
+def test_load_generation_reports_latency_and_throughput():
+    """Higher concurrency fills larger micro-batches."""
+    app = create_app(FakeScorer(seconds=0.01), max_batch_size=8, max_wait_ms=2)
+    texts = ["some text", "another text"]
+    with serve(app) as url:
+        sequential = run_load(url, texts, concurrency=1, n_requests=10)
+        concurrent = run_load(url, texts, concurrency=8, n_requests=40)
+
+    for result in [sequential, concurrent]:
+        assert result.n_errors == 0
+        assert result.requests_per_second > 0
+        assert 0 < result.latency_p50_ms <= result.latency_p99_ms
+    assert sequential.mean_batch_size == 1
+    assert concurrent.mean_batch_size > 1
+
+
+def test_perplexity_service(monkeypatch, tmp_path):
+    """The default service scores with the reference model of the metric."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+
+    def no_score_cache():
+        raise AssertionError("client texts must not be cached by default")
+
+    monkeypatch.setattr(score_cache, "get_score_cache", no_score_cache)
+    with TestClient(create_app(max_wait_ms=1)) as client:
+        body = client.post(
+            "/score", json={"text": "The quick brown fox jumps over the lazy dog."}
+        ).json()
+
+    assert body["score"] > 1
@@ -0,0 +1,39 @@
+import numpy as np
+
+from a4s_eval.perplexity.engine import ScoringConfig
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.scoring import compute_perplexities
+from a4s_eval.perplexity.sharding import make_shards
+
+
+def test_make_shards_balances_costs():
+    """Shards cover every item once and have similar total cost."""
+    costs = [100, 90, 80, 10, 10, 10, 5, 5, 50, 40]
+    shards = make_shards(costs, n_shards=3)
+
+    assert sorted(i for shard in shards for i in shard) == list(range(len(costs)))
+    totals = [sum(costs[i] for i in shard) for shard in shards]
+    assert max(totals) - min(totals) <= max(costs) / 2
+
+
+def test_make_shards_never_returns_empty_shards():
+    """Asking for more shards than items yields one shard per item."""
+    assert make_shards([3.0, 1.0], n_shards=8) == [[0], [1]]
+
+
+def test_sharded_scores_match_single_process():
+    """Scoring across two worker processes keeps scores and row order."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    texts = [
+        "The quick brown fox jumps over the lazy dog.",
+        "",
+        "Dog lazy the over jumps fox brown quick The",
+        "Super Bowl 50 was an American football game.",
+        None,
+        "The quick brown fox jumps over the lazy dog.",
+    ]
+
+    serial = compute_perplexities(texts, reference, ScoringConfig(num_workers=1))
+    sharded = compute_perplexities(texts, reference, ScoringConfig(num_workers=2))
+
+    np.testing.assert_allclose(sharded.scores, serial.scores, rtol=1e-5)
@@ -0,0 +1,129 @@
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+from a4s_eval.data_model.evaluation import (
+    DataShape,
+    Dataset,
+    Feature,
+    FeatureType,
+    Model,
+)
+from a4s_eval.metrics.model_metrics import perplexity_metric
+from a4s_eval.perplexity.engine import ScoringConfig, score_texts
+from a4s_eval.perplexity.scoring import score_with_log_likelihood
+from a4s_eval.perplexity.text_generation import causal_lm_model
+from a4s_eval.service.functional_model import LogLikelihoods, TextGenerationModel
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "",
+    "Perplexity measures how well a probability model predicts a sample.",
+    None,
+    "The quick brown fox jumps over the lazy dog.",
+]
+
+
+def test_log_likelihood_matches_batched_scoring(reference_lm):
+    """Per-token log-probs sum to the sequence log-prob and give the same scores."""
+    model, tokenizer = reference_lm
+    config = ScoringConfig(batch_size=4)
+    texts = [TEXTS[0], TEXTS[2], "", "Hi"]
+    result = causal_lm_model(model, tokenizer, config).log_likelihood(texts)
+
+    n_tokens = [len(tokenizer.encode(text)) - 1 for text in texts[:2]]
+    assert result.n_tokens.tolist() == [*n_tokens, 0, len(tokenizer.encode("Hi")) - 1]
+    np.testing.assert_allclose(
+        result.sequence_log_probs[:2],
+        [lp.sum() for lp in result.token_log_probs[:2]],
+    )
+    assert result.sequence_log_probs[2] == -np.inf
+    assert all((lp <= 0).all() for lp in result.token_log_probs)
+
+    expected = score_texts(texts[:2], model, tokenizer, config)
+    np.testing.assert_allclose(result.perplexities()[:2], expected, rtol=1e-4)
+
+
+def test_generate_logits_returns_next_token_logits(reference_lm):
+    model, tokenizer = reference_lm
+    generation = causal_lm_model(model, tokenizer)
+    batch = generation.generate_logits([TEXTS[0], "Short text."])
+    single = generation.generate_logits("Short text.")
+
+    input_ids = tokenizer("Short text.", return_tensors="pt")["input_ids"]
+    with torch.no_grad():
+        expected = model(input_ids).logits[0, -1]
+    assert single.shape == (model.config.vocab_size,)
+    torch.testing.assert_close(single, expected, rtol=1e-4, atol=1e-4)
+    torch.testing.assert_close(batch[1], expected, rtol=1e-4, atol=1e-4)
+
+
+def test_score_with_log_likelihood_deduplicates():
+    calls = []
+
+    def log_likelihood(texts):
+        calls.append(list(texts))
+        token_log_probs = [np.full(len(text.split()) - 1, -1.0) for text in texts]
+        return LogLikelihoods(
+            sequence_log_probs=np.array([lp.sum() for lp in token_log_probs]),
+            token_log_probs=token_log_probs,
+        )
+
+    result = score_with_log_likelihood(
+        [*TEXTS, "Single"], log_likelihood, token_nll=True
+    )
+
+    # Blank and non-string rows are never sent to the model
+    assert calls == [[TEXTS[0], TEXTS[2], "Single"]]
+    assert result.n_unique == 5
+    np.testing.assert_allclose(result.scores[[0, 2, 4]], np.e)
+    assert result.scores[1] == np.inf and result.scores[3] == np.inf
+    assert np.isnan(result.scores[5])
+    assert result.token_nll[1] is None
+    np.testing.assert_array_equal(result.token_nll[0], np.ones(8))
+
+
+def test_perplexity_metric_scores_through_text_generation_model(
+    reference_lm, monkeypatch
+):
+    """A provided TextGenerationModel is used instead of the reference model."""
+    model, tokenizer = reference_lm
+
+    def no_reference_model():
+        raise AssertionError("the reference model must not be loaded")
+
+    monkeypatch.setattr(perplexity_metric, "reference_model", no_reference_model)
+    shape = DataShape(
+        features=[
+            Feature(
+                pid=uuid.uuid4(),
+                name="context",
+                feature_type=FeatureType.TEXT,
+                min_value=None,
+                max_value=None,
+            )
+        ]
+    )
+    dataset = Dataset(
+        pid=uuid.uuid4(), shape=shape, data=pd.DataFrame({"context": TEXTS})
+    )
+    generation = causal_lm_model(model, tokenizer)
+    measures = perplexity_metric.perplexity(
+        shape, Model(pid=uuid.uuid4(), dataset=dataset), dataset, generation
+    )
+
+    expected = score_texts(TEXTS, model, tokenizer)
+    np.testing.assert_allclose(measures.scores, expected, rtol=1e-4)
+    assert measures.feature_pid == shape.features[0].pid
+
+    # Without a log-likelihood function, the metric falls back to the reference
+    with pytest.raises(AssertionError, match="reference model"):
+        perplexity_metric.perplexity(
+            shape,
+            Model(pid=uuid.uuid4(), dataset=dataset),
+            dataset,
+            TextGenerationModel(generate_text=generation.generate_text),
+        )
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.engine import (
+    ScoringConfig,
+    score_texts,
+    score_texts_with_token_nll,
+)
+from a4s_eval.perplexity.measures_io import read_measures, write_measures
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.scoring import compute_perplexities
+from a4s_eval.perplexity.token_stats import TokenNLL
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "",
+    "Perplexity measures how well a probability model predicts a sample. "
+    "A lower perplexity score indicates that the language model is better "
+    "at predicting the text sample.",
+    None,
+    "Short",
+    "The quick brown fox jumps over the lazy dog.",
+]
+
+
+@pytest.mark.parametrize(
+    "config",
+    [
+        ScoringConfig(batch_size=4),
+        ScoringConfig(batch_size=4, max_length=16, stride=8),
+    ],
+)
+def test_token_nll_matches_scores(reference_lm, config):
+    """One pass gives the usual scores and one NLL per token after the first."""
+    model, tokenizer = reference_lm
+    scores, token_nll = score_texts_with_token_nll(TEXTS, model, tokenizer, config)
+
+    np.testing.assert_allclose(
+        scores, score_texts(TEXTS, model, tokenizer, config), rtol=1e-5
+    )
+    for text, nll in zip(TEXTS, token_nll):
+        if not isinstance(text, str) or not text.strip():
+            assert nll is None
+            continue
+        n_tokens = len(tokenizer(text)["input_ids"])
+        if config.stride is None:
+            n_tokens = min(n_tokens, config.max_length)
+        assert nll.shape == (n_tokens - 1,)
+
+
+def test_aggregations_match_row_loops():
+    """Vectorized statistics equal the same statistics computed row by row."""
+    rng = np.random.default_rng(0)
+    rows = [rng.exponential(3.0, size=n).astype(np.float32) for n in (7, 1, 0, 12)]
+    rows.append(None)
+    stats = TokenNLL.from_arrays(rows)
+
+    for i, nll in enumerate(rows):
+        if nll is None or len(nll) == 0:
+            assert np.isnan(stats.max()[i])
+            assert stats.argmax()[i] == -1
+            continue
+        assert stats.mean()[i] == pytest.approx(nll.mean(dtype=np.float64))
+        assert stats.max()[i] == nll.max()
+        assert stats.argmax()[i] == nll.argmax() + 1
+        worst = max(
+            nll[j : j + 3].mean(dtype=np.float64) for j in range(max(len(nll) - 2, 1))
+        )
+        assert stats.windowed_perplexity(3)[i] == pytest.approx(np.exp(worst))
+
+    assert np.isinf(stats.perplexity()[4])
+    assert np.isnan(stats.perplexity()[2])
+    np.testing.assert_array_equal(
+        stats.at([2, 1, 1, 0, 1]), [rows[0][1], rows[1][0], np.nan, np.nan, np.nan]
+    )
+
+
+def test_token_nll_round_trip_through_measures_file(reference_lm, tmp_path):
+    """Statistics read back from the float16 column stay close to the scores."""
+    model, tokenizer = reference_lm
+    scores, token_nll = score_texts_with_token_nll(TEXTS, model, tokenizer)
+    path = tmp_path / "measures.arrow"
+    write_measures(
+        path,
+        [str(i) for i in range(len(TEXTS))],
+        [None] * len(TEXTS),
+        scores,
+        token_nll=token_nll,
+        batch_rows=4,
+    )
+
+    column = read_measures(path).column("token_nll")
+    assert column.type.value_type.bit_width == 16
+    np.testing.assert_allclose(
+        TokenNLL.from_arrow(column).perplexity(), scores, rtol=1e-2
+    )
+
+
+def test_compute_perplexities_returns_row_token_nll():
+    """Token NLL is fanned out to every row, like the scores."""
+    reference = ReferenceModelCache().get("distilgpt2")
+    result = compute_perplexities(TEXTS, reference, token_nll=True)
+
+    assert len(result.token_nll) == len(TEXTS)
+    np.testing.assert_array_equal(result.token_nll[0], result.token_nll[5])
+    np.testing.assert_allclose(
+        TokenNLL.from_arrays(result.token_nll).perplexity(), result.scores, rtol=1e-5
+    )
+    assert compute_perplexities(TEXTS, reference).token_nll is None
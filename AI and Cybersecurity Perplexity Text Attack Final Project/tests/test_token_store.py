@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from a4s_eval.perplexity.dedup import dedup_texts
+from a4s_eval.perplexity.engine import ScoringConfig, score_texts
+from a4s_eval.perplexity.model_cache import ReferenceModelCache
+from a4s_eval.perplexity.scoring import compute_perplexities
+from a4s_eval.perplexity.token_store import TokenStore, ensure_token_store
+from a4s_eval.utils import env
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Super Bowl 50 was an American football game.",
+    "The quick brown fox jumps over the lazy dog.",
+    "",
+    None,
+    "Short text.",
+]
+
+
+@pytest.fixture(scope="module")
+def reference():
+    return ReferenceModelCache().get("distilgpt2")
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    """Stores token ids in a temporary cache directory."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_store_rows_match_tokenizer(reference, cache_dir):
+    """Row i of the store holds the token ids of text i, memory-mapped."""
+    store = ensure_token_store(dedup_texts(TEXTS), reference)
+
+    assert len(store) == len(TEXTS)
+    assert isinstance(store.input_ids, np.memmap)
+    for text, ids in zip(TEXTS, store.take(range(len(TEXTS)))):
+        expected = reference.tokenizer(text)["input_ids"] if text else []
+        assert ids.tolist() == expected
+
+
+def test_repeated_texts_are_stored_once(reference, cache_dir):
+    dedup = dedup_texts(TEXTS * 3)
+    store = ensure_token_store(dedup, reference)
+
+    assert len(store) == 3 * len(TEXTS)
+    assert store.n_unique == dedup.n_unique == 5
+    distinct_tokens = sum(
+        len(reference.tokenizer(text)["input_ids"])
+        for text in dedup.unique_texts
+        if text
+    )
+    assert len(store.input_ids) == distinct_tokens
+    assert store[len(TEXTS) + 2].tolist() == store.text_ids(0).tolist()
+
+
+def test_store_is_keyed_by_data(reference, cache_dir):
+    """The same column reuses its store and different data gets its own."""
+    store = ensure_token_store(dedup_texts(TEXTS), reference)
+    built_at = os.stat(os.path.join(store.path, "input_ids.npy")).st_mtime_ns
+
+    again = ensure_token_store(dedup_texts(list(TEXTS)), reference)
+    other = ensure_token_store(dedup_texts(TEXTS[:2]), reference)
+    reordered = ensure_token_store(dedup_texts(TEXTS[::-1]), reference)
+
+    assert again.path == store.path
+    assert os.stat(os.path.join(again.path, "input_ids.npy")).st_mtime_ns == built_at
+    assert other.path != store.path
+    assert len(TokenStore(other.path)) == 2
+    assert reordered.path != store.path
+
+
+@pytest.mark.parametrize(
+    "config",
+    [ScoringConfig(max_length=8), ScoringConfig(max_length=8, stride=4)],
+)
+def test_scores_from_store_match_tokenizing(reference, cache_dir, config):
+    """Scoring from stored token ids gives the same scores as tokenizing."""
+    dedup = dedup_texts(TEXTS)
+    store = ensure_token_store(dedup, reference)
+    result = compute_perplexities(
+        TEXTS, reference, config, token_store=store, dedup=dedup
+    )
+
+    expected = score_texts(TEXTS, reference.model, reference.tokenizer, config)
+    np.testing.assert_allclose(result.scores, expected, rtol=1e-6)
+
+
+def test_store_must_match_texts(reference, cache_dir):
+    store = ensure_token_store(dedup_texts(TEXTS[:2]), reference)
+    with pytest.raises(ValueError):
+        compute_perplexities(TEXTS, reference, token_store=store)
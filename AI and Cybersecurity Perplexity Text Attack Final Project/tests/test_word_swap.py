@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from textattack.shared import AttackedText, WordEmbedding
+from textattack.transformations import WordSwapEmbedding
+
+from a4s_eval.attack.word_swap import first_word_swaps, iter_word_swaps
+
+VOCAB = [
+    "quick", "fast", "rapid", "brown", "tan", "fox", "wolf", "dog", "hound",
+    "lazy", "idle", "jumps", "leaps", "over",
+]  # fmt: skip
+
+
+@pytest.fixture(scope="module")
+def transformation():
+    """Word swap over a small local embedding instead of the GloVe download."""
+    rng = np.random.default_rng(0)
+    matrix = rng.normal(size=(len(VOCAB), 8)).astype(np.float32)
+    word2index = {word: i for i, word in enumerate(VOCAB)}
+    index2word = dict(enumerate(VOCAB))
+    distances = np.linalg.norm(matrix[:, None] - matrix[None], axis=-1)
+    nn_matrix = np.argsort(distances, axis=1, kind="stable")
+    embedding = WordEmbedding(matrix, word2index, index2word, nn_matrix)
+    return WordSwapEmbedding(max_candidates=3, embedding=embedding)
+
+
+TEXTS = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Nothing here is in the vocabulary.",
+    "Dog!",
+]
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_lazy_candidates_match_eager(transformation, text):
+    """The generator yields exactly the eager candidates, in order."""
+    attacked_text = AttackedText(text)
+    eager = [t.text for t in transformation(attacked_text)]
+    lazy = [t.text for t in iter_word_swaps(transformation, attacked_text)]
+    assert lazy == eager
+
+
+def test_first_candidates(transformation):
+    """Only the requested number of leading candidates is returned."""
+    attacked_text = AttackedText(TEXTS[0])
+    eager = [t.text for t in transformation(attacked_text)]
+    first = first_word_swaps(transformation, attacked_text)
+    first_four = first_word_swaps(transformation, attacked_text, k=4)
+
+    assert [t.text for t in first] == eager[:1]
+    assert [t.text for t in first_four] == eager[:4]
+    assert first_word_swaps(transformation, AttackedText(TEXTS[1])) == []
+
+
+def test_lazy_candidates_stop_early(transformation, monkeypatch):
+    """Replacement words are looked up only for the positions consumed."""
+    lookups = []
+    lookup = transformation._get_replacement_words
+
+    def counting_lookup(word):
+        lookups.append(word)
+        return lookup(word)
+
+    monkeypatch.setattr(transformation, "_get_replacement_words", counting_lookup)
+    first_word_swaps(transformation, AttackedText(TEXTS[0]))
+    assert lookups == ["The", "quick"]
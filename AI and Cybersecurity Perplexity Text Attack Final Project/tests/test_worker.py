@@ -0,0 +1,205 @@
+import json
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from celery.contrib.testing.worker import start_worker
+
+from a4s_eval.data_model.evaluation import (
+    DataShape,
+    Feature,
+    FeatureType,
+    Project,
+)
+from a4s_eval.data_model.measure import Measure, MeasureBatch
+from a4s_eval.metric_registries import model_metric_registry
+from a4s_eval.metric_registries.evaluation_engine import EvaluationResult, MetricRun
+from a4s_eval.utils import env
+from a4s_eval.worker.celery_app import celery_app
+from a4s_eval.worker.chunks import (
+    EvaluationJob,
+    chunk_ranges,
+    dump_result,
+    load_result,
+    read_rows,
+    reduce_results,
+)
+from a4s_eval.worker.tasks import evaluate, job_metrics, warm_up_metrics
+
+TEXTS = [f"Text number {i} " + "word " * (i % 7) for i in range(23)]
+
+
+def text_lengths(datashape, model, dataset, functional_model):
+    """Scores the length of each text."""
+    return MeasureBatch(
+        name="text_length",
+        scores=dataset.data["context"].str.len().to_numpy(),
+        time=datetime.now(),
+        feature_pid=datashape.features[0].pid,
+    )
+
+
+def mean_length(datashape, model, dataset, functional_model):
+    """Scores the mean length of the texts."""
+    score = float(dataset.data["context"].str.len().mean())
+    return [Measure(name="mean_length", score=score, time=datetime.now())]
+
+
+def failing(datashape, model, dataset, functional_model):
+    if dataset.data.index[0] > 0:
+        raise RuntimeError("broken chunk")
+    return []
+
+
+@pytest.fixture
+def metrics():
+    model_metric_registry.register("text_length", text_lengths, needs_model=False)
+    model_metric_registry.register(
+        "mean_length", mean_length, reduce="mean", needs_model=False
+    )
+    model_metric_registry.register("failing", failing, needs_model=False)
+    yield ["text_length", "mean_length", "failing"]
+    for name in ["text_length", "mean_length", "failing"]:
+        model_metric_registry.get_functions().pop(name)
+
+
+@pytest.fixture
+def job(tmp_path) -> EvaluationJob:
+    path = tmp_path / "texts.parquet"
+    # Small row groups, so that chunks span several of them
+    pd.DataFrame({"context": TEXTS, "other": range(len(TEXTS))}).to_parquet(
+        path, row_group_size=4
+    )
+    shape = DataShape(
+        features=[
+            Feature(
+                pid=uuid.uuid4(),
+                name="context",
+                feature_type=FeatureType.TEXT,
+                min_value=None,
+                max_value=None,
+            )
+        ]
+    )
+    return EvaluationJob(
+        pid=uuid.uuid4(),
+        project=Project(
+            pid=uuid.uuid4(), name="test", frequency="1d", window_size="1d"
+        ),
+        dataset_pid=uuid.uuid4(),
+        shape=shape,
+        data_path=str(path),
+        chunk_rows=5,
+    )
+
+
+@pytest.fixture(scope="module", autouse=True)
+def memory_app():
+    """Uses the in-memory broker and result backend instead of RabbitMQ/Redis."""
+    saved = dict(celery_app.conf)
+    celery_app.conf.update(broker_url="memory://", result_backend="cache+memory://")
+    yield celery_app
+    celery_app.conf.update(saved)
+
+
+@pytest.fixture
+def eager():
+    celery_app.conf.update(task_always_eager=True, task_eager_propagates=True)
+    yield celery_app
+    celery_app.conf.update(task_always_eager=False, task_eager_propagates=False)
+
+
+def test_chunk_ranges_and_read_rows(job):
+    assert chunk_ranges(23, 5) == [(0, 5), (5, 10), (10, 15), (15, 20), (20, 23)]
+    assert chunk_ranges(0, 5) == []
+
+    rows = read_rows(job.data_path, 6, 13, job.columns())
+    assert list(rows.columns) == ["context"]
+    assert list(rows.index) == list(range(6, 13))
+    assert rows["context"].tolist() == TEXTS[6:13]
+
+
+def test_chunk_results_keep_non_finite_scores():
+    """Unscorable (inf) and single-token (nan) scores survive strict JSON."""
+    now = datetime.now()
+    batch = MeasureBatch(name="perplexity", scores=[12.5, np.inf, np.nan], time=now)
+    mean = [Measure(name="mean", score=-np.inf, time=now)]
+    result = EvaluationResult(
+        runs=[
+            MetricRun("perplexity", "thread", measures=batch, wall_seconds=0.1),
+            MetricRun("mean", "thread", measures=mean, wall_seconds=0.1),
+        ],
+        load_seconds=0.0,
+        wall_seconds=0.0,
+    )
+    payload = json.loads(json.dumps(dump_result(result, n_rows=3), allow_nan=False))
+    reduced = reduce_results([payload, payload], {"mean": "mean"})
+
+    np.testing.assert_array_equal(
+        reduced.runs[0].measures.scores, [12.5, np.inf, np.nan] * 2
+    )
+    assert reduced.runs[1].measures[0].score == -np.inf
+
+
+def check_result(payload, job):
+    result = load_result(payload)
+    lengths = np.array([len(text) for text in TEXTS], dtype=np.float64)
+
+    runs = {run.name: run for run in result.runs}
+    assert isinstance(runs["text_length"].measures, MeasureBatch)
+    np.testing.assert_array_equal(runs["text_length"].measures.scores, lengths)
+    assert runs["text_length"].measures.feature_pid == job.shape.features[0].pid
+    assert runs["mean_length"].measures[0].score == pytest.approx(lengths.mean())
+    assert runs["mean_length"].wall_seconds >= 0
+    assert "broken chunk" in result.errors["failing"]
+    assert runs["failing"].measures == []
+
+
+def test_evaluate_in_chunks_eagerly(eager, metrics, job):
+    """The job is split into chunks whose results reduce to whole-dataset ones."""
+    job.metrics = metrics
+    payload = evaluate.delay(job.model_dump(mode="json")).get()
+
+    check_result(payload, job)
+    assert payload["n_rows"] == len(TEXTS)
+
+
+def test_jobs_only_run_metrics_without_model(eager, metrics, job):
+    """A job naming a metric that needs a model is rejected before any chunk."""
+    job.metrics = ["text_length", "accuracy"]
+    with pytest.raises(ValueError, match="accuracy"):
+        evaluate.delay(job.model_dump(mode="json")).get()
+
+    all_metrics = job_metrics(None)
+    assert "accuracy" not in all_metrics
+    assert {"perplexity", *metrics} <= set(all_metrics)
+
+
+def test_evaluate_with_in_memory_broker(metrics, job):
+    """Tasks and results go through a broker, serialized as JSON."""
+    with start_worker(celery_app, pool="solo", perform_ping_check=False):
+        job.metrics = metrics
+        payload = evaluate.delay(job.model_dump(mode="json")).get(timeout=60)
+
+    check_result(payload, job)
+
+
+def test_perplexity_through_worker(eager, job, monkeypatch, tmp_path):
+    """Perplexity chunks concatenate to the scores of the whole dataset."""
+    monkeypatch.setattr(env, "CACHE_DIR", str(tmp_path))
+    assert warm_up_metrics(["perplexity", "missing"]) == ["perplexity"]
+
+    # A blank text cannot be scored (inf), a single token has no score (nan)
+    texts = [*TEXTS[:7], "", *TEXTS[7:12], "a"]
+    job.data_path = str(tmp_path / "blank.parquet")
+    pd.DataFrame({"context": texts}).to_parquet(job.data_path, row_group_size=4)
+    job.metrics = ["perplexity"]
+    result = load_result(evaluate.delay(job.model_dump(mode="json")).get())
+
+    assert result.errors == {}
+    scores = result.runs[0].measures.scores
+    assert len(scores) == len(texts)
+    assert scores[7] == np.inf and np.isnan(scores[-1])
+    assert np.isfinite(np.delete(scores, [7, len(texts) - 1])).all()
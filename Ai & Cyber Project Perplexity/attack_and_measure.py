@@ -3,6 +3,7 @@ import pandas as pd
 from textattack.transformations import WordSwapEmbedding
 from textattack.shared import AttackedText
 
+from a4s_eval.attack.word_swap import first_word_swaps
 from a4s_eval.data_model.evaluation import (
     Dataset,
     DataShape,
@@ -30,7 +31,8 @@ def attack_and_recompute():
     attacked_texts = []
     for text in original_texts:
         attacked_text = AttackedText(text)
-        transformed_texts = transformation(attacked_text)
+        # Build only the first candidate lazily instead of every word swap
+        transformed_texts = first_word_swaps(transformation, attacked_text)
         # Use the first transformed text if available, otherwise keep original
         if transformed_texts:
             attacked_texts.append(transformed_texts[0].text)
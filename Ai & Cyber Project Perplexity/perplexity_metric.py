@@ -59,7 +59,7 @@ def perplexity(
         if not isinstance(text, str) or not text.strip():
             score = float("inf")
         else:
-            input_ids = ref_tokenizer.encode(text, return_tensors="pt")
+            input_ids = ref_tokenizer.encode(text, return_tensors="pt", truncation=True, max_length=1024)
             with torch.no_grad():
                 outputs = ref_model(input_ids, labels=input_ids)
             loss = outputs.loss
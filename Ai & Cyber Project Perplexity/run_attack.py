@@ -1,6 +1,7 @@
 import pandas as pd
 from textattack.transformations import WordSwapEmbedding
 from textattack.shared import AttackedText
+from a4s_eval.attack.word_swap import first_word_swaps
 from tqdm import tqdm
 import csv
 import os
@@ -37,7 +38,8 @@ def run_attack():
         # Process each text with a progress bar
         for text in tqdm(original_texts, desc="Attacking texts"):
             attacked_text_obj = AttackedText(text)
-            transformed_texts = transformation(attacked_text_obj)
+            # Only the first candidate is built (lazily) since it is the one kept
+            transformed_texts = first_word_swaps(transformation, attacked_text_obj)
             
             if transformed_texts:
                 result_text = transformed_texts[0].text